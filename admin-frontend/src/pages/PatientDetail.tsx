@@ -51,7 +51,7 @@ export default function PatientDetail() {
             const [patientRes, historyRes, statsRes, diariesRes, alertsRes] = await Promise.all([
                 patientsAPI.getDetail(patientId),
                 patientsAPI.getHistory(patientId),
-                patientsAPI.getStatistics(patientId),
+                patientsAPI.getTrendSeries(patientId),
                 diaryAPI.getPatientDiaries(patientId),
                 patientsAPI.getAlerts(patientId),
             ]);
@@ -129,33 +129,23 @@ export default function PatientDetail() {
     }
 
     // 準備不同時間範圍的移動平均數據
-    const prepareChartData = (days: number) => {
-        if (!statistics?.trend) return [];
+    // 均線由伺服器計算（statistics.series），與警報引擎使用同一套定義
+    const prepareChartData = (days: 7 | 14 | 30) => {
+        if (!statistics?.series) return [];
 
-        const trendData = statistics.trend;
-
-        // 計算移動平均
+        const key = `ma${days}` as const;
         const results: Array<{ date: string; 分數: number }> = [];
 
-        trendData.forEach((item, index) => {
-            const windowSize = days;
-
-            // 只有當有足夠數據時才計算移動平均
-            if (index >= windowSize - 1) {
-                const window = trendData.slice(index - windowSize + 1, index + 1);
-                const scores = window.map(d => d.score).filter((s): s is number => s !== null);
-
-                // 只有當完整的N天都有數據時才顯示
-                if (scores.length === windowSize) {
-                    const avg = Number((scores.reduce((a, b) => a + b, 0) / windowSize).toFixed(2));
-                    results.push({
-                        date: new Date(item.date).toLocaleDateString('zh-TW', {
-                            month: 'numeric',
-                            day: 'numeric',
-                        }),
-                        分數: avg,
-                    });
-                }
+        statistics.series.forEach(item => {
+            const avg = item[key];
+            if (avg !== null) {
+                results.push({
+                    date: new Date(item.date).toLocaleDateString('zh-TW', {
+                        month: 'numeric',
+                        day: 'numeric',
+                    }),
+                    分數: avg,
+                });
             }
         });
 
@@ -264,50 +254,18 @@ export default function PatientDetail() {
             {activeTab === 'history' ? (
                 <>
                     {/* 綜合圖表：當日/7日/14日/30日線 */}
-                    {statistics?.trend && statistics.trend.length > 0 && (() => {
+                    {statistics?.series && statistics.series.length > 0 && (() => {
                         // 準備綜合多線圖表數據
-                        const trendData = statistics.trend.map(item => ({
-                            ...item,
-                            當日分數: item.score
+                        // 均線取自伺服器（日曆天視窗、至少一半天數有資料），與警報判斷一致
+                        const multiLineTrendData = statistics.series.map(item => ({
+                            date: item.date,
+                            count: item.count,
+                            當日分數: item.average,
+                            '7日平均': item.ma7 ?? undefined,
+                            '14日平均': item.ma14 ?? undefined,
+                            '30日平均': item.ma30 ?? undefined,
                         }));
 
-                        // 計算移動平均
-                        const multiLineTrendData = trendData.map((item, index) => {
-                            const result: any = { ...item };
-
-                            // 7日移動平均：必須從第7天開始，且前面必須有完整的7天數據
-                            if (index >= 6) {
-                                const last7 = trendData.slice(index - 6, index + 1);
-                                const scores = last7.map(d => d.score).filter((s: number | null) => s !== null) as number[];
-                                // 只有當完整的7天都有數據時才顯示7日線
-                                if (scores.length === 7) {
-                                    result['7日平均'] = Number((scores.reduce((a: number, b: number) => a + b, 0) / 7).toFixed(1));
-                                }
-                            }
-
-                            // 14日移動平均：必須從第14天開始，且前面必須有完整的14天數據
-                            if (index >= 13) {
-                                const last14 = trendData.slice(index - 13, index + 1);
-                                const scores = last14.map(d => d.score).filter((s: number | null) => s !== null) as number[];
-                                // 只有當完整的14天都有數據時才顯示14日線
-                                if (scores.length === 14) {
-                                    result['14日平均'] = Number((scores.reduce((a: number, b: number) => a + b, 0) / 14).toFixed(1));
-                                }
-                            }
-
-                            // 30日移動平均：必須從第30天開始，且前面必須有完整的30天數據
-                            if (index >= 29) {
-                                const last30 = trendData.slice(index - 29, index + 1);
-                                const scores = last30.map(d => d.score).filter((s: number | null) => s !== null) as number[];
-                                // 只有當完整的30天都有數據時才顯示30日線
-                                if (scores.length === 30) {
-                                    result['30日平均'] = Number((scores.reduce((a: number, b: number) => a + b, 0) / 30).toFixed(1));
-                                }
-                            }
-
-                            return result;
-                        });
-
                         return (
                             <div className="chart-section" ref={multiLineChartRef}>
                                 <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', marginBottom: '12px' }}>
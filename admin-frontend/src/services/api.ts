@@ -48,10 +48,29 @@ export const authAPI = {
 };
 
 export const patientsAPI = {
-    getAll: () => api.get('/patients'),
+    getAll: (params?: {
+        limit?: number;
+        cursor?: string;
+        sort?: 'id' | 'name' | 'latest_score' | 'latest_time';
+        order?: 'asc' | 'desc';
+        group?: string;
+        level?: string;
+        inactive_warning?: boolean;
+        watchlisted?: boolean;
+        has_alerts?: boolean;
+    }) => api.get('/patients', { params }),
     getDetail: (id: number) => api.get(`/patients/${id}`),
-    getHistory: (id: number) => api.get(`/patients/${id}/history`),
+    getHistory: (id: number, params?: {
+        limit?: number;
+        before?: string;
+        after?: string;
+        from?: string;
+        to?: string;
+        fields?: 'summary' | 'list' | 'full';
+    }) => api.get(`/patients/${id}/history`, { params }),
     getStatistics: (id: number) => api.get(`/patients/${id}/statistics`),
+    getTrendSeries: (id: number, params?: { from?: string; to?: string; max_points?: number }) =>
+        api.get(`/patients/${id}/statistics`, { params: { series: 'ma', ...params } }),
     getAlerts: (id: number) => api.get(`/patients/${id}/alerts`),
     getAlertCounts: () => api.get('/patients/alert-counts'),
 };
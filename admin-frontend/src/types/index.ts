@@ -79,6 +79,15 @@ export interface DashboardStats {
     recent_patients: Patient[];
 }
 
+export interface TrendSeriesPoint {
+    date: string;
+    average: number;
+    count: number;
+    ma7: number | null;
+    ma14: number | null;
+    ma30: number | null;
+}
+
 export interface Statistics {
     total_count: number;
     average_score: number | null;
@@ -90,4 +99,9 @@ export interface Statistics {
         max_score: number;
         percentage: number;
     }[];
+    // 僅在 ?series=ma 時回傳（patientsAPI.getTrendSeries）
+    series?: TrendSeriesPoint[];
+    series_from?: string;
+    series_to?: string;
+    downsampled?: boolean;
 }
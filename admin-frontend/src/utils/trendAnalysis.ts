@@ -25,6 +25,8 @@ export interface TrendAnalysisResult {
 
 /**
  * 計算移動平均線
+ * 注意：此為前端的簡化算法（取最後 period 筆、保留一位小數），與警報引擎不同；
+ * 需要與警報一致的均線請使用伺服器的 patientsAPI.getTrendSeries
  * @param data 歷史分數數據（必須按日期排序）
  * @param period MA 週期（7, 14, 30）
  * @param minDataRatio 最小數據比例（預設 0.5，即至少需要 period/2 天的數據）
@@ -0,0 +1,24 @@
+"""
+Add the index the maintenance job uses to delete finished alert_jobs rows
+
+Works on both SQLite and PostgreSQL, safe to run more than once.
+"""
+from app.models import db
+from sqlalchemy import text
+
+
+def add_alert_job_purge_index():
+    with db.engine.connect() as conn:
+        conn.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_alert_jobs_status_updated '
+            'ON alert_jobs (status, updated_at)'
+        ))
+        conn.commit()
+    print("✓ index ix_alert_jobs_status_updated ready")
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        add_alert_job_purge_index()
@@ -0,0 +1,51 @@
+"""
+Add completed_date column and query indexes to assessment_history / score_alerts
+
+Works on both SQLite and PostgreSQL, safe to run more than once.
+"""
+from app.models import db
+from sqlalchemy import text, inspect
+
+INDEXES = [
+    ('ix_assessment_history_user_deleted_completed', 'assessment_history', 'user_id, is_deleted, completed_at'),
+    ('ix_assessment_history_completed_date_deleted', 'assessment_history', 'completed_date, is_deleted'),
+    ('ix_score_alerts_user_date', 'score_alerts', 'user_id, alert_date'),
+]
+
+
+def add_completed_date_column():
+    """Add and backfill completed_date, then create the composite indexes"""
+    dialect = db.engine.dialect.name
+    columns = [col['name'] for col in inspect(db.engine).get_columns('assessment_history')]
+
+    with db.engine.connect() as conn:
+        if 'completed_date' not in columns:
+            conn.execute(text('ALTER TABLE assessment_history ADD COLUMN completed_date DATE'))
+            print("✓ completed_date column added")
+        else:
+            print("✓ completed_date column already exists")
+
+        # Backfill rows written before the column existed
+        if dialect == 'postgresql':
+            date_expr = 'CAST(completed_at AS DATE)'
+        else:
+            date_expr = 'DATE(completed_at)'
+        result = conn.execute(text(f'''
+            UPDATE assessment_history
+            SET completed_date = {date_expr}
+            WHERE completed_date IS NULL AND completed_at IS NOT NULL
+        '''))
+        print(f"✓ backfilled completed_date for {result.rowcount} rows")
+
+        for name, table, cols in INDEXES:
+            conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols})'))
+            print(f"✓ index {name} ready")
+
+        conn.commit()
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        add_completed_date_column()
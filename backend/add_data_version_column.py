@@ -0,0 +1,26 @@
+"""
+Add users.data_version (ETag counter for history / diary / alert GETs)
+
+Works on both SQLite and PostgreSQL, safe to run more than once.
+"""
+from app.models import db
+from sqlalchemy import text, inspect
+
+
+def add_data_version_column():
+    existing = [col['name'] for col in inspect(db.engine).get_columns('users')]
+
+    with db.engine.connect() as conn:
+        if 'data_version' not in existing:
+            conn.execute(text('ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0'))
+            print("✓ data_version column added")
+        else:
+            print("✓ data_version column already exists")
+        conn.commit()
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        add_data_version_column()
@@ -0,0 +1,30 @@
+"""
+Add users.latest_assessment_id and point it at each user's latest assessment
+
+Works on both SQLite and PostgreSQL, safe to run more than once.
+"""
+from app.models import db
+from app.utils.latest_assessment import backfill_latest_assessments
+from sqlalchemy import text, inspect
+
+
+def add_latest_assessment_column():
+    columns = [col['name'] for col in inspect(db.engine).get_columns('users')]
+
+    with db.engine.connect() as conn:
+        if 'latest_assessment_id' not in columns:
+            conn.execute(text('ALTER TABLE users ADD COLUMN latest_assessment_id INTEGER'))
+            conn.commit()
+            print("✓ latest_assessment_id column added")
+        else:
+            print("✓ latest_assessment_id column already exists")
+
+    updated = backfill_latest_assessments()
+    print(f"✓ latest_assessment_id set for {updated} users")
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        add_latest_assessment_column()
@@ -0,0 +1,37 @@
+"""
+Add users.latest_score / latest_completed_at (and their sort indexes) and
+fill them from each user's latest assessment
+
+Works on both SQLite and PostgreSQL, safe to run more than once.
+"""
+from app.models import db, NO_LATEST_SCORE, NO_LATEST_TIME
+from app.utils.latest_assessment import backfill_latest_assessments
+from sqlalchemy import text, inspect
+
+
+def add_latest_sort_columns():
+    columns = [col['name'] for col in inspect(db.engine).get_columns('users')]
+    timestamp = 'TIMESTAMP' if db.engine.dialect.name == 'postgresql' else 'DATETIME'
+    no_time = NO_LATEST_TIME.strftime('%Y-%m-%d %H:%M:%S')
+
+    with db.engine.connect() as conn:
+        if 'latest_score' not in columns:
+            conn.execute(text(f'ALTER TABLE users ADD COLUMN latest_score INTEGER NOT NULL DEFAULT {NO_LATEST_SCORE}'))
+            print("✓ latest_score column added")
+        if 'latest_completed_at' not in columns:
+            conn.execute(text(f"ALTER TABLE users ADD COLUMN latest_completed_at {timestamp} NOT NULL DEFAULT '{no_time}'"))
+            print("✓ latest_completed_at column added")
+        conn.execute(text('CREATE INDEX IF NOT EXISTS ix_users_latest_score_id ON users (latest_score, id)'))
+        conn.execute(text('CREATE INDEX IF NOT EXISTS ix_users_latest_completed_at_id ON users (latest_completed_at, id)'))
+        conn.commit()
+    print("✓ indexes ix_users_latest_score_id / ix_users_latest_completed_at_id ready")
+
+    updated = backfill_latest_assessments()
+    print(f"✓ latest score / time set for {updated} users")
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        add_latest_sort_columns()
@@ -0,0 +1,28 @@
+"""
+Add the indexes behind the filtered / paginated admin patient list
+
+Works on both SQLite and PostgreSQL, safe to run more than once.
+"""
+from app.models import db
+from sqlalchemy import text
+
+INDEXES = [
+    ('ix_users_name_id', 'users', 'name, id'),
+    ('ix_users_group_id', 'users', '"group", id'),
+    ('ix_users_last_login_date', 'users', 'last_login_date'),
+]
+
+
+def add_patient_list_indexes():
+    with db.engine.connect() as conn:
+        for name, table, cols in INDEXES:
+            conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols})'))
+            print(f"✓ index {name} ready")
+        conn.commit()
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        add_patient_list_indexes()
@@ -0,0 +1,29 @@
+"""
+Add the index behind GET /api/admin/patients/search
+
+PostgreSQL: enables pg_trgm and adds trigram GIN indexes on users.name,
+nickname and email. SQLite (3.34+): creates the users_search FTS5 trigram
+table with its sync triggers and fills it from the existing users.
+
+Safe to run more than once.
+"""
+from app.models import db
+from app.utils.patient_search import create_search_index
+
+
+def add_patient_search_index():
+    with db.engine.connect() as conn:
+        created = create_search_index(conn, rebuild=True)
+        conn.commit()
+
+    if created:
+        print(f"✓ patient search index ready ({db.engine.dialect.name})")
+    else:
+        print("✗ this database has no supported search index; search falls back to LIKE scans")
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        add_patient_search_index()
@@ -0,0 +1,38 @@
+"""
+Add users.current_streak / last_streak_date and fill them from user_daily_scores
+
+Run `flask --app run.py daily-scores backfill` first on databases that do
+not have the daily aggregate yet. Works on both SQLite and PostgreSQL, safe
+to run more than once.
+"""
+from app.models import db
+from app.utils.streaks import recompute_all_streaks
+from sqlalchemy import text, inspect
+
+COLUMNS = [
+    ('current_streak', 'INTEGER NOT NULL DEFAULT 0'),
+    ('last_streak_date', 'DATE'),
+]
+
+
+def add_streak_columns():
+    existing = [col['name'] for col in inspect(db.engine).get_columns('users')]
+
+    with db.engine.connect() as conn:
+        for name, ddl in COLUMNS:
+            if name not in existing:
+                conn.execute(text(f'ALTER TABLE users ADD COLUMN {name} {ddl}'))
+                print(f"✓ {name} column added")
+            else:
+                print(f"✓ {name} column already exists")
+        conn.commit()
+
+    count = recompute_all_streaks()
+    print(f"✓ streaks recomputed for {count} users")
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        add_streak_columns()
@@ -0,0 +1,26 @@
+"""
+Add the partial index the recycle-bin purge scans (deleted assessments only)
+
+Works on both SQLite and PostgreSQL, safe to run more than once.
+"""
+from app.models import db
+from sqlalchemy import text
+
+
+def add_trash_purge_index():
+    # SQLite stores booleans as 0 / 1; PostgreSQL has a real boolean
+    predicate = 'is_deleted' if db.engine.dialect.name == 'postgresql' else 'is_deleted = 1'
+    with db.engine.connect() as conn:
+        conn.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_assessment_history_trash_deleted_at '
+            f'ON assessment_history (deleted_at) WHERE {predicate}'
+        ))
+        conn.commit()
+    print("✓ index ix_assessment_history_trash_deleted_at ready")
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        add_trash_purge_index()
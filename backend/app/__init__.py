@@ -3,12 +3,29 @@ from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from app.config import config
 from app.models import db
+from app.utils.json_provider import install_json_provider
+from app.utils.compression import install_compression
 import os
 
+def start_background_threads(app):
+    """Start this process's alert workers (async mode only) and maintenance thread; safe to call twice"""
+    from app.utils.task_queue import start_workers
+    from app.utils.maintenance import start_maintenance
+
+    start_workers(app)
+    start_maintenance(app)
+
+
 def create_app(config_name='default'):
     app = Flask(__name__, instance_relative_config=True)
     app.config.from_object(config[config_name])
     
+    # JSON 回應：有安裝 orjson 時使用 C 編碼器，否則使用標準函式庫（輸出格式相同）
+    install_json_provider(app)
+    
+    # 回應壓縮（gzip / brotli）；最先註冊的 after_request 最後執行，壓縮的是最終內容
+    install_compression(app)
+    
     # 1. CORS：直接允許所有標頭 (萬用字元)
     # 注意：如果 supports_credentials=True，origins 不能用 "*"
     CORS(app, supports_credentials=True)
@@ -61,6 +78,9 @@ def create_app(config_name='default'):
     app.register_blueprint(admin_diary_bp, url_prefix='/api/admin/diary')
     app.register_blueprint(admin_assignments_bp, url_prefix='/api/admin/assignments')
 
+    from app.commands import register_commands
+    register_commands(app)
+
     @app.route('/uploads/diary_images/<filename>')
     def uploaded_file(filename):
         upload_folder = os.path.join(os.path.dirname(__file__), 'uploads', 'diary_images')
@@ -73,4 +93,9 @@ def create_app(config_name='default'):
     def health_check():
         return {'status': 'ok', 'message': 'Flask backend is running'}
     
+    # 背景 worker 與維護執行緒只在明確要求時啟動（資料表建立之後）：BACKGROUND_THREADS=true（WSGI 伺服器）
+    # 或 run.py；一般腳本與 CLI 呼叫 create_app 不會啟動執行緒
+    if app.config.get('BACKGROUND_THREADS'):
+        start_background_threads(app)
+    
     return app
@@ -1,7 +1,7 @@
-from app.models import db
+from app.models import db, ProjectionMixin
 from datetime import datetime
 
-class HealthcareStaff(db.Model):
+class HealthcareStaff(ProjectionMixin, db.Model):
     """Healthcare staff model for admin users"""
     __tablename__ = 'healthcare_staff'
     
@@ -15,17 +15,28 @@ class HealthcareStaff(db.Model):
     # Relationship
     watchlist_items = db.relationship('PatientWatchlist', backref='staff', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
-        """Convert healthcare staff to dictionary - Safe version"""
-        return {
+    # summary: 分配與人員選單用的識別欄位；full: 再加上建立 / 登入時間
+    PROJECTION_COLUMNS = {
+        'summary': ('id', 'email', 'name', 'role'),
+    }
+    
+    def to_dict(self, projection='full'):
+        """Convert healthcare staff to dictionary - Safe version (projection: 'summary' or 'full')"""
+        self.check_projection(projection)
+        data = {
             'id': self.id,
             'email': self.email,
             'name': self.name,
-            'role': self.role,
-            # 修正點：使用 str() 避開 .isoformat() 的類型衝突
-            'created_at': str(self.created_at) if self.created_at else None,
-            'last_login': str(self.last_login) if hasattr(self, 'last_login') and self.last_login else None
+            'role': self.role
         }
+        if projection == 'summary':
+            return data
+        
+        data.update({
+            'created_at': self.created_at,
+            'last_login': getattr(self, 'last_login', None)
+        })
+        return data
 
 
 class PatientWatchlist(db.Model):
@@ -53,8 +64,8 @@ class PatientWatchlist(db.Model):
             'patient_id': self.patient_id,
             'notes': self.notes,
             'display_order': self.display_order,
-            'created_at': str(self.created_at) if self.created_at else None,
-            'updated_at': str(self.updated_at) if self.updated_at else None,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
             # 如果有關聯對象，也一併回傳
             'patient_name': self.patient.name if hasattr(self, 'patient') and self.patient else None,
             'staff_name': self.staff.name if hasattr(self, 'staff') and self.staff else None
@@ -84,7 +95,7 @@ class PatientAssignment(db.Model):
             'staff_id': self.staff_id,
             'patient_id': self.patient_id,
             'assigned_by': self.assigned_by,
-            'assigned_at': str(self.assigned_at) if self.assigned_at else None,
+            'assigned_at': self.assigned_at,
             'notes': self.notes
         }
 
@@ -0,0 +1,151 @@
+"""
+Flask CLI maintenance commands
+
+Usage (from backend/):
+    flask --app run.py daily-scores backfill [--users 1,2,3]
+    flask --app run.py alerts rebuild --from 2026-01-01 [--to 2026-02-01] [--users 1,2,3]
+    flask --app run.py alerts run-jobs
+    flask --app run.py streaks recompute [--users 1,2,3]
+    flask --app run.py maintenance purge-trash [--days 10] [--batch-size 1000]
+    flask --app run.py maintenance purge-idempotency-keys
+    flask --app run.py maintenance purge-alert-jobs [--days 7]
+"""
+import time
+from datetime import date
+
+import click
+from flask.cli import AppGroup
+
+
+def parse_user_ids(value):
+    """Parse a comma separated --users option into a list of ids"""
+    if not value:
+        return None
+    try:
+        user_ids = [int(v) for v in value.split(',') if v.strip()]
+    except ValueError:
+        raise click.BadParameter('--users 需為以逗號分隔的用戶 ID，例如 1,2,3')
+    if not user_ids:
+        raise click.BadParameter('--users 至少需指定一個用戶 ID')
+    return user_ids
+
+
+daily_scores_cli = AppGroup('daily-scores', help='每日分數彙總表 (user_daily_scores) 維護')
+
+
+@daily_scores_cli.command('backfill')
+@click.option('--users', default=None, help='只重建這些用戶 (以逗號分隔的 ID)')
+def backfill_daily_scores_command(users):
+    """Rebuild user_daily_scores from assessment_history in bulk"""
+    from app.utils.daily_scores import backfill_daily_scores
+
+    user_ids = parse_user_ids(users)
+    count = backfill_daily_scores(user_ids)
+    click.echo(f"✓ user_daily_scores 已重建，共 {count} 筆每日彙總")
+
+
+alerts_cli = AppGroup('alerts', help='分數警報 (score_alerts) 維護')
+
+
+@alerts_cli.command('rebuild')
+@click.option('--from', 'start_date', required=True, type=click.DateTime(formats=['%Y-%m-%d']), help='起始日期 YYYY-MM-DD')
+@click.option('--to', 'end_date', default=None, type=click.DateTime(formats=['%Y-%m-%d']), help='結束日期 YYYY-MM-DD (預設今天)')
+@click.option('--users', default=None, help='只重建這些用戶 (以逗號分隔的 ID)')
+def rebuild_alerts_command(start_date, end_date, users):
+    """Recompute ScoreAlert rows for every user and day in the range"""
+    from app.utils.alert_rebuild import rebuild_alerts
+
+    start_date = start_date.date()
+    end_date = end_date.date() if end_date else date.today()
+    if end_date < start_date:
+        raise click.BadParameter('--to 不可早於 --from')
+
+    started = time.perf_counter()
+    stats = rebuild_alerts(start_date, end_date, parse_user_ids(users))
+    elapsed = time.perf_counter() - started
+
+    click.echo(
+        f"✓ {start_date} ~ {end_date} 警報已重建：{stats['users']} 位用戶，"
+        f"新增 {stats['inserted']}、更新 {stats['updated']}、刪除 {stats['deleted']} "
+        f"({elapsed:.2f}s)"
+    )
+
+
+@alerts_cli.command('run-jobs')
+def run_jobs_command():
+    """Process all pending alert_jobs in the foreground"""
+    from app.utils.task_queue import requeue_stale_jobs, run_pending_jobs
+
+    requeued = requeue_stale_jobs()
+    processed = run_pending_jobs()
+    click.echo(f"✓ 已處理 {processed} 個背景工作（重新排入中斷工作 {requeued} 個）")
+
+
+streaks_cli = AppGroup('streaks', help='連續評估天數 (users.current_streak) 維護')
+
+
+@streaks_cli.command('recompute')
+@click.option('--users', default=None, help='只重算這些用戶 (以逗號分隔的 ID)')
+def recompute_streaks_command(users):
+    """Rebuild current_streak / last_streak_date from user_daily_scores"""
+    from app.utils.streaks import recompute_all_streaks
+
+    count = recompute_all_streaks(parse_user_ids(users))
+    click.echo(f"✓ 連續天數已重算，{count} 位用戶有評估紀錄")
+
+
+maintenance_cli = AppGroup('maintenance', help='定期維護工作')
+
+
+@maintenance_cli.command('purge-trash')
+@click.option('--days', default=None, type=int, help='保留天數 (預設 TRASH_RETENTION_DAYS)')
+@click.option('--batch-size', default=None, type=int, help='每批刪除筆數 (預設 TRASH_PURGE_BATCH_SIZE)')
+def purge_trash_command(days, batch_size):
+    """Permanently delete recycle-bin assessments past the retention period"""
+    from flask import current_app
+    from app.utils.maintenance import purge_trash
+
+    config = current_app.config
+    days = config.get('TRASH_RETENTION_DAYS', 10) if days is None else days
+    batch_size = batch_size or config.get('TRASH_PURGE_BATCH_SIZE', 1000)
+    if days < 0 or batch_size < 1:
+        raise click.BadParameter('--days 不可為負數，--batch-size 至少為 1')
+
+    stats = purge_trash(days, batch_size)
+    click.echo(
+        f"✓ 回收桶已清除 {stats['purged']} 筆（{stats['batches']} 批，{stats['users']} 位用戶，"
+        f"{stats['seconds']}s）"
+    )
+
+
+@maintenance_cli.command('purge-idempotency-keys')
+def purge_idempotency_keys_command():
+    """Delete expired idempotency_keys rows"""
+    from app.utils.idempotency import purge_expired_keys
+
+    purged = purge_expired_keys()
+    click.echo(f"✓ 已刪除 {purged} 筆過期的 Idempotency-Key")
+
+
+@maintenance_cli.command('purge-alert-jobs')
+@click.option('--days', default=None, type=int, help='保留天數 (預設 ALERT_JOB_RETENTION_DAYS)')
+def purge_alert_jobs_command(days):
+    """Delete done / failed alert_jobs rows past the retention period"""
+    from flask import current_app
+    from app.utils.task_queue import purge_finished_jobs
+
+    config = current_app.config
+    days = config.get('ALERT_JOB_RETENTION_DAYS', 7) if days is None else days
+    if days < 0:
+        raise click.BadParameter('--days 不可為負數')
+
+    purged = purge_finished_jobs(days, config.get('TRASH_PURGE_BATCH_SIZE', 1000))
+    click.echo(f"✓ 已刪除 {purged} 筆已完成 / 失敗的背景工作")
+
+
+def register_commands(app):
+    """Attach CLI command groups to the app"""
+    app.cli.add_command(daily_scores_cli)
+    app.cli.add_command(alerts_cli)
+    app.cli.add_command(streaks_cli)
+    app.cli.add_command(maintenance_cli)
@@ -1,19 +1,67 @@
 import os
+import json
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# 評估後工作的預設執行模式（app.utils.task_queue 在設定未提供 ALERT_TASK_MODE 時也使用此值）
+DEFAULT_ALERT_TASK_MODE = 'sync'
+
+
+def _json_serializer(value):
+    """JSON columns keep Chinese text readable (same as the old json.dumps(..., ensure_ascii=False))"""
+    return json.dumps(value, ensure_ascii=False)
+
+
 class Config:
     """Base configuration"""
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-pleasure-monitoring-2025')
     SQLALCHEMY_DATABASE_URI = os.getenv('SQLALCHEMY_DATABASE_URI')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {'json_serializer': _json_serializer}
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key-pleasure-monitoring-2025-fixed')
     JWT_ACCESS_TOKEN_EXPIRES = 86400  # 24 hours
     
     # 圖片上傳配置
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads', 'diary_images')
+    
+    # 評估後的自動關注 / 警報計算：'sync'（預設）在請求中直接執行，'async' 交給背景 worker（alert_jobs 佇列）
+    ALERT_TASK_MODE = os.getenv('ALERT_TASK_MODE', DEFAULT_ALERT_TASK_MODE)
+    ALERT_TASK_WORKERS = int(os.getenv('ALERT_TASK_WORKERS', 2))
+    ALERT_TASK_POLL_SECONDS = 5
+    ALERT_TASK_MAX_ATTEMPTS = 3
+    ALERT_TASK_STALE_SECONDS = 600  # 超過此秒數仍為 running 的工作視為 worker 中斷，重新排入
+    # 於 create_app 中啟動背景 worker 與維護執行緒（gunicorn 等 WSGI 伺服器設為 true；python run.py 會自行啟動）
+    BACKGROUND_THREADS = os.getenv('BACKGROUND_THREADS', 'false').lower() == 'true'
+    ALERT_JOB_RETENTION_DAYS = int(os.getenv('ALERT_JOB_RETENTION_DAYS', 7))  # done / failed 工作保留天數，由維護工作刪除
+    
+    # 管理端未讀警報數量快取秒數（警報或分配變更時立即失效）
+    ALERT_COUNTS_CACHE_SECONDS = int(os.getenv('ALERT_COUNTS_CACHE_SECONDS', 30))
+    
+    # 管理端儀表板統計快取秒數；快取超過 DASHBOARD_REFRESH_SECONDS 秒後於背景重新計算
+    DASHBOARD_CACHE_SECONDS = int(os.getenv('DASHBOARD_CACHE_SECONDS', 60))
+    DASHBOARD_REFRESH_SECONDS = int(os.getenv('DASHBOARD_REFRESH_SECONDS', 20))
+    
+    # 回收桶：刪除超過 TRASH_RETENTION_DAYS 天的評估由背景維護工作分批永久刪除
+    TRASH_RETENTION_DAYS = int(os.getenv('TRASH_RETENTION_DAYS', 10))
+    TRASH_PURGE_BATCH_SIZE = int(os.getenv('TRASH_PURGE_BATCH_SIZE', 1000))
+    MAINTENANCE_INTERVAL_SECONDS = int(os.getenv('MAINTENANCE_INTERVAL_SECONDS', 3600))  # 0 = 只用 CLI / cron 執行
+    
+    # Idempotency-Key：重送相同請求時回傳第一次的結果，保存 IDEMPOTENCY_KEY_TTL_SECONDS 秒
+    IDEMPOTENCY_KEY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_KEY_TTL_SECONDS', 86400))
+    IDEMPOTENCY_PENDING_SECONDS = 60  # 第一個請求超過此秒數仍未完成（程序中斷）時允許重試接手
+    
+    # JSON 回應編碼器：'auto'（有 orjson 就用）、'orjson' 或 'stdlib'
+    JSON_PROVIDER = os.getenv('JSON_PROVIDER', 'auto')
+    
+    # 回應壓縮：依 Accept-Encoding 選用 brotli（需安裝 brotli 套件）或 gzip，小於 COMPRESS_MIN_SIZE 位元組的回應不壓縮
+    COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', 'true').lower() == 'true'
+    COMPRESS_ALGORITHMS = os.getenv('COMPRESS_ALGORITHMS', 'br,gzip').split(',')
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))  # gzip 1-9
+    COMPRESS_BR_LEVEL = int(os.getenv('COMPRESS_BR_LEVEL', 4))  # brotli 0-11，動態回應用中低等級較划算
+    COMPRESS_MIMETYPES = ['application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript']
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -1,10 +1,56 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy.orm import validates, load_only
+from sqlalchemy.dialects.postgresql import JSONB
+from datetime import datetime, date
 import json
 
 db = SQLAlchemy()
 
-class User(db.Model):
+# users.latest_score / latest_completed_at for patients without any assessment, so they sort last (desc) / first (asc)
+NO_LATEST_SCORE = -1
+NO_LATEST_TIME = datetime(1900, 1, 1)
+
+# JSON 欄位：PostgreSQL 用 JSONB，其他資料庫（SQLite）用 JSON；讀取時由欄位型別解碼一次
+JSONType = db.JSON().with_variant(JSONB(), 'postgresql')
+
+
+def _decode_json_value(value, default):
+    """Accept JSON text from older callers / rows and return the decoded value"""
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return default
+    return default if value is None else value
+
+
+class ProjectionMixin:
+    """
+    Named to_dict() projections: 'full' plus the keys of PROJECTION_COLUMNS
+
+    PROJECTION_COLUMNS lists the columns to_dict() reads for each smaller
+    projection, so list queries can load only those with projection_options().
+    """
+    PROJECTION_COLUMNS = {}
+    
+    @classmethod
+    def check_projection(cls, projection):
+        """Return projection, or raise ValueError (user-facing message) if the model has no such projection"""
+        names = tuple(cls.PROJECTION_COLUMNS) + ('full',)
+        if projection not in names:
+            raise ValueError(f"fields 必須為 {', '.join(names)} 之一")
+        return projection
+    
+    @classmethod
+    def projection_options(cls, projection, *extra_columns):
+        """Query options loading only the columns to_dict(projection) reads (plus extra_columns)"""
+        if cls.check_projection(projection) == 'full':
+            return []
+        columns = [getattr(cls, name) for name in cls.PROJECTION_COLUMNS[projection]]
+        return [load_only(*columns, *extra_columns)]
+
+
+class User(ProjectionMixin, db.Model):
     """User model"""
     __tablename__ = 'users'
     
@@ -42,22 +88,63 @@ class User(db.Model):
     is_profile_completed = db.Column(db.Boolean, default=False)
     has_consented = db.Column(db.Boolean, default=False)
     group = db.Column(db.String(20), default='clinical')  # 'student' or 'clinical'
+    # 最新一筆未刪除評估（儲存 / 刪除 / 還原時由 refresh_latest_assessment 更新）
+    latest_assessment_id = db.Column(db.Integer, nullable=True)
+    # 同一筆評估的分數與時間，讓病人列表依最新分數 / 時間排序時可走索引（無評估時為 NO_LATEST_*）
+    latest_score = db.Column(db.Integer, nullable=False, default=NO_LATEST_SCORE, server_default=str(NO_LATEST_SCORE))
+    latest_completed_at = db.Column(db.DateTime, nullable=False, default=NO_LATEST_TIME,
+                                    server_default=NO_LATEST_TIME.strftime('%Y-%m-%d %H:%M:%S'))
+    # 連續評估天數：截至 last_streak_date 的連續天數（由 app.utils.streaks 維護）
+    current_streak = db.Column(db.Integer, nullable=False, default=0)
+    last_streak_date = db.Column(db.Date, nullable=True)
+    # 評估 / 日記 / 警報任何寫入時遞增，作為 GET 的 ETag（見 app.utils.data_version）
+    data_version = db.Column(db.Integer, nullable=False, default=0)
+    
+    # 管理端病人列表的篩選 / 排序 (keyset 分頁以 id 作為第二排序鍵)
+    __table_args__ = (
+        db.Index('ix_users_name_id', 'name', 'id'),
+        db.Index('ix_users_group_id', 'group', 'id'),
+        db.Index('ix_users_last_login_date', 'last_login_date'),
+        db.Index('ix_users_latest_score_id', 'latest_score', 'id'),
+        db.Index('ix_users_latest_completed_at_id', 'latest_completed_at', 'id'),
+    )
     
     # Relationship
     histories = db.relationship('AssessmentHistory', backref='user', lazy=True, cascade='all, delete-orphan')
     diaries = db.relationship('Diary', backref='user', lazy=True, cascade='all, delete-orphan')
+    daily_scores = db.relationship('UserDailyScore', backref='user', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
-        """Convert user to dictionary"""
-        return {
+    # summary: 名稱 / 分組等識別欄位；list: 再加上列表顯示的狀態欄位；full: 完整個人資料
+    PROJECTION_COLUMNS = {
+        'summary': ('id', 'email', 'name', 'nickname', 'group'),
+        'list': ('id', 'email', 'name', 'nickname', 'group', 'created_at', 'is_profile_completed',
+                 'current_streak', 'last_streak_date'),
+    }
+    
+    def to_dict(self, projection='full'):
+        """Convert user to dictionary (projection: 'summary', 'list' or 'full')"""
+        self.check_projection(projection)
+        data = {
             'id': self.id,
             'email': self.email,
             'name': self.name,
-            'created_at': str(self.created_at) if self.created_at else None,
-            'daily_login_count': self.daily_login_count,
-            'is_profile_completed': bool(self.is_profile_completed) if self.is_profile_completed is not None else False,
             'nickname': self.nickname,
-            'dob':  str(self.dob) if self.dob else None,
+            'group': self.group
+        }
+        if projection == 'summary':
+            return data
+        
+        data.update({
+            'created_at': self.created_at,
+            'is_profile_completed': bool(self.is_profile_completed) if self.is_profile_completed is not None else False,
+            'consecutive_days': self.calculate_streak()
+        })
+        if projection == 'list':
+            return data
+        
+        data.update({
+            'daily_login_count': self.daily_login_count,
+            'dob': self.dob,
             'gender': self.gender,
             'height': self.height,
             'weight': self.weight,
@@ -77,51 +164,47 @@ class User(db.Model):
             'cohabitant_count': self.cohabitant_count,
             'religion': bool(self.religion) if self.religion is not None else False,
             'religion_other': self.religion_other,
-            'group': self.group,
-            'has_consented': bool(self.has_consented) if self.has_consented is not None else False,
-            'consecutive_days': self.calculate_streak()
-        }
+            'has_consented': bool(self.has_consented) if self.has_consented is not None else False
+        })
+        return data
 
-    def calculate_streak(self):
-        """Calculate consecutive days of assessments"""
-        if not self.histories:
-            return 0
-            
-        from datetime import datetime, date
-        temp_dates = []
-        for h in self.histories:
-            val = h.completed_at
-            if not val: continue
-            
-            # 如果是字串，轉成 date 物件
-            if isinstance(val, str):
-                try:
-                    temp_dates.append(datetime.strptime(val[:10], '%Y-%m-%d').date())
-                except: continue
-            # 如果已經是日期物件，直接取 date()
-            elif hasattr(val, 'date'):
-                temp_dates.append(val.date())
-                
-        dates = sorted(list(set(temp_dates)), reverse=True)
-        if not dates:
+    def calculate_streak(self, today=None):
+        """Consecutive days of assessments, from the stored streak state (no history scan)"""
+        if not self.current_streak or not self.last_streak_date:
             return 0
-            
-        today = datetime.now().date()
+        
+        today = today or datetime.now().date()
         
         # 檢查最近一次測試是否在今天或昨天
-        if (today - dates[0]).days > 1:
+        if (today - self.last_streak_date).days > 1:
             return 0
-            
-        streak = 1
-        for i in range(len(dates) - 1):
-            if (dates[i] - dates[i+1]).days == 1:
-                streak += 1
-            else:
-                break
-        return streak
+        return self.current_streak
+
+
+def _day_of(completed_at):
+    """
+    The day a completed_at value falls on (None stays None)
+
+    Raises:
+        ValueError: completed_at is neither a date/datetime nor an ISO 8601 string
+    """
+    if completed_at is None:
+        return None
+    if isinstance(completed_at, datetime):
+        return completed_at.date()
+    if isinstance(completed_at, date):
+        return completed_at
+    if isinstance(completed_at, str):
+        return datetime.fromisoformat(completed_at).date()
+    raise ValueError(f'completed_at must be a datetime, date or ISO 8601 string, got {type(completed_at).__name__}')
 
 
-class AssessmentHistory(db.Model):
+def _completed_date_default(context):
+    """Fill completed_date from the row's completed_at (or its datetime.now default) on insert"""
+    return _day_of(context.get_current_parameters().get('completed_at'))
+
+
+class AssessmentHistory(ProjectionMixin, db.Model):
     """Assessment history model"""
     __tablename__ = 'assessment_history'
     
@@ -130,46 +213,114 @@ class AssessmentHistory(db.Model):
     total_score = db.Column(db.Integer, nullable=False)
     max_score = db.Column(db.Integer, nullable=False)
     level = db.Column(db.String(50), nullable=False)
-    answers = db.Column(db.Text, nullable=False)  # JSON string
+    answers = db.Column(JSONType, nullable=False)  # [{"questionId": 1, "score": 2}, ...]
     completed_at = db.Column(db.DateTime, default=datetime.now)
+    # 由 completed_at 衍生的日期，讓「某天」的查詢可以走索引 (取代 func.date(completed_at))
+    completed_date = db.Column(db.Date, nullable=True, default=_completed_date_default)
     is_deleted = db.Column(db.Boolean, default=False)
     deleted_at = db.Column(db.DateTime, nullable=True)
     delete_reason = db.Column(db.String(255), nullable=True)
     
-    def to_dict(self):
-        """Convert assessment history to dictionary - 安全防護版"""
+    __table_args__ = (
+        db.Index('ix_assessment_history_user_deleted_completed', 'user_id', 'is_deleted', 'completed_at'),
+        db.Index('ix_assessment_history_completed_date_deleted', 'completed_date', 'is_deleted'),
+        # 回收桶清除只掃描已刪除的列（部分索引）
+        db.Index('ix_assessment_history_trash_deleted_at', 'deleted_at',
+                 sqlite_where=db.text('is_deleted = 1'), postgresql_where=db.text('is_deleted')),
+    )
+    
+    @validates('completed_at')
+    def _sync_completed_date(self, key, value):
+        """Keep completed_date in step whenever completed_at is assigned"""
+        self.completed_date = _day_of(value)
+        return value
+    
+    @classmethod
+    def active(cls):
+        """
+        SQL condition for assessments that are not in the recycle bin
+
+        Every query that counts or aggregates active assessments uses this
+        (is_deleted, which the indexes cover) rather than deleted_at.
+        """
+        return cls.is_deleted == False
+    
+    @validates('answers')
+    def _decode_answers(self, key, value):
+        return _decode_json_value(value, [])
+    
+    @staticmethod
+    def level_for(group, total_score):
+        """Level label for a score: students need attention from 23, everyone else from 30"""
+        if group == 'student':
+            return '需要關注' if total_score >= 23 else '良好'
+        return '需要關注' if total_score >= 30 else '良好'
+    
+    # summary: 分數與等級；list: 再加上刪除狀態；full: 再加上 answers
+    PROJECTION_COLUMNS = {
+        'summary': ('id', 'total_score', 'max_score', 'level', 'completed_at'),
+        'list': ('id', 'total_score', 'max_score', 'level', 'completed_at',
+                 'is_deleted', 'deleted_at', 'delete_reason'),
+    }
+    
+    def to_dict(self, projection='full'):
+        """Convert assessment history to dictionary - 安全防護版 (projection: 'summary', 'list' or 'full')"""
+        self.check_projection(projection)
+        
         # 1. 這裡維持原樣，這是算進度條用的
         percentage = round((self.total_score / self.max_score) * 100) if self.max_score > 0 else 0
         
-        # 2. 【核心修正】：判斷 answers 的類型
-        answers_data = self.answers
-        if isinstance(answers_data, str):  # 只有當它是「字串」時，才需要 json.loads
-            try:
-                import json
-                answers_data = json.loads(answers_data)
-            except:
-                answers_data = []
-        elif answers_data is None:
-            answers_data = []
-        # 如果 answers_data 本來就是 list，它會直接跳過上面的判斷，平安抵達 return
-
-        # 3. 變數一個都不能少！全部回傳給前端
-        return {
+        data = {
             'id': self.id,
             'total_score': self.total_score,
             'max_score': self.max_score,
             'level': self.level,
             'percentage': percentage,
-            'answers': answers_data, # 使用處理完的資料
-            'completed_at': str(self.completed_at) if self.completed_at else None,
+            'completed_at': self.completed_at
+        }
+        if projection == 'summary':
+            return data
+        
+        data.update({
             'is_deleted': bool(self.is_deleted),
-            'deleted_at': str(self.deleted_at) if self.deleted_at else None,
+            'deleted_at': self.deleted_at,
             'delete_reason': self.delete_reason
-        }
+        })
+        if projection == 'list':
+            return data
+        
+        # 2. answers 已由 JSON 欄位解碼；只有尚未遷移的舊資料才會是字串
+        data['answers'] = _decode_json_value(self.answers, [])
+        return data
 
 
 
-class Diary(db.Model):
+class UserDailyScore(db.Model):
+    """Per-user daily score aggregate of non-deleted assessments"""
+    __tablename__ = 'user_daily_scores'
+    
+    # (user_id, day) primary key doubles as the lookup index for MA windows
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    score_sum = db.Column(db.Integer, nullable=False, default=0)
+    score_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    @property
+    def average(self):
+        return self.score_sum / self.score_count if self.score_count else None
+    
+    def to_dict(self):
+        """Convert daily aggregate to dictionary"""
+        return {
+            'user_id': self.user_id,
+            'day': self.day,
+            'score_sum': self.score_sum,
+            'score_count': self.score_count,
+            'average': self.average
+        }
+
+
+class Diary(ProjectionMixin, db.Model):
     """Diary model"""
     __tablename__ = 'diaries'
     
@@ -178,7 +329,7 @@ class Diary(db.Model):
     date = db.Column(db.Date, nullable=False)  # 使用者選擇的日期
     mood = db.Column(db.String(50), nullable=True)  # 情緒表情 key（可選，允許只標記生理期）
     content = db.Column(db.Text, nullable=True)  # 文字內容（可選）
-    images = db.Column(db.Text, nullable=True)  # 圖片路徑（JSON 陣列字串）
+    images = db.Column(JSONType, nullable=True)  # 圖片路徑陣列
     period_marker = db.Column(db.Boolean, default=False)  # 是否為生理期
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
@@ -188,31 +339,38 @@ class Diary(db.Model):
     #     db.UniqueConstraint('user_id', 'date', name='unique_user_diary_per_day'),
     # )
     
-    def to_dict(self):
-        """Convert diary to dictionary"""
-        images_data = self.images
-        if isinstance(images_data, str):
-            try:
-                images_data = json.loads(images_data)
-            except:
-                images_data = []
-        elif images_data is None:
-            images_data = []
-
-        return {
+    @validates('images')
+    def _decode_images(self, key, value):
+        return _decode_json_value(value, [])
+    
+    # summary: 日曆標記（日期、心情、生理期）；full: 再加上內容與圖片
+    PROJECTION_COLUMNS = {
+        'summary': ('id', 'user_id', 'date', 'mood', 'period_marker'),
+    }
+    
+    def to_dict(self, projection='full'):
+        """Convert diary to dictionary (projection: 'summary' or 'full')"""
+        self.check_projection(projection)
+        data = {
             'id': self.id,
             'user_id': self.user_id,
-            'date': str(self.date) if self.date else None,
+            'date': self.date,
             'mood': self.mood,
-            'content': self.content,
-            'images': images_data,
-            'period_marker': bool(self.period_marker) if self.period_marker is not None else False,
-            'created_at': str(self.created_at) if self.created_at else None,
-            'updated_at': str(self.updated_at) if self.updated_at else None
+            'period_marker': bool(self.period_marker) if self.period_marker is not None else False
         }
+        if projection == 'summary':
+            return data
+        
+        data.update({
+            'content': self.content,
+            'images': _decode_json_value(self.images, []),
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        })
+        return data
 
 
-class ScoreAlert(db.Model):
+class ScoreAlert(ProjectionMixin, db.Model):
     """Score Alert model - tracks when daily average exceeds moving averages"""
     __tablename__ = 'score_alerts'
     
@@ -220,37 +378,102 @@ class ScoreAlert(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     alert_date = db.Column(db.Date, nullable=False)
     daily_average = db.Column(db.Float, nullable=False)
-    exceeded_lines = db.Column(db.Text, nullable=False)  # JSON: {"7日": 38, "14日": 35}
+    exceeded_lines = db.Column(JSONType, nullable=False)  # {"7日": 38, "14日": 35}
     alert_type = db.Column(db.String(10), default='high', nullable=False)  # 'high' or 'low'
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.now)
     
+    __table_args__ = (
+        db.Index('ix_score_alerts_user_date', 'user_id', 'alert_date'),
+    )
+    
     # Relationship
     user = db.relationship('User', backref='score_alerts')
     
-    def to_dict(self):
-        """Convert score alert to dictionary - 同樣加上 JSON 安全防護"""
-        import json
-        
-        # 1. 處理 exceeded_lines 的類型衝突
-        lines_data = self.exceeded_lines
-        if isinstance(lines_data, str): # 如果從資料庫出來是字串（如 SQLite）
-            try:
-                lines_data = json.loads(lines_data)
-            except:
-                lines_data = {}
-        elif lines_data is None:
-            lines_data = {}
-        # 如果已經是 dict，則直接使用
-
-        return {
+    @validates('exceeded_lines')
+    def _decode_exceeded_lines(self, key, value):
+        return _decode_json_value(value, {})
+    
+    # summary: 鈴鐺 / 未讀狀態；full: 再加上穿越的線與建立時間
+    PROJECTION_COLUMNS = {
+        'summary': ('id', 'user_id', 'alert_date', 'daily_average', 'alert_type', 'is_read'),
+    }
+    
+    def to_dict(self, projection='full'):
+        """Convert score alert to dictionary - 同樣加上 JSON 安全防護 (projection: 'summary' or 'full')"""
+        self.check_projection(projection)
+        data = {
             'id': self.id,
             'user_id': self.user_id,
-            'alert_date': str(self.alert_date) if self.alert_date else None,
+            'alert_date': self.alert_date,
             'daily_average': float(self.daily_average) if self.daily_average else 0,
             'score_alerts_alert_type': self.alert_type, # 確保與前端對接的 key 一致
             'alert_type': self.alert_type,
-            'exceeded_lines': lines_data, # 這裡現在保證是字典格式了
-            'is_read': bool(self.is_read) if hasattr(self, 'is_read') else False,
-            'created_at': str(self.created_at) if self.created_at else None
+            'is_read': bool(self.is_read) if hasattr(self, 'is_read') else False
         }
+        if projection == 'summary':
+            return data
+        
+        data.update({
+            'exceeded_lines': _decode_json_value(self.exceeded_lines, {}), # 這裡現在保證是字典格式了
+            'created_at': self.created_at
+        })
+        return data
+
+
+class AlertJob(db.Model):
+    """Durable queue of post-save work (alert evaluation, auto-watchlist)"""
+    __tablename__ = 'alert_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    job_date = db.Column(db.Date, nullable=False)  # 要重新評估的日期
+    kind = db.Column(db.String(30), nullable=False, default='assessment_saved')
+    trigger_score = db.Column(db.Integer, nullable=True)  # 合併事件中的最高分數（自動關注用）
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending / running / done / failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    __table_args__ = (
+        db.Index('ix_alert_jobs_status_id', 'status', 'id'),
+        db.Index('ix_alert_jobs_user_date_kind', 'user_id', 'job_date', 'kind', 'status'),
+        # 維護工作刪除已完成 / 失敗的舊工作
+        db.Index('ix_alert_jobs_status_updated', 'status', 'updated_at'),
+    )
+    
+    def to_dict(self):
+        """Convert job to dictionary"""
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'job_date': self.job_date,
+            'kind': self.kind,
+            'trigger_score': self.trigger_score,
+            'status': self.status,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+
+class IdempotencyKey(db.Model):
+    """Response of a write made with an Idempotency-Key header, replayed on retries until expires_at"""
+    __tablename__ = 'idempotency_keys'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    endpoint = db.Column(db.String(50), nullable=False)  # 例如 'history.save'，同一個 key 可用於不同端點
+    key = db.Column(db.String(255), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)  # 請求內容的 SHA-256，避免同一 key 用於不同內容
+    status_code = db.Column(db.Integer, nullable=True)  # None = 第一個請求仍在處理中
+    response_body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'endpoint', 'key', name='uq_idempotency_keys_user_endpoint_key'),
+        db.Index('ix_idempotency_keys_expires_at', 'expires_at'),
+    )
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import db, User
 from app.admin_models import HealthcareStaff, PatientAssignment
+from app.utils.alert_counts import invalidate_alert_counts
 from datetime import datetime
 
 admin_assignments_bp = Blueprint('admin_assignments', __name__)
@@ -37,8 +38,15 @@ def get_assignments():
         p_ids = [a.patient_id for a in assignments]
         s_ids = [a.staff_id for a in assignments]
         
-        patients_map = {p.id: p for p in User.query.filter(User.id.in_(p_ids)).all()} if p_ids else {}
-        staff_map = {s.id: s for s in HealthcareStaff.query.filter(HealthcareStaff.id.in_(s_ids)).all()} if s_ids else {}
+        # 列表只需要識別欄位（summary），不載入完整個人資料
+        patients_map = {
+            p.id: p for p in User.query.options(*User.projection_options('summary')).filter(User.id.in_(p_ids)).all()
+        } if p_ids else {}
+        staff_map = {
+            s.id: s for s in HealthcareStaff.query.options(
+                *HealthcareStaff.projection_options('summary')
+            ).filter(HealthcareStaff.id.in_(s_ids)).all()
+        } if s_ids else {}
 
         result = []
         for assignment in assignments:
@@ -46,8 +54,8 @@ def get_assignments():
             assigned_staff = staff_map.get(assignment.staff_id)
             
             assignment_dict = assignment.to_dict()
-            assignment_dict['patient'] = patient.to_dict() if patient else None
-            assignment_dict['staff'] = assigned_staff.to_dict() if assigned_staff else None
+            assignment_dict['patient'] = patient.to_dict('summary') if patient else None
+            assignment_dict['staff'] = assigned_staff.to_dict('summary') if assigned_staff else None
             
             result.append(assignment_dict)
         
@@ -111,6 +119,7 @@ def create_assignment():
         
         db.session.add(assignment)
         db.session.commit()
+        invalidate_alert_counts()
         
         return jsonify({
             'success': True,
@@ -143,6 +152,7 @@ def delete_assignment(assignment_id):
         
         db.session.delete(assignment)
         db.session.commit()
+        invalidate_alert_counts()
         
         return jsonify({
             'success': True,
@@ -169,11 +179,11 @@ def get_staff_list():
             return jsonify({'success': False, 'message': '無權限查看護理師列表'}), 403
         
         # Get all staff members
-        all_staff = HealthcareStaff.query.all()
+        all_staff = HealthcareStaff.query.options(*HealthcareStaff.projection_options('summary')).all()
         
         return jsonify({
             'success': True,
-            'staff': [s.to_dict() for s in all_staff]
+            'staff': [s.to_dict('summary') for s in all_staff]
         }), 200
         
     except Exception as e:
@@ -1,6 +1,7 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import db, User, Diary
+from app.models import db, Diary
+from app.utils.data_version import data_etag, not_modified, with_etag
 from sqlalchemy import desc
 
 admin_diary_bp = Blueprint('admin_diary', __name__)
@@ -22,21 +23,28 @@ def get_patient_diaries(patient_id):
         staff_id = verify_admin()
         if not staff_id:
             return jsonify({'success': False, 'message': '無效的管理員權限'}), 403
+        try:
+            fields = Diary.check_projection(request.args.get('fields', 'full'))
+        except ValueError as arg_err:
+            return jsonify({'success': False, 'message': str(arg_err)}), 400
         
-        # Verify patient exists
-        patient = User.query.get(patient_id)
-        if not patient:
+        # Verify patient exists (and answer 304 if the client is up to date)
+        etag = data_etag(patient_id)
+        if etag is None:
             return jsonify({'success': False, 'message': '病人不存在'}), 404
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
         
         # Get patient's diaries
-        diaries = Diary.query.filter_by(
+        diaries = Diary.query.options(*Diary.projection_options(fields)).filter_by(
             user_id=patient_id
         ).order_by(desc(Diary.date)).all()
         
-        return jsonify({
+        return with_etag(jsonify({
             'success': True,
-            'diaries': [diary.to_dict() for diary in diaries]
-        }), 200
+            'diaries': [diary.to_dict(fields) for diary in diaries]
+        }), etag), 200
         
     except Exception as e:
         return jsonify({'success': False, 'message': f'獲取日記失敗: {str(e)}'}), 500
@@ -1,9 +1,15 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import db, User, AssessmentHistory
+from app.utils.daily_scores import get_daily_scores
+from app.utils.trend_series import build_ma_series, downsample_series
+from app.utils.alert_counts import get_alert_counts
+from app.utils.data_version import data_etag, not_modified, with_etag
+from app.utils.patient_list import parse_list_args, query_patient_page, INACTIVE_DAYS
+from app.utils.patient_search import parse_search_args, search_patients
+from app.utils.history_page import encode_cursor, parse_history_args, query_history_page
 from sqlalchemy import func, desc
 from datetime import datetime, timedelta
-import json
 
 admin_patients_bp = Blueprint('admin_patients', __name__)
 
@@ -24,18 +30,20 @@ def get_patients():
         staff_id = verify_admin()
         if not staff_id: return jsonify({'success': False, 'message': '權限不足'}), 403
         
-        from app.admin_models import HealthcareStaff, PatientWatchlist, PatientAssignment
+        from app.admin_models import HealthcareStaff, PatientWatchlist
         staff = HealthcareStaff.query.get(staff_id)
+        if not staff: return jsonify({'success': False, 'message': '權限不足'}), 403
         
-        # 1. 一次性抓出所有權限內的病人
-        if staff.role == 'super_admin':
-            patients = User.query.all()
-        else:
-            assignments = PatientAssignment.query.filter_by(staff_id=staff_id).all()
-            p_ids = [a.patient_id for a in assignments]
-            if not p_ids: return jsonify({'success': True, 'patients': []}), 200
-            patients = User.query.filter(User.id.in_(p_ids)).all()
-
+        # 篩選、排序與分頁都在 SQL 完成；未帶 limit 時回傳全部（相容舊前端）
+        try:
+            options = parse_list_args(request.args)
+        except ValueError as arg_err:
+            return jsonify({'success': False, 'message': str(arg_err)}), 400
+        
+        # 1. 抓出權限內（且符合篩選）的病人，與 users.latest_assessment_id 指向的最新評估一起取出
+        page, next_cursor = query_patient_page(staff, options)
+        patients = [patient for patient, _ in page]
+        latest_map = {patient.id: latest for patient, latest in page if latest}
         p_ids = [p.id for p in patients]
         
         # 批量獲取 Watchlist 狀態
@@ -45,19 +53,6 @@ def get_patients():
         ).all() if p_ids else []
         watched_pids = {w.patient_id for w in watch_list_records}
 
-        # 批量獲取最新 AssessmentHistory (以每個 user_id 依據 completed_at 取第一筆)
-        # 用 dict 加快讀取。考慮效能，用一條 Query 做出來，也可以全都拉出來按時間排序取第一筆
-        # 我們直接取這批人的所有記錄，用 Python 去重：
-        histories = AssessmentHistory.query.filter(
-            AssessmentHistory.user_id.in_(p_ids),
-            AssessmentHistory.is_deleted == False
-        ).order_by(desc(AssessmentHistory.completed_at)).all() if p_ids else []
-        
-        latest_map = {}
-        for h in histories:
-            if h.user_id not in latest_map:
-                latest_map[h.user_id] = h
-
         # 2. 獲取所有人的最新評估 (不在迴圈內部打 SQL)
         result = []
         today = datetime.now().date()
@@ -77,31 +72,65 @@ def get_patients():
                     elif hasattr(last_login, 'date'):
                         last_login = last_login.date()
 
-                    if last_login and (today - last_login).days >= 5:
+                    if last_login and (today - last_login).days >= INACTIVE_DAYS:
                         inactive = True
                 else: inactive = True
 
-                # 組裝資料，如果 patient.to_dict() 壞了，我們手動組
-                p_data = {
-                    'id': patient.id,
-                    'name': patient.name,
-                    'email': patient.email,
-                    'group': patient.group,
+                # 列表只回傳 summary 欄位（query_patient_page 也只載入這些欄位）
+                p_data = patient.to_dict('summary')
+                p_data.update({
                     'inactive_warning': inactive,
-                    'latest_assessment': latest.to_dict() if latest else None,
+                    'latest_assessment': latest.to_dict('summary') if latest else None,
                     'is_in_watchlist': patient.id in watched_pids
-                }
+                })
                 result.append(p_data)
             except Exception as item_err:
                 print(f"跳過錯誤個案 {patient.id}: {item_err}")
                 continue # 某個病人資料壞了不要卡住整頁
             
-        return jsonify({'success': True, 'patients': result}), 200
+        return jsonify({
+            'success': True,
+            'patients': result,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        }), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': '伺服器繁忙，請稍後再試'}), 500
 
 
+@admin_patients_bp.route('/search', methods=['GET'])
+@jwt_required()
+def search_patients_route():
+    """Search the caller's patients by name, nickname or email (?q=&limit=), best match first"""
+    db.session.rollback()
+    try:
+        staff_id = verify_admin()
+        if not staff_id:
+            return jsonify({'success': False, 'message': '權限不足'}), 403
+        
+        from app.admin_models import HealthcareStaff
+        staff = HealthcareStaff.query.get(staff_id)
+        if not staff:
+            return jsonify({'success': False, 'message': '權限不足'}), 403
+        
+        try:
+            term, limit = parse_search_args(request.args)
+        except ValueError as arg_err:
+            return jsonify({'success': False, 'message': str(arg_err)}), 400
+        
+        results = []
+        for patient, latest in search_patients(staff, term, limit):
+            p_data = patient.to_dict('summary')
+            p_data['latest_assessment'] = latest.to_dict('summary') if latest else None
+            results.append(p_data)
+        
+        return jsonify({'success': True, 'patients': results}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'搜尋病人失敗: {str(e)}'}), 500
+
+
 @admin_patients_bp.route('/<int:patient_id>', methods=['GET'])
 @jwt_required()
 def get_patient_detail(patient_id):
@@ -138,39 +167,46 @@ def get_patient_statistics(patient_id):
         if not patient:
             return jsonify({'success': False, 'message': '病人不存在'}), 404
         
-        assessments = AssessmentHistory.query.filter_by(
-            user_id=patient_id, is_deleted=False
-        ).order_by(AssessmentHistory.completed_at).all()
+        # ?series=ma：另外回傳伺服器端算好的每日平均與 7/14/30 日均線
+        # 可選 from / to (YYYY-MM-DD) 與 max_points（超過時以 LTTB 降採樣）
+        want_series = request.args.get('series') == 'ma'
+        if want_series:
+            try:
+                series_from = request.args.get('from')
+                series_from = datetime.strptime(series_from, '%Y-%m-%d').date() if series_from else None
+                series_to = request.args.get('to')
+                series_to = datetime.strptime(series_to, '%Y-%m-%d').date() if series_to else datetime.now().date()
+                max_points = request.args.get('max_points', type=int)
+            except ValueError:
+                return jsonify({'success': False, 'message': '日期格式錯誤，請使用 YYYY-MM-DD'}), 400
+            if series_from and series_from > series_to:
+                return jsonify({'success': False, 'message': '起始日期不可晚於結束日期'}), 400
+            if max_points is not None and max_points < 3:
+                return jsonify({'success': False, 'message': 'max_points 至少為 3'}), 400
         
-        if not assessments:
-            return jsonify({
-                'success': True,
-                'statistics': {'total_count': 0, 'average_score': None, 'trend': []}
-            }), 200
+        # 每日彙總表：每天一筆，不必重新掃描所有評估記錄
+        daily_scores = get_daily_scores(patient_id)
         
-        scores = [a.total_score for a in assessments]
-        from collections import defaultdict
-        daily_assessments = defaultdict(list)
+        if not daily_scores:
+            statistics = {'total_count': 0, 'average_score': None, 'trend': []}
+            if want_series:
+                statistics['series'] = []
+                statistics['downsampled'] = False
+            return jsonify({'success': True, 'statistics': statistics}), 200
         
-        for a in assessments:
-            # --- 核心修正：安全處理 completed_at 轉日期 ---
-            dt = a.completed_at
-            if isinstance(dt, str):
-                try:
-                    dt_obj = datetime.strptime(dt[:10], '%Y-%m-%d').date()
-                except:
-                    continue
-            else:
-                dt_obj = dt.date() if hasattr(dt, 'date') else None
-                
-            if dt_obj:
-                daily_assessments[dt_obj].append(a)
+        lowest_score, highest_score, max_score = db.session.query(
+            func.min(AssessmentHistory.total_score),
+            func.max(AssessmentHistory.total_score),
+            func.max(AssessmentHistory.max_score)
+        ).filter(
+            AssessmentHistory.user_id == patient_id,
+            AssessmentHistory.active()
+        ).one()
+        max_score = max_score or 0
         
         trend_data = []
-        for date_key in sorted(daily_assessments.keys()):
-            day_assessments = daily_assessments[date_key]
-            day_avg = sum(a.total_score for a in day_assessments) / len(day_assessments)
-            max_score = day_assessments[0].max_score
+        for date_key, (score_sum, score_count) in daily_scores.items():
+            day_avg = score_sum / score_count
             avg_percentage = round((day_avg / max_score) * 100) if max_score > 0 else 0
             
             trend_data.append({
@@ -180,16 +216,27 @@ def get_patient_statistics(patient_id):
                 'percentage': avg_percentage
             })
         
-        return jsonify({
-            'success': True,
-            'statistics': {
-                'total_count': len(assessments),
-                'average_score': round(sum(scores)/len(scores), 2),
-                'highest_score': max(scores),
-                'lowest_score': min(scores),
-                'trend': trend_data
-            }
-        }), 200
+        total_count = sum(count for _, count in daily_scores.values())
+        total_sum = sum(score_sum for score_sum, _ in daily_scores.values())
+        
+        statistics = {
+            'total_count': total_count,
+            'average_score': round(total_sum / total_count, 2),
+            'highest_score': highest_score,
+            'lowest_score': lowest_score,
+            'trend': trend_data
+        }
+        
+        if want_series:
+            series_from = series_from or next(iter(daily_scores))
+            series = build_ma_series(patient_id, series_from, series_to)
+            sampled = downsample_series(series, max_points)
+            statistics['series'] = sampled
+            statistics['series_from'] = series_from.isoformat()
+            statistics['series_to'] = series_to.isoformat()
+            statistics['downsampled'] = len(sampled) < len(series)
+        
+        return jsonify({'success': True, 'statistics': statistics}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': f'獲取統計數據失敗: {str(e)}'}), 500
@@ -204,28 +251,21 @@ def get_patients_alert_counts():
         if not staff_id:
             return jsonify({'success': False, 'message': '無效的管理員權限'}), 403
         
-        from app.models import ScoreAlert
-        # 修正：加上 db.session.rollback() 預防之前的格式錯誤堵塞
-        alerts = ScoreAlert.query.filter(ScoreAlert.is_read == False).all()
+        from app.admin_models import HealthcareStaff, PatientAssignment
+        staff = HealthcareStaff.query.get(staff_id)
+        if not staff:
+            return jsonify({'success': False, 'message': '無效的管理員權限'}), 403
         
-        alert_details = {}
-        for alert in alerts:
-            p_id = alert.user_id
-            if p_id not in alert_details:
-                alert_details[p_id] = {'high': {'count': 0, 'lines': []}, 'low': {'count': 0, 'lines': []}}
-            
-            try:
-                exceeded = json.loads(alert.exceeded_lines) if alert.exceeded_lines else {}
-            except:
-                exceeded = {}
-            
-            line_names = list(exceeded.keys())
-            if alert.alert_type == 'high':
-                alert_details[p_id]['high']['count'] += 1
-                alert_details[p_id]['high']['lines'].extend(line_names)
-            else:
-                alert_details[p_id]['low']['count'] += 1
-                alert_details[p_id]['low']['lines'].extend(line_names)
+        # 只統計權限內的病人（超級管理員為全部），以 GROUP BY 彙總並短暫快取
+        if staff.role == 'super_admin':
+            cache_key, load_patient_ids = 'all', lambda: None
+        else:
+            cache_key = staff_id
+            load_patient_ids = lambda: [
+                patient_id for (patient_id,) in
+                db.session.query(PatientAssignment.patient_id).filter_by(staff_id=staff_id).all()
+            ]
+        alert_details = get_alert_counts(cache_key, load_patient_ids)
         
         return jsonify({'success': True, 'alert_counts': alert_details}), 200
     except Exception as e:
@@ -241,19 +281,28 @@ def get_patient_history(patient_id):
         staff_id = verify_admin()
         if not staff_id:
             return jsonify({'success': False, 'message': '無效的管理員權限'}), 403
+        try:
+            options = parse_history_args(request.args)
+        except ValueError as arg_err:
+            return jsonify({'success': False, 'message': str(arg_err)}), 400
         
-        patient = User.query.get(patient_id)
-        if not patient:
+        etag = data_etag(patient_id)
+        if etag is None:
             return jsonify({'success': False, 'message': '病人不存在'}), 404
-            
-        histories = AssessmentHistory.query.filter_by(
-            user_id=patient_id, is_deleted=False
-        ).order_by(desc(AssessmentHistory.completed_at)).all()
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
         
-        return jsonify({
+        # 與 /api/history 相同的分頁與日期範圍參數；未帶 limit 時回傳全部
+        histories, next_cursor = query_history_page(patient_id, options)
+        
+        return with_etag(jsonify({
             'success': True,
-            'history': [h.to_dict() for h in histories]
-        }), 200
+            'history': [h.to_dict(options['fields']) for h in histories],
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+            'newest_cursor': encode_cursor(histories[0]) if histories else None
+        }), etag), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': f'獲取歷史記錄失敗: {str(e)}'}), 500
@@ -269,19 +318,28 @@ def get_patient_alerts(patient_id):
             return jsonify({'success': False, 'message': '無效的管理員權限'}), 403
             
         from app.models import ScoreAlert
+        try:
+            fields = ScoreAlert.check_projection(request.args.get('fields', 'full'))
+        except ValueError as arg_err:
+            return jsonify({'success': False, 'message': str(arg_err)}), 400
         
-        patient = User.query.get(patient_id)
-        if not patient:
+        etag = data_etag(patient_id)
+        if etag is None:
             return jsonify({'success': False, 'message': '病人不存在'}), 404
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
             
-        alerts = ScoreAlert.query.filter_by(
+        alerts = ScoreAlert.query.options(
+            *ScoreAlert.projection_options(fields)
+        ).filter_by(
             user_id=patient_id
         ).order_by(desc(ScoreAlert.created_at)).all()
         
-        return jsonify({
+        return with_etag(jsonify({
             'success': True,
-            'alerts': [a.to_dict() for a in alerts]
-        }), 200
+            'alerts': [a.to_dict(fields) for a in alerts]
+        }), etag), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': f'獲取警告記錄失敗: {str(e)}'}), 500
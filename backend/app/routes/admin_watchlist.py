@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import db, User, AssessmentHistory
 from app.admin_models import PatientWatchlist
+from app.utils.dashboard_stats import invalidate_watchlist_count
 from sqlalchemy import desc, func
 
 admin_watchlist_bp = Blueprint('admin_watchlist', __name__)
@@ -24,37 +25,43 @@ def get_watchlist():
         if not staff_id:
             return jsonify({'success': False, 'message': '無效的管理員權限'}), 403
         
-        # Get watchlist items for this staff, ordered by display_order (desc = higher values first)
-        watchlist_items = PatientWatchlist.query.filter_by(
-            staff_id=staff_id
+        # Watchlist items with their patient and latest assessment (via users.latest_assessment_id)
+        # in one query, ordered by display_order (desc = higher values first)
+        rows = db.session.query(
+            PatientWatchlist, User, AssessmentHistory
+        ).join(
+            User, User.id == PatientWatchlist.patient_id
+        ).outerjoin(
+            AssessmentHistory, AssessmentHistory.id == User.latest_assessment_id
+        ).options(
+            *User.projection_options('list', User.last_login_date),
+            *AssessmentHistory.projection_options('summary')
+        ).filter(
+            PatientWatchlist.staff_id == staff_id
         ).order_by(desc(PatientWatchlist.display_order)).all()
         
+        patient_ids = [patient.id for _, patient, _ in rows]
+        
+        # Average score of every listed patient in one grouped query
+        avg_scores = dict(
+            db.session.query(
+                AssessmentHistory.user_id,
+                func.avg(AssessmentHistory.total_score)
+            ).filter(
+                AssessmentHistory.user_id.in_(patient_ids),
+                AssessmentHistory.active()
+            ).group_by(AssessmentHistory.user_id).all()
+        ) if patient_ids else {}
+        
         result = []
         from datetime import datetime
         today = datetime.now().date()
         
-        for item in watchlist_items:
-            # Get patient details
-            patient = User.query.get(item.patient_id)
-            if not patient:
-                continue
-            
-            # Get latest assessment
-            latest_assessment = AssessmentHistory.query.filter_by(
-                user_id=patient.id,
-                is_deleted=False
-            ).order_by(desc(AssessmentHistory.completed_at)).first()
-            
-            # Get average score
-            avg_score = db.session.query(
-                func.avg(AssessmentHistory.total_score)
-            ).filter_by(
-                user_id=patient.id,
-                is_deleted=False
-            ).scalar()
+        for item, patient, latest_assessment in rows:
+            avg_score = avg_scores.get(patient.id)
             
             watchlist_data = item.to_dict()
-            patient_data = patient.to_dict()
+            patient_data = patient.to_dict('list')  # consecutive_days 為已儲存的連續天數，不再掃描歷史
             
             # Check if patient has been inactive for 5+ days
             inactive_warning = False
@@ -68,7 +75,7 @@ def get_watchlist():
             
             patient_data['inactive_warning'] = inactive_warning
             watchlist_data['patient'] = patient_data
-            watchlist_data['latest_assessment'] = latest_assessment.to_dict() if latest_assessment else None
+            watchlist_data['latest_assessment'] = latest_assessment.to_dict('summary') if latest_assessment else None
             watchlist_data['average_score'] = round(float(avg_score), 2) if avg_score else None
             
             result.append(watchlist_data)
@@ -127,6 +134,7 @@ def add_to_watchlist():
         
         db.session.add(new_item)
         db.session.commit()
+        invalidate_watchlist_count(staff_id)
         
         return jsonify({
             'success': True,
@@ -159,6 +167,7 @@ def remove_from_watchlist(patient_id):
         
         db.session.delete(item)
         db.session.commit()
+        invalidate_watchlist_count(staff_id)
         
         return jsonify({
             'success': True,
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import db, ScoreAlert
+from app.utils.alert_counts import invalidate_alert_counts
+from app.utils.data_version import bump_data_version, data_etag, not_modified, with_etag
 from datetime import datetime
 
 alerts_bp = Blueprint('alerts', __name__)
@@ -11,16 +13,24 @@ def get_alerts():
     """Get user's all alerts"""
     try:
         current_user_id = int(get_jwt_identity())
+        try:
+            fields = ScoreAlert.check_projection(request.args.get('fields', 'full'))
+        except ValueError as arg_err:
+            return jsonify({'success': False, 'message': str(arg_err)}), 400
+        etag = data_etag(current_user_id)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
         
         # Get all alerts for user, ordered by date descending
-        alerts = ScoreAlert.query.filter_by(
+        alerts = ScoreAlert.query.options(*ScoreAlert.projection_options(fields)).filter_by(
             user_id=current_user_id
         ).order_by(ScoreAlert.alert_date.desc()).all()
         
-        return jsonify({
+        return with_etag(jsonify({
             'success': True,
-            'alerts': [alert.to_dict() for alert in alerts]
-        }), 200
+            'alerts': [alert.to_dict(fields) for alert in alerts]
+        }), etag), 200
         
     except Exception as e:
         return jsonify({'success': False, 'message': f'獲取警告失敗: {str(e)}'}), 500
@@ -32,16 +42,20 @@ def get_unread_count():
     """Get count of unread alerts"""
     try:
         current_user_id = int(get_jwt_identity())
+        etag = data_etag(current_user_id)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
         
         count = ScoreAlert.query.filter_by(
             user_id=current_user_id,
             is_read=False
         ).count()
         
-        return jsonify({
+        return with_etag(jsonify({
             'success': True,
             'count': count
-        }), 200
+        }), etag), 200
         
     except Exception as e:
         return jsonify({'success': False, 'message': f'獲取未讀數量失敗: {str(e)}'}), 500
@@ -66,7 +80,9 @@ def mark_as_read(alert_id):
         
         # Mark as read
         alert.is_read = True
+        bump_data_version(current_user_id)
         db.session.commit()
+        invalidate_alert_counts()
         
         return jsonify({
             'success': True,
@@ -95,7 +111,10 @@ def mark_all_read():
         for alert in alerts:
             alert.is_read = True
         
+        if alerts:
+            bump_data_version(current_user_id)
         db.session.commit()
+        invalidate_alert_counts()
         
         return jsonify({
             'success': True,
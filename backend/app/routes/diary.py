@@ -2,8 +2,9 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 from app.models import db, Diary, User
+from app.utils.data_version import bump_data_version, data_etag, not_modified, with_etag
+from app.utils.idempotency import idempotent
 from datetime import datetime, date
-import json
 import os
 
 diary_bp = Blueprint('diary', __name__)
@@ -22,13 +23,21 @@ def get_diaries():
     """獲取使用者所有日記（依日期排序）"""
     try:
         current_user_id = int(get_jwt_identity())
+        try:
+            fields = Diary.check_projection(request.args.get('fields', 'full'))
+        except ValueError as arg_err:
+            return jsonify({'success': False, 'message': str(arg_err)}), 400
+        etag = data_etag(current_user_id)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
         
         # 獲取查詢參數
         year = request.args.get('year', type=int)
         month = request.args.get('month', type=int)
         
         # 基本查詢
-        query = Diary.query.filter_by(user_id=current_user_id)
+        query = Diary.query.options(*Diary.projection_options(fields)).filter_by(user_id=current_user_id)
         
         # 如果有年月篩選
         if year and month:
@@ -45,10 +54,10 @@ def get_diaries():
         # 依日期降序排序（最新的在前）
         diaries = query.order_by(Diary.date.desc()).all()
         
-        return jsonify({
+        return with_etag(jsonify({
             'success': True,
-            'diaries': [d.to_dict() for d in diaries]
-        }), 200
+            'diaries': [d.to_dict(fields) for d in diaries]
+        }), etag), 200
         
     except Exception as e:
         return jsonify({'success': False, 'message': f'獲取日記失敗: {str(e)}'}), 500
@@ -60,6 +69,10 @@ def get_diary_by_date(date_str):
     """獲取特定日期的日記"""
     try:
         current_user_id = int(get_jwt_identity())
+        etag = data_etag(current_user_id)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
         
         # 解析日期字串 (格式: YYYY-MM-DD)
         diary_date = datetime.strptime(date_str, '%Y-%m-%d').date()
@@ -70,10 +83,10 @@ def get_diary_by_date(date_str):
         if not diary:
             return jsonify({'success': False, 'message': '該日期沒有日記'}), 404
         
-        return jsonify({
+        return with_etag(jsonify({
             'success': True,
             'diary': diary.to_dict()
-        }), 200
+        }), etag), 200
         
     except ValueError:
         return jsonify({'success': False, 'message': '日期格式錯誤，應為 YYYY-MM-DD'}), 400
@@ -83,6 +96,7 @@ def get_diary_by_date(date_str):
 
 @diary_bp.route('', methods=['POST'])
 @jwt_required()
+@idempotent('diary.create')
 def create_diary():
     """創建新日記"""
     try:
@@ -107,11 +121,12 @@ def create_diary():
             date=diary_date,
             mood=data.get('mood'),  # 允許為 None
             content=data.get('content'),
-            images=json.dumps(data.get('images', []), ensure_ascii=False),
+            images=data.get('images', []),
             period_marker=data.get('period_marker', False)
         )
         
         db.session.add(new_diary)
+        bump_data_version(current_user_id)
         db.session.commit()
         
         return jsonify({
@@ -133,6 +148,10 @@ def get_diary_by_id(diary_id):
     """根據 ID 獲取日記"""
     try:
         current_user_id = int(get_jwt_identity())
+        etag = data_etag(current_user_id)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
         
         # 查找日記
         diary = Diary.query.get(diary_id)
@@ -144,10 +163,10 @@ def get_diary_by_id(diary_id):
         if diary.user_id != current_user_id:
             return jsonify({'success': False, 'message': '無權限查看此日記'}), 403
         
-        return jsonify({
+        return with_etag(jsonify({
             'success': True,
             'diary': diary.to_dict()
-        }), 200
+        }), etag), 200
         
     except Exception as e:
         return jsonify({'success': False, 'message': f'獲取日記失敗: {str(e)}'}), 500
@@ -177,11 +196,12 @@ def update_diary(diary_id):
         if 'content' in data:
             diary.content = data['content']
         if 'images' in data:
-            diary.images = json.dumps(data['images'], ensure_ascii=False)
+            diary.images = data['images']
         if 'period_marker' in data:
             diary.period_marker = data['period_marker']
         
         diary.updated_at = datetime.utcnow()
+        bump_data_version(current_user_id)
         
         db.session.commit()
         
@@ -216,7 +236,7 @@ def delete_diary(diary_id):
         # 刪除關聯的圖片檔案
         if diary.images:
             try:
-                images_list = json.loads(diary.images)
+                images_list = diary.images
                 upload_folder = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads', 'diary_images')
                 for image_path in images_list:
                     file_path = os.path.join(upload_folder, os.path.basename(image_path))
@@ -227,6 +247,7 @@ def delete_diary(diary_id):
                 print(f"刪除圖片失敗: {img_error}")
         
         db.session.delete(diary)
+        bump_data_version(current_user_id)
         db.session.commit()
         
         return jsonify({
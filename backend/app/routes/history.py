@@ -1,51 +1,47 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import db, AssessmentHistory, User
-from app.admin_models import PatientAssignment, PatientWatchlist, HealthcareStaff
+from app.utils.daily_scores import add_history_score, get_daily_summary, remove_history_score
+from app.utils.data_version import bump_data_version, data_etag, not_modified, with_etag
+from app.utils.history_page import encode_cursor, parse_date_range, parse_history_args, query_history_page
+from app.utils.history_batch import parse_batch, save_history_batch
+from app.utils.idempotency import idempotent
+from app.utils.latest_assessment import refresh_latest_assessment
+from app.utils.streaks import record_assessment_day, refresh_streak_for_day
+from app.utils.task_queue import JOB_HISTORY_CHANGED, defer, notify_workers, run_inline
 from sqlalchemy import desc
-from datetime import datetime, timedelta
-import json
+from datetime import datetime
 
 history_bp = Blueprint('history', __name__)
 
 @history_bp.route('', methods=['GET'])
 @jwt_required()
 def get_history():
-    """Get user's assessment history (active only)"""
+    """Get user's assessment history (active only; ?limit=&before=&after=&from=&to=&fields=)"""
     try:
         current_user_id = int(get_jwt_identity())
-        
-        # 1. 自動清理垃圾桶 (加入 rollback 保護)
         try:
-            ten_days_ago = datetime.now() - timedelta(days=10)
-            
-            # 這裡我們用比較保險的過濾方式
-            old_trash = AssessmentHistory.query.filter(
-                AssessmentHistory.is_deleted == True,
-                AssessmentHistory.deleted_at < ten_days_ago
-            ).all()
-            
-            for item in old_trash:
-                db.session.delete(item)
-            
-            if old_trash:
-                db.session.commit()
-        except Exception as e:
-            db.session.rollback() # 重要：出錯立刻回滾，不影響下面的查詢
-            print(f"Auto-cleanup failed: {e}")
-
-        # 2. 獲取正常歷史紀錄
+            options = parse_history_args(request.args)
+        except ValueError as arg_err:
+            return jsonify({'success': False, 'message': str(arg_err)}), 400
+        etag = data_etag(current_user_id)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        
+        # 回收桶過期項目由背景維護工作清除（app.utils.maintenance），這裡只讀取
         # 加上 try-except 以防止 is_deleted 類型衝突導致 Transaction Aborted
+        # 未帶 limit 時回傳全部（相容舊前端）；帶 limit 時以 (completed_at, id) 游標分頁
         try:
-            histories = AssessmentHistory.query.filter_by(
-                user_id=current_user_id,
-                is_deleted=False
-            ).order_by(AssessmentHistory.completed_at.desc()).all()
+            histories, next_cursor = query_history_page(current_user_id, options)
             
-            return jsonify({
+            return with_etag(jsonify({
                 'success': True,
-                'history': [h.to_dict() for h in histories]
-            }), 200
+                'history': [h.to_dict(options['fields']) for h in histories],
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None,
+                'newest_cursor': encode_cursor(histories[0]) if histories else None
+            }), etag), 200
         except Exception as inner_e:
             db.session.rollback() # 如果這裡失敗，也必須回滾
             print(f"Database query failed: {inner_e}")
@@ -56,22 +52,57 @@ def get_history():
         return jsonify({'success': False, 'message': f'獲取歷史記錄失敗: {str(e)}'}), 500
 
 
+@history_bp.route('/daily', methods=['GET'])
+@jwt_required()
+def get_daily_summary_route():
+    """Per-day avg / count / min / max of user's active assessments (?from=&to=), for score charts"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        try:
+            start, end = parse_date_range(request.args)
+        except ValueError as arg_err:
+            return jsonify({'success': False, 'message': str(arg_err)}), 400
+        etag = data_etag(current_user_id)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        
+        return with_etag(jsonify({
+            'success': True,
+            'daily': get_daily_summary(current_user_id, start, end)
+        }), etag), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'獲取每日統計失敗: {str(e)}'}), 500
+
+
 @history_bp.route('/trash', methods=['GET'])
 @jwt_required()
 def get_trash():
     """Get user's deleted history (recycle bin)"""
     try:
         current_user_id = int(get_jwt_identity())
+        try:
+            fields = AssessmentHistory.check_projection(request.args.get('fields', 'full'))
+        except ValueError as arg_err:
+            return jsonify({'success': False, 'message': str(arg_err)}), 400
+        etag = data_etag(current_user_id)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
         
-        trash_items = AssessmentHistory.query.filter_by(
+        trash_items = AssessmentHistory.query.options(
+            *AssessmentHistory.projection_options(fields)
+        ).filter_by(
             user_id=current_user_id,
             is_deleted=True
         ).order_by(AssessmentHistory.deleted_at.desc()).all()
         
-        return jsonify({
+        return with_etag(jsonify({
             'success': True,
-            'history': [h.to_dict() for h in trash_items]
-        }), 200
+            'history': [h.to_dict(fields) for h in trash_items]
+        }), etag), 200
         
     except Exception as e:
         db.session.rollback() # 確保出錯時清理連線
@@ -80,6 +111,7 @@ def get_trash():
 
 @history_bp.route('', methods=['POST'])
 @jwt_required()
+@idempotent('history.save')
 def save_history():
     """Save new assessment result"""
     try:
@@ -94,73 +126,32 @@ def save_history():
             return jsonify({'success': False, 'message': '找不到用戶'}), 404
         
         total_score = data['total_score']
-        if user.group == 'student':
-            level = '需要關注' if total_score >= 23 else '良好'
-        else:
-            level = '需要關注' if total_score >= 30 else '良好'
+        level = AssessmentHistory.level_for(user.group, total_score)
         
         new_history = AssessmentHistory(
             user_id=current_user_id,
             total_score=total_score,
             max_score=data['max_score'],
             level=level,
-            answers=json.dumps(data['answers'], ensure_ascii=False),
+            answers=data['answers'],
             completed_at=datetime.now()
         )
         
         db.session.add(new_history)
+        add_history_score(new_history)
+        refresh_latest_assessment(current_user_id)
+        record_assessment_day(user, new_history.completed_date)
+        bump_data_version(current_user_id)
+        
+        # 自動關注與提醒通知：async 模式下與評估同一交易寫入工作佇列，由背景 worker 處理
+        job_date = new_history.completed_date
+        queued = defer(current_user_id, job_date, trigger_score=total_score)
         db.session.commit()
         
-        # --- 自動關注邏輯 (加入保護) ---
-        try:
-            threshold_met = False
-            if user.group == 'student' and total_score >= 23:
-                threshold_met = True
-            elif user.group == 'clinical' and total_score >= 30:
-                threshold_met = True
-                
-            if threshold_met:
-                target_staff_ids = []
-                assignments = PatientAssignment.query.filter_by(patient_id=current_user_id).all()
-                if assignments:
-                    target_staff_ids = [a.staff_id for a in assignments]
-                
-                if not target_staff_ids:
-                    super_admin = HealthcareStaff.query.filter_by(role='super_admin').first()
-                    if super_admin:
-                        target_staff_ids.append(super_admin.id)
-                
-                for staff_id in target_staff_ids:
-                    exists = PatientWatchlist.query.filter_by(staff_id=staff_id, patient_id=current_user_id).first()
-                    if not exists:
-                        max_order = db.session.query(db.func.max(PatientWatchlist.display_order)).filter_by(staff_id=staff_id).scalar() or 0
-                        new_watchlist = PatientWatchlist(
-                            staff_id=staff_id,
-                            patient_id=current_user_id,
-                            notes=f"自動關注：分數達標 ({total_score}分 - {user.group})",
-                            display_order=max_order + 1
-                        )
-                        db.session.add(new_watchlist)
-                db.session.commit()
-        except Exception as w_err:
-            db.session.rollback() # 自動關注失敗不應影響主流程
-            print(f"Auto-watchlist failed: {w_err}")
-
-        # --- 提醒通知邏輯 (加入強壯日期保護) ---
-        try:
-            from app.utils.alert_utils import check_and_create_alert
-            # 確保傳入的是 date 物件，避開類型衝突
-            test_date = new_history.completed_at
-            if hasattr(test_date, 'date'):
-                test_date = test_date.date()
-            
-            alerts = check_and_create_alert(current_user_id, test_date)
-            if alerts:
-                for alert in alerts:
-                    print(f"Alert created for user {current_user_id}")
-        except Exception as alert_error:
-            db.session.rollback() # 提醒失敗也要重設連線
-            print(f"Alert check failed: {alert_error}")
+        if queued:
+            notify_workers()
+        else:
+            run_inline(current_user_id, job_date, trigger_score=total_score)
         
         return jsonify({
             'success': True,
@@ -174,6 +165,37 @@ def save_history():
         return jsonify({'success': False, 'message': f'保存失敗: {str(e)}'}), 500
 
 
+@history_bp.route('/batch', methods=['POST'])
+@jwt_required()
+@idempotent('history.batch')
+def save_history_batch_route():
+    """Save assessments completed offline (each with its own completed_at) in one transaction"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        try:
+            items = parse_batch(request.get_json(silent=True))
+        except ValueError as arg_err:
+            return jsonify({'success': False, 'message': str(arg_err)}), 400
+        
+        user = User.query.get(current_user_id)
+        if not user:
+            return jsonify({'success': False, 'message': '找不到用戶'}), 404
+        
+        # 單次 INSERT；每日彙總、最新評估、連續天數各更新一次，警報每天一筆工作、自動關注只檢查一次
+        results = save_history_batch(user, items)
+        
+        return jsonify({
+            'success': True,
+            'results': results,
+            'count': len(results),
+            'message': f'已保存 {len(results)} 筆評估結果'
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'保存失敗: {str(e)}'}), 500
+
+
 @history_bp.route('/<int:history_id>', methods=['DELETE'])
 @jwt_required()
 def delete_history(history_id):
@@ -191,6 +213,14 @@ def delete_history(history_id):
         if history.user_id != current_user_id:
             return jsonify({'success': False, 'message': '無權限刪除此記錄'}), 403
         
+        # 已在回收桶的記錄不在每日統計中，也不影響警報
+        changed_day = None
+        queued = False
+        if not history.is_deleted:
+            remove_history_score(history)
+            changed_day = history.completed_date
+            queued = defer(current_user_id, changed_day, kind=JOB_HISTORY_CHANGED)
+        
         if permanent:
             db.session.delete(history)
             message = '記錄已永久刪除'
@@ -200,7 +230,18 @@ def delete_history(history_id):
             history.delete_reason = delete_reason
             message = '記錄已移至回收桶'
         
+        refresh_latest_assessment(current_user_id)
+        if changed_day:
+            refresh_streak_for_day(current_user_id, changed_day)
+        bump_data_version(current_user_id)
         db.session.commit()
+        
+        # 重新計算受影響的警報（該日與其後 30 日移動平均窗口內的日期）
+        if queued:
+            notify_workers()
+        elif changed_day:
+            run_inline(current_user_id, changed_day, kind=JOB_HISTORY_CHANGED)
+        
         return jsonify({'success': True, 'message': message}), 200
         
     except Exception as e:
@@ -221,18 +262,32 @@ def restore_history(history_id):
         
         if history.user_id != current_user_id:
             return jsonify({'success': False, 'message': '無權限操作此記錄'}), 403
+        
+        changed_day = None
+        queued = False
+        if history.is_deleted:
+            add_history_score(history)
+            changed_day = history.completed_date
+            queued = defer(current_user_id, changed_day, kind=JOB_HISTORY_CHANGED)
             
         history.is_deleted = False
         history.deleted_at = None
         history.delete_reason = None
         
         user = User.query.get(current_user_id)
-        if user and user.group == 'student':
-            history.level = '需要關注' if history.total_score >= 23 else '良好'
-        else:
-            history.level = '需要關注' if history.total_score >= 30 else '良好'
+        history.level = AssessmentHistory.level_for(user.group if user else None, history.total_score)
         
+        refresh_latest_assessment(current_user_id)
+        if changed_day:
+            refresh_streak_for_day(current_user_id, changed_day)
+        bump_data_version(current_user_id)
         db.session.commit()
+        
+        if queued:
+            notify_workers()
+        elif changed_day:
+            run_inline(current_user_id, changed_day, kind=JOB_HISTORY_CHANGED)
+        
         return jsonify({'success': True, 'message': '記錄已還原'}), 200
         
     except Exception as e:
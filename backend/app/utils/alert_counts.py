@@ -0,0 +1,114 @@
+"""
+Unread alert counts per patient for the admin dashboard / watchlist badges
+"""
+import json
+
+from flask import current_app
+
+from app.models import db, ScoreAlert
+from app.utils.alert_utils import MA_WINDOWS, MA_LABELS
+from app.utils.cache import TTLCache
+
+# Line labels in display order
+LINE_ORDER = tuple(MA_LABELS[days] for days in MA_WINDOWS)
+
+_alert_counts_cache = TTLCache()
+
+
+def invalidate_alert_counts():
+    """Call after alerts are created, changed, deleted or marked read, or assignments change"""
+    _alert_counts_cache.invalidate()
+
+
+def _decoded_line_names(value):
+    """Line names in a decoded value: {"7日": 38} or a plain ["7日", ...] list"""
+    if isinstance(value, dict):
+        return list(value.keys())
+    if isinstance(value, list):
+        return [name for name in value if isinstance(name, str)]
+    return []
+
+
+def _line_names(exceeded_lines, parsed):
+    """
+    Line names in one exceeded_lines value (dict, list, None or JSON text)
+
+    Only rows not yet migrated to JSON arrive as text; those are parsed once
+    per distinct string, and only strings are used as cache keys.
+    """
+    if not isinstance(exceeded_lines, str):
+        return _decoded_line_names(exceeded_lines)
+    if exceeded_lines not in parsed:
+        try:
+            value = json.loads(exceeded_lines)
+        except ValueError:
+            value = None
+        parsed[exceeded_lines] = _decoded_line_names(value)
+    return parsed[exceeded_lines]
+
+
+def _ordered(line_names):
+    known = [name for name in LINE_ORDER if name in line_names]
+    return known + sorted(name for name in line_names if name not in LINE_ORDER)
+
+
+def query_alert_counts(patient_ids=None):
+    """
+    Count unread alerts per patient and type with one grouped query
+
+    Args:
+        patient_ids: Restrict to these patients (None: every patient)
+
+    Returns:
+        dict: {patient_id: {'high': {'count', 'lines'}, 'low': {'count', 'lines'}}}
+              with distinct line names per patient/type
+    """
+    query = db.session.query(
+        ScoreAlert.user_id,
+        ScoreAlert.alert_type,
+        ScoreAlert.exceeded_lines,
+        db.func.count(ScoreAlert.id)
+    ).filter(ScoreAlert.is_read == False)
+    if patient_ids is not None:
+        if not patient_ids:
+            return {}
+        query = query.filter(ScoreAlert.user_id.in_(patient_ids))
+    rows = query.group_by(
+        ScoreAlert.user_id, ScoreAlert.alert_type, ScoreAlert.exceeded_lines
+    ).all()
+
+    counts = {}
+    names = {}
+    parsed = {}
+    for user_id, alert_type, exceeded_lines, count in rows:
+        alert_type = 'high' if alert_type == 'high' else 'low'
+        if user_id not in counts:
+            counts[user_id] = {'high': {'count': 0, 'lines': []}, 'low': {'count': 0, 'lines': []}}
+        counts[user_id][alert_type]['count'] += count
+        names.setdefault((user_id, alert_type), set()).update(_line_names(exceeded_lines, parsed))
+
+    for (user_id, alert_type), line_names in names.items():
+        counts[user_id][alert_type]['lines'] = _ordered(line_names)
+
+    return counts
+
+
+def get_alert_counts(cache_key, load_patient_ids):
+    """
+    query_alert_counts() cached for ALERT_COUNTS_CACHE_SECONDS
+
+    Args:
+        cache_key: Identifies the caller's patient scope (e.g. the staff id)
+        load_patient_ids: Returns the patient ids in scope (None: everyone);
+            only called on a cache miss
+    """
+    cached = _alert_counts_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    generation = _alert_counts_cache.generation()
+    counts = query_alert_counts(load_patient_ids())
+    _alert_counts_cache.set(
+        cache_key, counts, current_app.config.get('ALERT_COUNTS_CACHE_SECONDS', 30), generation
+    )
+    return counts
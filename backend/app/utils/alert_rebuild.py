@@ -0,0 +1,261 @@
+"""
+Cohort-wide alert recomputation
+
+Streams per-day score aggregates for every user in one grouped query,
+derives the 7/14/30-day moving averages with NumPy cumulative sums and
+writes ScoreAlert rows back with bulk inserts / updates / deletes.
+"""
+from datetime import date, timedelta
+from itertools import groupby
+import numpy as np
+
+from app.models import db, AssessmentHistory, ScoreAlert
+from app.utils.alert_utils import (
+    MA_WINDOWS, MA_PRECISION, MIN_DAILY_ASSESSMENTS, evaluate_alert_lines
+)
+from app.utils.alert_counts import invalidate_alert_counts
+from app.utils.data_version import bump_data_versions
+
+WRITE_BATCH_SIZE = 1000
+
+
+def _stream_daily_aggregates(origin_date, end_date, user_ids=None):
+    """Yield (user_id, day, score_sum, score_count) ordered by user and day"""
+    stmt = db.select(
+        AssessmentHistory.user_id,
+        AssessmentHistory.completed_date,
+        db.func.sum(AssessmentHistory.total_score),
+        db.func.count(AssessmentHistory.id)
+    ).where(
+        AssessmentHistory.active(),
+        AssessmentHistory.completed_date >= origin_date,
+        AssessmentHistory.completed_date <= end_date
+    )
+    if user_ids is not None:
+        stmt = stmt.where(AssessmentHistory.user_id.in_(user_ids))
+    stmt = stmt.group_by(
+        AssessmentHistory.user_id, AssessmentHistory.completed_date
+    ).order_by(
+        AssessmentHistory.user_id, AssessmentHistory.completed_date
+    )
+
+    result = db.session.execute(stmt.execution_options(yield_per=5000))
+    for user_id, day, score_sum, score_count in result:
+        yield user_id, day, score_sum, score_count
+
+
+def moving_average_matrix(score_sums, score_counts):
+    """
+    Moving averages for every day of a dense per-day series
+
+    Args:
+        score_sums, score_counts: 1-D arrays, one slot per consecutive day
+
+    Returns:
+        (daily_avg, {window_days: ma_array}); days without enough data are NaN
+    """
+    has_data = score_counts > 0
+    daily_avg = np.divide(
+        score_sums, score_counts,
+        out=np.zeros(len(score_sums), dtype=float), where=has_data
+    )
+
+    avg_cumsum = np.concatenate(([0.0], np.cumsum(daily_avg)))
+    day_cumsum = np.concatenate(([0], np.cumsum(has_data)))
+    index = np.arange(len(score_sums))
+
+    moving_averages = {}
+    for days in MA_WINDOWS:
+        window_start = np.maximum(index - days + 1, 0)
+        window_sum = avg_cumsum[index + 1] - avg_cumsum[window_start]
+        window_days = day_cumsum[index + 1] - day_cumsum[window_start]
+
+        # Same rule as moving_average_from_daily: data on at least half the days
+        valid = (window_days > 0) & (window_days >= days / 2)
+        moving_averages[days] = np.where(
+            valid, window_sum / np.maximum(window_days, 1), np.nan
+        )
+
+    return daily_avg, moving_averages
+
+
+def evaluate_user_series(user_id, rows, origin_date, start_date, end_date):
+    """
+    Evaluate every day in [start_date, end_date] for one user
+
+    Args:
+        rows: iterable of (day, score_sum, score_count) from origin_date onwards
+
+    Returns:
+        tuple: ({(user_id, day, alert_type): (daily_average, lines)}, last evaluated day or None)
+    """
+    length = (end_date - origin_date).days + 1
+    score_sums = np.zeros(length, dtype=float)
+    score_counts = np.zeros(length, dtype=np.int64)
+    for day, score_sum, score_count in rows:
+        offset = (day - origin_date).days
+        score_sums[offset] = score_sum
+        score_counts[offset] = score_count
+
+    daily_avg, moving_averages = moving_average_matrix(score_sums, score_counts)
+
+    first = (start_date - origin_date).days
+    qualifying = np.nonzero(score_counts[first:] >= MIN_DAILY_ASSESSMENTS)[0] + first
+
+    evaluated = {}
+    for offset in qualifying:
+        day = origin_date + timedelta(days=int(offset))
+        mas = {
+            days: (None if np.isnan(ma[offset]) else round(float(ma[offset]), MA_PRECISION))
+            for days, ma in moving_averages.items()
+        }
+        avg = float(daily_avg[offset])
+        high_exceeded, low_approached = evaluate_alert_lines(avg, mas)
+        if high_exceeded:
+            evaluated[(user_id, day, 'high')] = (avg, high_exceeded)
+        if low_approached:
+            evaluated[(user_id, day, 'low')] = (avg, low_approached)
+
+    last_evaluated = origin_date + timedelta(days=int(qualifying[-1])) if len(qualifying) else None
+    return evaluated, last_evaluated
+
+
+def _load_existing_alerts(start_date, end_date, user_ids=None):
+    query = db.session.query(
+        ScoreAlert.id, ScoreAlert.user_id, ScoreAlert.alert_date, ScoreAlert.alert_type,
+        ScoreAlert.daily_average, ScoreAlert.exceeded_lines, ScoreAlert.is_read
+    ).filter(
+        ScoreAlert.alert_date >= start_date,
+        ScoreAlert.alert_date <= end_date
+    )
+    if user_ids is not None:
+        query = query.filter(ScoreAlert.user_id.in_(user_ids))
+
+    return {
+        (row.user_id, row.alert_date, row.alert_type): row
+        for row in query.all()
+    }
+
+
+def _chunks(items, size=WRITE_BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def write_alert_diff(evaluated, last_evaluated, existing):
+    """
+    Bring ScoreAlert rows in line with freshly evaluated results
+
+    Alerts that still fire keep their read state. New alerts are unread only
+    on the user's latest evaluated day (older days count as already seen,
+    matching what check_and_create_alert does day by day). Alerts that no
+    longer fire are deleted.
+
+    Returns:
+        dict: {'inserted': n, 'updated': n, 'deleted': n}
+    """
+    inserts, updates = [], []
+    changed_users = set()
+
+    for key, (avg, lines) in evaluated.items():
+        user_id, day, alert_type = key
+        daily_average = round(avg, 1)
+        row = existing.get(key)
+
+        if row is None:
+            inserts.append({
+                'user_id': user_id,
+                'alert_date': day,
+                'daily_average': daily_average,
+                'exceeded_lines': lines,
+                'alert_type': alert_type,
+                'is_read': day != last_evaluated.get(user_id)
+            })
+            changed_users.add(user_id)
+        elif row.daily_average != daily_average or row.exceeded_lines != lines:
+            updates.append({
+                'id': row.id,
+                'daily_average': daily_average,
+                'exceeded_lines': lines
+            })
+            changed_users.add(user_id)
+
+    stale_ids = []
+    for key, row in existing.items():
+        if key not in evaluated:
+            stale_ids.append(row.id)
+            changed_users.add(key[0])
+
+    for batch in _chunks(inserts):
+        db.session.execute(db.insert(ScoreAlert), batch)
+    for batch in _chunks(updates):
+        db.session.execute(db.update(ScoreAlert), batch)
+    for batch in _chunks(stale_ids):
+        db.session.execute(
+            db.delete(ScoreAlert).where(ScoreAlert.id.in_(batch)).execution_options(synchronize_session=False)
+        )
+    bump_data_versions(changed_users)
+
+    return {'inserted': len(inserts), 'updated': len(updates), 'deleted': len(stale_ids)}
+
+
+def rebuild_alerts(start_date, end_date, user_ids=None):
+    """
+    Recompute ScoreAlert rows for every (user, day) in [start_date, end_date]
+
+    Args:
+        start_date, end_date: Alert dates to rebuild (inclusive)
+        user_ids: Restrict to these users (default: everyone)
+
+    Returns:
+        dict: {'users': n, 'inserted': n, 'updated': n, 'deleted': n}
+    """
+    origin_date = start_date - timedelta(days=max(MA_WINDOWS) - 1)
+
+    evaluated = {}
+    last_evaluated = {}
+    users_seen = 0
+    stream = _stream_daily_aggregates(origin_date, end_date, user_ids)
+    for user_id, rows in groupby(stream, key=lambda row: row[0]):
+        users_seen += 1
+        user_evaluated, user_last = evaluate_user_series(
+            user_id, ((day, s, c) for _, day, s, c in rows),
+            origin_date, start_date, end_date
+        )
+        evaluated.update(user_evaluated)
+        if user_last:
+            last_evaluated[user_id] = user_last
+
+    existing = _load_existing_alerts(start_date, end_date, user_ids)
+    stats = write_alert_diff(evaluated, last_evaluated, existing)
+    db.session.commit()
+    invalidate_alert_counts()
+
+    stats['users'] = users_seen
+    return stats
+
+
+def affected_alert_days(changed_day, today=None):
+    """
+    Alert days whose evaluation depends on a changed day: the day itself and
+    the following days whose longest MA window still reaches back to it.
+
+    Returns:
+        (start_date, end_date) or None if the change is in the future
+    """
+    today = today or date.today()
+    end_date = min(changed_day + timedelta(days=max(MA_WINDOWS) - 1), today)
+    if end_date < changed_day:
+        return None
+    return changed_day, end_date
+
+
+def recompute_affected_alerts(user_id, changed_day):
+    """
+    Re-evaluate only the (user, day) alerts affected by an assessment being
+    deleted or restored on changed_day, in one batched pass.
+    """
+    days = affected_alert_days(changed_day)
+    if not days:
+        return {'users': 0, 'inserted': 0, 'updated': 0, 'deleted': 0}
+    return rebuild_alerts(days[0], days[1], [user_id])
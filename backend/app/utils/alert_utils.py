@@ -1,56 +1,84 @@
 """
 Alert utilities for score warnings
 """
-from datetime import datetime, timedelta, date
-from app.models import db, AssessmentHistory, ScoreAlert
-import json
+from datetime import timedelta, date
+from app.models import db, ScoreAlert
+from app.utils.daily_scores import get_daily_scores_window
+from app.utils.data_version import bump_data_version
 
 
-def calculate_moving_average(user_id, days, end_date=None):
+# Moving-average windows (days) and the labels stored in ScoreAlert.exceeded_lines
+MA_WINDOWS = (7, 14, 30)
+MA_LABELS = {7: '7日', 14: '14日', 30: '30日'}
+
+# A day is only evaluated once it has this many assessments
+MIN_DAILY_ASSESSMENTS = 3
+
+# 'low' alert fires when the daily average is below a line by at most this many points
+LOW_ALERT_MARGIN = 3
+
+# Moving averages are rounded to this many decimals and compared with this
+# tolerance, so differently-summed MAs (see alert_rebuild) agree exactly
+MA_PRECISION = 9
+ALERT_EPSILON = 1e-9
+
+
+def load_daily_scores(user_id, end_date, days=max(MA_WINDOWS)):
     """
-    Calculate moving average for the specified number of days
+    Read a user's per-day score aggregates for a window of days in one query
     
     Args:
         user_id: User ID
-        days: Number of days for moving average (7, 14, or 30)
-        end_date: End date for calculation (default: today)
+        end_date: Last day of the window (inclusive)
+        days: Window length in days
     
     Returns:
-        float or None: Moving average score or None if insufficient data
+        dict: {date: (score_sum, score_count)}
     """
-    if end_date is None:
-        end_date = date.today()
+    return get_daily_scores_window(user_id, end_date, days)
+
+
+def moving_average_from_daily(daily_scores, days, end_date):
+    """
+    Derive a moving average from per-day score aggregates
     
-    # Calculate start date (include end_date, so subtract days-1)
+    The moving average is the mean of the daily averages inside the window,
+    and needs data on at least half of the days.
+    
+    Returns:
+        float or None: Moving average score or None if insufficient data
+    """
     start_date = end_date - timedelta(days=days - 1)
     
-    # Get all assessments in the date range
-    assessments = AssessmentHistory.query.filter(
-        AssessmentHistory.user_id == user_id,
-        AssessmentHistory.deleted_at.is_(None),
-        db.func.date(AssessmentHistory.completed_at) >= start_date,
-        db.func.date(AssessmentHistory.completed_at) <= end_date
-    ).all()
+    daily_averages = [
+        score_sum / score_count
+        for day, (score_sum, score_count) in daily_scores.items()
+        if start_date <= day <= end_date and score_count
+    ]
     
-    if not assessments:
+    if not daily_averages or len(daily_averages) < days / 2:
         return None
     
-    # Group by date and calculate daily averages
-    daily_scores = {}
-    for assessment in assessments:
-        assess_date = assessment.completed_at.date()
-        if assess_date not in daily_scores:
-            daily_scores[assess_date] = []
-        daily_scores[assess_date].append(assessment.total_score)
+    return round(sum(daily_averages) / len(daily_averages), MA_PRECISION)
+
+
+def calculate_moving_average(user_id, days, end_date=None):
+    """
+    Calculate moving average for the specified number of days
     
-    # Calculate average of daily averages
-    daily_averages = [sum(scores) / len(scores) for scores in daily_scores.values()]
+    Args:
+        user_id: User ID
+        days: Number of days for moving average (7, 14, or 30)
+        end_date: End date for calculation (default: today)
     
-    # Need sufficient data (at least half the days)
-    if len(daily_averages) < days / 2:
-        return None
+    Returns:
+        float or None: Moving average score or None if insufficient data
+    """
+    if end_date is None:
+        end_date = date.today()
     
-    return sum(daily_averages) / len(daily_averages)
+    daily_scores = load_daily_scores(user_id, end_date, days)
+    return moving_average_from_daily(daily_scores, days, end_date)
 
 
 def calculate_daily_average(user_id, target_date):
@@ -64,19 +92,71 @@ def calculate_daily_average(user_id, target_date):
     Returns:
         tuple: (average_score, count) or (None, 0) if no data
     """
-    assessments = AssessmentHistory.query.filter(
-        AssessmentHistory.user_id == user_id,
-        AssessmentHistory.deleted_at.is_(None),
-        db.func.date(AssessmentHistory.completed_at) == target_date
-    ).all()
+    score_sum, count = load_daily_scores(user_id, target_date, 1).get(target_date, (0, 0))
     
-    if not assessments:
+    if not count:
         return None, 0
     
-    total_score = sum(a.total_score for a in assessments)
-    average = total_score / len(assessments)
+    return score_sum / count, count
+
+
+def evaluate_alert_lines(daily_avg, moving_averages):
+    """
+    Compare a daily average against its moving averages
+    
+    Args:
+        daily_avg: Daily average score
+        moving_averages: {window_days: moving average or None}
+    
+    Returns:
+        tuple: (high_exceeded, low_approached) dicts of {label: rounded MA}
+    """
+    high_exceeded = {}
+    low_approached = {}
     
-    return average, len(assessments)
+    for days in MA_WINDOWS:
+        ma = moving_averages.get(days)
+        if ma is None:
+            continue
+        
+        label = MA_LABELS[days]
+        
+        # 'high': daily average exceeds the moving average (trend going up)
+        if daily_avg - ma > ALERT_EPSILON:
+            high_exceeded[label] = round(ma, 1)
+        
+        # 'low': below the moving average but within LOW_ALERT_MARGIN points
+        if ALERT_EPSILON < (ma - daily_avg) <= LOW_ALERT_MARGIN + ALERT_EPSILON:
+            low_approached[label] = round(ma, 1)
+    
+    return high_exceeded, low_approached
+
+
+def _apply_alert(existing_alert, user_id, alert_date, alert_type, daily_avg, lines):
+    """Create, update or remove the alert of one type for a day; returns the new alert if created"""
+    if lines:
+        if existing_alert:
+            # Update existing alert with latest average and lines
+            existing_alert.daily_average = round(daily_avg, 1)
+            existing_alert.exceeded_lines = lines
+            existing_alert.is_read = False  # Mark unread again if status persists/changes
+            return None
+        
+        alert = ScoreAlert(
+            user_id=user_id,
+            alert_date=alert_date,
+            daily_average=round(daily_avg, 1),
+            exceeded_lines=lines,
+            alert_type=alert_type,
+            is_read=False
+        )
+        db.session.add(alert)
+        return alert
+    
+    if existing_alert:
+        # Requirement: "remove bell if lower than all lines" for today
+        db.session.delete(existing_alert)
+    return None
 
 
 def check_and_create_alert(user_id, assessment_date):
@@ -86,130 +166,62 @@ def check_and_create_alert(user_id, assessment_date):
     Alert types:
     - 'high': Daily average exceeds moving average (trend going up)
     - 'low': Daily average is within 3 points below moving average (early warning of downward trend)
+    
+    The last 30 daily aggregates are read once and every moving average
+    is derived from that in-memory series.
     """
-    # Calculate daily average
-    daily_avg, count = calculate_daily_average(user_id, assessment_date)
+    daily_scores = load_daily_scores(user_id, assessment_date)
     
-    if daily_avg is None:
+    score_sum, count = daily_scores.get(assessment_date, (0, 0))
+    if not count:
         return []
     
     # Only check after 3 assessments
-    if count < 3:
+    if count < MIN_DAILY_ASSESSMENTS:
         return []
     
-    # 1. SPECIAL FEATURE: Auto-resolve past unread alerts
-    # If a new assessment comes in (or average updates), we should mark past unread alerts as read
-    # because the user's status has updated. This fulfills the requirement:
-    # "If next daily average is lower... directly remove the bell" (by marking old one as read)
-    past_unread_alerts = ScoreAlert.query.filter(
+    daily_avg = score_sum / count
+    
+    # Today's alerts and past unread alerts in a single lookup
+    alerts = ScoreAlert.query.filter(
         ScoreAlert.user_id == user_id,
-        ScoreAlert.is_read == False,
-        ScoreAlert.alert_date < assessment_date
+        db.or_(
+            ScoreAlert.alert_date == assessment_date,
+            db.and_(ScoreAlert.is_read == False, ScoreAlert.alert_date < assessment_date)
+        )
     ).all()
     
-    if past_unread_alerts:
-        for alert in past_unread_alerts:
+    existing = {}
+    for alert in alerts:
+        if alert.alert_date == assessment_date:
+            existing[alert.alert_type] = alert
+        else:
+            # 1. SPECIAL FEATURE: Auto-resolve past unread alerts
+            # If a new assessment comes in (or average updates), we should mark past unread alerts as read
+            # because the user's status has updated. This fulfills the requirement:
+            # "If next daily average is lower... directly remove the bell" (by marking old one as read)
             alert.is_read = True
-            db.session.add(alert)
-        # We'll commit these along with any new alerts
-        
-    # Check if alerts already exist for this date
-    existing_high_alert = ScoreAlert.query.filter_by(
-        user_id=user_id,
-        alert_date=assessment_date,
-        alert_type='high'
-    ).first()
-    
-    existing_low_alert = ScoreAlert.query.filter_by(
-        user_id=user_id,
-        alert_date=assessment_date,
-        alert_type='low'
-    ).first()
-    
-    # Calculate moving averages
-    ma_7 = calculate_moving_average(user_id, 7, assessment_date)
-    ma_14 = calculate_moving_average(user_id, 14, assessment_date)
-    ma_30 = calculate_moving_average(user_id, 30, assessment_date)
-    
-    created_alerts = []
-    
-    # Check HIGH score alerts (exceeds moving average)
-    high_exceeded = {}
-    
-    if ma_7 is not None and daily_avg > ma_7:
-        high_exceeded['7日'] = round(ma_7, 1)
-    
-    if ma_14 is not None and daily_avg > ma_14:
-        high_exceeded['14日'] = round(ma_14, 1)
     
-    if ma_30 is not None and daily_avg > ma_30:
-        high_exceeded['30日'] = round(ma_30, 1)
+    moving_averages = {
+        days: moving_average_from_daily(daily_scores, days, assessment_date)
+        for days in MA_WINDOWS
+    }
+    high_exceeded, low_approached = evaluate_alert_lines(daily_avg, moving_averages)
     
-    # Handle HIGH alert creation/update/resolution
-    if high_exceeded:
-        if existing_high_alert:
-            # Update existing alert with latest average and lines
-            existing_high_alert.daily_average = round(daily_avg, 1)
-            existing_high_alert.exceeded_lines = json.dumps(high_exceeded, ensure_ascii=False)
-            existing_high_alert.is_read = False  # Mark unread again if status persists/changes
-            db.session.add(existing_high_alert)
-        else:
-            # Create new alert
-            alert = ScoreAlert(
-                user_id=user_id,
-                alert_date=assessment_date,
-                daily_average=round(daily_avg, 1),
-                exceeded_lines=json.dumps(high_exceeded, ensure_ascii=False),
-                alert_type='high',
-                is_read=False
-            )
-            db.session.add(alert)
+    created_alerts = []
+    for alert_type, lines in (('high', high_exceeded), ('low', low_approached)):
+        alert = _apply_alert(existing.get(alert_type), user_id, assessment_date, alert_type, daily_avg, lines)
+        if alert:
             created_alerts.append(alert)
-    elif existing_high_alert:
-        # If no longer high but existing alert exists for today, delete it
-        # Requirement: "remove bell if lower than all lines" for today
-        db.session.delete(existing_high_alert)
-
-    # Check LOW score alerts (within 3 points below moving average)
-    low_approached = {}
     
-    # Check if daily average is below moving average but within 3 points
-    # Triggers when: 0 < (ma - daily_avg) <= 3
-    if ma_7 is not None and 0 < (ma_7 - daily_avg) <= 3:
-        low_approached['7日'] = round(ma_7, 1)
-    
-    if ma_14 is not None and 0 < (ma_14 - daily_avg) <= 3:
-        low_approached['14日'] = round(ma_14, 1)
-    
-    if ma_30 is not None and 0 < (ma_30 - daily_avg) <= 3:
-        low_approached['30日'] = round(ma_30, 1)
-    
-    # Handle LOW alert creation/update/resolution
-    if low_approached:
-        if existing_low_alert:
-            # Update existing alert
-            existing_low_alert.daily_average = round(daily_avg, 1)
-            existing_low_alert.exceeded_lines = json.dumps(low_approached, ensure_ascii=False)
-            existing_low_alert.is_read = False
-            db.session.add(existing_low_alert)
-        else:
-            # Create new alert
-            alert = ScoreAlert(
-                user_id=user_id,
-                alert_date=assessment_date,
-                daily_average=round(daily_avg, 1),
-                exceeded_lines=json.dumps(low_approached, ensure_ascii=False),
-                alert_type='low',
-                is_read=False
-            )
-            db.session.add(alert)
-            created_alerts.append(alert)
-    elif existing_low_alert:
-        # If no longer low but existing alert exists for today, remove it
-        db.session.delete(existing_low_alert)
-
+    if alerts or created_alerts:
+        bump_data_version(user_id)
+    
     # Commit all changes (updates, inserts, deletes)
     db.session.commit()
     
+    from app.utils.alert_counts import invalidate_alert_counts
+    invalidate_alert_counts()
+    
     # Return newly created alerts (if any)
     return created_alerts
@@ -4,7 +4,6 @@
 """
 from datetime import datetime, timedelta, date
 from app.models import db, AssessmentHistory, ScoreAlert
-import json
 
 
 def calculate_moving_average_test(user_id, days, end_date=None):
@@ -19,9 +18,9 @@ def calculate_moving_average_test(user_id, days, end_date=None):
     
     assessments = AssessmentHistory.query.filter(
         AssessmentHistory.user_id == user_id,
-        AssessmentHistory.deleted_at.is_(None),
-        db.func.date(AssessmentHistory.completed_at) >= start_date,
-        db.func.date(AssessmentHistory.completed_at) <= end_date
+        AssessmentHistory.active(),
+        AssessmentHistory.completed_date >= start_date,
+        AssessmentHistory.completed_date <= end_date
     ).all()
     
     if not assessments:
@@ -50,8 +49,8 @@ def calculate_daily_average_test(user_id, target_date):
     """
     assessments = AssessmentHistory.query.filter(
         AssessmentHistory.user_id == user_id,
-        AssessmentHistory.deleted_at.is_(None),
-        db.func.date(AssessmentHistory.completed_at) == target_date
+        AssessmentHistory.active(),
+        AssessmentHistory.completed_date == target_date
     ).all()
     
     if not assessments:
@@ -141,7 +140,7 @@ def check_and_create_alert_test(user_id, assessment_date):
     if high_exceeded:
         if existing_high_alert:
             existing_high_alert.daily_average = round(daily_avg, 1)
-            existing_high_alert.exceeded_lines = json.dumps(high_exceeded, ensure_ascii=False)
+            existing_high_alert.exceeded_lines = high_exceeded
             existing_high_alert.is_read = False
             db.session.add(existing_high_alert)
             print(f"[TEST MODE] 更新 HIGH 警報")
@@ -150,7 +149,7 @@ def check_and_create_alert_test(user_id, assessment_date):
                 user_id=user_id,
                 alert_date=assessment_date,
                 daily_average=round(daily_avg, 1),
-                exceeded_lines=json.dumps(high_exceeded, ensure_ascii=False),
+                exceeded_lines=high_exceeded,
                 alert_type='high',
                 is_read=False
             )
@@ -180,7 +179,7 @@ def check_and_create_alert_test(user_id, assessment_date):
     if low_approached:
         if existing_low_alert:
             existing_low_alert.daily_average = round(daily_avg, 1)
-            existing_low_alert.exceeded_lines = json.dumps(low_approached, ensure_ascii=False)
+            existing_low_alert.exceeded_lines = low_approached
             existing_low_alert.is_read = False
             db.session.add(existing_low_alert)
             print(f"[TEST MODE] 更新 LOW 警報")
@@ -189,7 +188,7 @@ def check_and_create_alert_test(user_id, assessment_date):
                 user_id=user_id,
                 alert_date=assessment_date,
                 daily_average=round(daily_avg, 1),
-                exceeded_lines=json.dumps(low_approached, ensure_ascii=False),
+                exceeded_lines=low_approached,
                 alert_type='low',
                 is_read=False
             )
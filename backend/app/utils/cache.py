@@ -0,0 +1,125 @@
+"""
+Small in-process TTL cache for expensive read-mostly endpoints
+
+Entries live for a few seconds and can be dropped explicitly when the
+underlying data changes. Each process keeps its own copy, so the TTL bounds
+how stale another process's entries can get.
+
+get_or_compute() adds stampede protection (one caller computes a missing
+entry while the others wait for it) and can refresh an ageing entry in a
+background thread while callers keep getting the cached value.
+"""
+import threading
+import time
+
+
+class TTLCache:
+    """Thread-safe key/value cache whose entries expire after ttl seconds"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._compute_locks = {}
+        self._refreshing = set()
+
+    def get(self, key):
+        """Cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, stored_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def generation(self):
+        """Counter bumped by invalidate(); pass it to set() to avoid caching stale results"""
+        with self._lock:
+            return self._generation
+
+    def set(self, key, value, ttl, generation=None):
+        """
+        Store a value for ttl seconds
+
+        Args:
+            generation: generation() read before computing the value; if the
+                cache was invalidated meanwhile the value is not stored
+        """
+        if ttl <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            now = time.monotonic()
+            self._entries[key] = (now + ttl, now, value)
+
+    def invalidate(self, key=None):
+        """Drop one entry, or every entry when key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._generation += 1
+            else:
+                self._entries.pop(key, None)
+
+    def _age(self, key):
+        """Seconds since key was stored, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, stored_at, _ = entry
+            now = time.monotonic()
+            return None if expires_at < now else now - stored_at
+
+    def get_or_compute(self, key, compute, ttl, refresh_after=None):
+        """
+        Cached value for key, computing and storing it on a miss
+
+        Concurrent misses for the same key run compute() once; the other
+        callers wait and reuse its result.
+
+        Args:
+            compute: Returns the value; must be safe to call from another
+                thread when refresh_after is set (e.g. push its own app context)
+            refresh_after: Once an entry is this many seconds old it is still
+                returned, and compute() runs in a background thread to
+                replace it before it expires
+        """
+        value = self.get(key)
+        if value is not None:
+            if refresh_after is not None and (self._age(key) or 0) >= refresh_after:
+                self._refresh_in_background(key, compute, ttl)
+            return value
+
+        with self._lock:
+            compute_lock = self._compute_locks.setdefault(key, threading.Lock())
+        with compute_lock:
+            value = self.get(key)
+            if value is None:
+                generation = self.generation()
+                value = compute()
+                self.set(key, value, ttl, generation)
+        return value
+
+    def _refresh_in_background(self, key, compute, ttl):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                generation = self.generation()
+                self.set(key, compute(), ttl, generation)
+            except Exception as e:
+                # Keep serving the cached value; the next miss recomputes in the request
+                print(f"Background cache refresh failed for {key!r}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
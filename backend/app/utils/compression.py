@@ -0,0 +1,153 @@
+"""
+Response compression (gzip, and brotli when the brotli package is installed)
+
+install_compression() registers an after_request hook that compresses a
+response when compression is enabled (COMPRESS_ENABLED), the client's
+Accept-Encoding allows it, the mimetype is in COMPRESS_MIMETYPES, and the
+body is at least COMPRESS_MIN_SIZE bytes. Streamed responses are compressed
+chunk by chunk, with a flush after each chunk so the client can render as
+data arrives. Files served with send_from_directory (direct passthrough),
+responses that already have a Content-Encoding, and bodiless statuses
+(204 / 304) are left alone.
+
+Compressing changes the bytes, so a strong ETag is downgraded to a weak one.
+The weak ETags from data_version already compare equal across encodings.
+"""
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+SUPPORTED_ENCODINGS = ('br', 'gzip')
+
+
+class _GzipStream:
+    def __init__(self, level):
+        # wbits 31 = gzip container (header + crc32 trailer)
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, chunk):
+        return self._compressor.compress(chunk)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliStream:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, chunk):
+        return self._compressor.process(chunk)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def available_encodings(config):
+    """
+    COMPRESS_ALGORITHMS in preference order, without brotli when it is not
+    installed. Blank entries are skipped, so an empty setting means no
+    compression.
+    """
+    encodings = []
+    for name in config.get('COMPRESS_ALGORITHMS', SUPPORTED_ENCODINGS):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in SUPPORTED_ENCODINGS:
+            raise ValueError(f'COMPRESS_ALGORITHMS: unsupported encoding {name!r}')
+        if name == 'br' and brotli is None:
+            continue
+        encodings.append(name)
+    return encodings
+
+
+def _open_stream(encoding, config):
+    if encoding == 'br':
+        return _BrotliStream(config.get('COMPRESS_BR_LEVEL', 4))
+    return _GzipStream(config.get('COMPRESS_LEVEL', 6))
+
+
+def compress_bytes(data, encoding, config):
+    """Compress a whole body in one go"""
+    stream = _open_stream(encoding, config)
+    return stream.compress(data) + stream.finish()
+
+
+def _compress_iter(chunks, stream):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if not chunk:
+                continue
+            data = stream.compress(chunk) + stream.flush()
+            if data:
+                yield data
+        yield stream.finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def _should_compress(response, config, mimetypes):
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return False
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return False
+    if request.method == 'HEAD':
+        return False
+    return response.mimetype in mimetypes
+
+
+def install_compression(app):
+    """Register the compression hook on app (a no-op when COMPRESS_ENABLED is false or no encoding is left)"""
+    config = app.config
+    if not config.get('COMPRESS_ENABLED', True):
+        return None
+
+    encodings = available_encodings(config)
+    if not encodings:
+        return None
+    mimetypes = frozenset(config.get('COMPRESS_MIMETYPES', ('application/json',)))
+    min_size = config.get('COMPRESS_MIN_SIZE', 1024)
+
+    @app.after_request
+    def compress_response(response):
+        if not _should_compress(response, config, mimetypes):
+            return response
+
+        # The body depends on Accept-Encoding even when this one is sent uncompressed
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = _compress_iter(response.response, _open_stream(encoding, config))
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            response.set_data(compress_bytes(data, encoding, config))
+
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    return encodings
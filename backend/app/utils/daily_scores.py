@@ -0,0 +1,211 @@
+"""
+Per-user daily score aggregate (user_daily_scores) maintenance
+
+When db.create_all() adds the table to an existing database it is filled
+from assessment_history straight away, so alerts, statistics and the
+dashboard never read an empty aggregate.
+"""
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.models import db, AssessmentHistory, UserDailyScore
+
+# INSERT ... ON CONFLICT DO UPDATE, so concurrent first saves of a day cannot collide
+_UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def _history_day(history):
+    """Day an assessment counts towards"""
+    if history.completed_date is not None:
+        return history.completed_date
+    completed_at = history.completed_at
+    if completed_at is None:
+        return None
+    return completed_at.date() if hasattr(completed_at, 'date') else completed_at
+
+
+def _adjust_daily_score(user_id, day, score_delta, count_delta):
+    """Add (count_delta > 0) or remove (< 0) scores from a user's day, in the caller's transaction"""
+    insert = _UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    if count_delta > 0 and insert is not None:
+        stmt = insert(UserDailyScore).values(
+            user_id=user_id, day=day, score_sum=score_delta, score_count=count_delta
+        )
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[UserDailyScore.user_id, UserDailyScore.day],
+            set_={
+                'score_sum': UserDailyScore.score_sum + stmt.excluded.score_sum,
+                'score_count': UserDailyScore.score_count + stmt.excluded.score_count,
+            }
+        ))
+        return
+
+    result = db.session.execute(
+        db.update(UserDailyScore)
+        .where(UserDailyScore.user_id == user_id, UserDailyScore.day == day)
+        .values(
+            score_sum=UserDailyScore.score_sum + score_delta,
+            score_count=UserDailyScore.score_count + count_delta
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    if result.rowcount == 0:
+        if count_delta > 0:
+            db.session.add(UserDailyScore(user_id=user_id, day=day, score_sum=score_delta, score_count=count_delta))
+        return
+
+    if count_delta < 0:
+        # Drop days that no longer have any assessment
+        db.session.execute(
+            db.delete(UserDailyScore)
+            .where(
+                UserDailyScore.user_id == user_id,
+                UserDailyScore.day == day,
+                UserDailyScore.score_count <= 0
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
+def add_history_score(history):
+    """Count an active assessment in its day's aggregate"""
+    day = _history_day(history)
+    if day is not None:
+        _adjust_daily_score(history.user_id, day, history.total_score, 1)
+
+
+def add_day_totals(user_id, totals):
+    """Count several new assessments at once: totals is {day: (score_sum, count)}"""
+    for day, (score_sum, count) in totals.items():
+        _adjust_daily_score(user_id, day, score_sum, count)
+
+
+def remove_history_score(history):
+    """Remove a (previously active) assessment from its day's aggregate"""
+    day = _history_day(history)
+    if day is not None:
+        _adjust_daily_score(history.user_id, day, -history.total_score, -1)
+
+
+def get_daily_scores(user_id, start_date=None, end_date=None):
+    """
+    Read a user's daily aggregates
+
+    Returns:
+        dict: {date: (score_sum, score_count)}
+    """
+    query = db.session.query(
+        UserDailyScore.day,
+        UserDailyScore.score_sum,
+        UserDailyScore.score_count
+    ).filter(
+        UserDailyScore.user_id == user_id,
+        UserDailyScore.score_count > 0
+    )
+    if start_date is not None:
+        query = query.filter(UserDailyScore.day >= start_date)
+    if end_date is not None:
+        query = query.filter(UserDailyScore.day <= end_date)
+
+    return {day: (score_sum, score_count) for day, score_sum, score_count in query.order_by(UserDailyScore.day).all()}
+
+
+def get_daily_scores_window(user_id, end_date, days):
+    """Daily aggregates for the `days`-day window ending on end_date (inclusive)"""
+    return get_daily_scores(user_id, end_date - timedelta(days=days - 1), end_date)
+
+
+def get_daily_summary(user_id, start_date=None, end_date=None):
+    """
+    Per-day average / count / min / max of a user's active assessments
+
+    One GROUP BY day over the rows picked by the
+    (user_id, is_deleted, completed_at) index; the date bounds are applied
+    to completed_at so the range scan stays on that index. The day is
+    completed_date, or the date of completed_at for rows saved before that
+    column was filled.
+
+    Returns:
+        list: [{'date', 'avg', 'count', 'min', 'max'}] oldest day first
+    """
+    score = AssessmentHistory.total_score
+    day = db.func.coalesce(AssessmentHistory.completed_date, db.func.date(AssessmentHistory.completed_at))
+    query = db.session.query(
+        day,
+        db.func.avg(score),
+        db.func.count(AssessmentHistory.id),
+        db.func.min(score),
+        db.func.max(score)
+    ).filter(
+        AssessmentHistory.user_id == user_id,
+        AssessmentHistory.active(),
+        AssessmentHistory.completed_at.isnot(None)
+    )
+    if start_date is not None:
+        query = query.filter(AssessmentHistory.completed_at >= datetime.combine(start_date, time.min))
+    if end_date is not None:
+        query = query.filter(AssessmentHistory.completed_at < datetime.combine(end_date + timedelta(days=1), time.min))
+
+    rows = query.group_by(day).order_by(day).all()
+    return [
+        {'date': day.isoformat(), 'avg': round(float(average), 2), 'count': count, 'min': low, 'max': high}
+        for day, average, count, low, high in rows
+    ]
+
+
+def _daily_totals_select(user_ids=None):
+    """(user_id, day, score_sum, score_count) of active assessments, grouped by user and day"""
+    # Rows from before completed_date was added fall back to the day of completed_at
+    day = db.func.coalesce(AssessmentHistory.completed_date, db.func.date(AssessmentHistory.completed_at))
+    stmt = db.select(
+        AssessmentHistory.user_id,
+        day,
+        db.func.sum(AssessmentHistory.total_score),
+        db.func.count(AssessmentHistory.id)
+    ).where(
+        AssessmentHistory.active(),
+        AssessmentHistory.completed_at.isnot(None)
+    )
+    if user_ids is not None:
+        stmt = stmt.where(AssessmentHistory.user_id.in_(user_ids))
+    return stmt.group_by(AssessmentHistory.user_id, day)
+
+
+def _insert_daily_totals(user_ids=None):
+    return db.insert(UserDailyScore).from_select(
+        ['user_id', 'day', 'score_sum', 'score_count'],
+        _daily_totals_select(user_ids)
+    )
+
+
+@event.listens_for(UserDailyScore.__table__, 'after_create')
+def _fill_daily_scores_on_create(target, connection, **kw):
+    # Existing databases get the table from db.create_all(): fill it before anything reads it
+    if db.inspect(connection).has_table(AssessmentHistory.__tablename__):
+        connection.execute(_insert_daily_totals())
+
+
+def backfill_daily_scores(user_ids=None):
+    """
+    Rebuild user_daily_scores from assessment_history with one grouped INSERT ... SELECT
+
+    Args:
+        user_ids: Restrict to these users (default: everyone)
+
+    Returns:
+        int: Number of daily rows written
+    """
+    delete_stmt = db.delete(UserDailyScore)
+    if user_ids is not None:
+        delete_stmt = delete_stmt.where(UserDailyScore.user_id.in_(user_ids))
+    db.session.execute(delete_stmt)
+    db.session.execute(_insert_daily_totals(user_ids))
+    db.session.commit()
+
+    query = UserDailyScore.query
+    if user_ids is not None:
+        query = query.filter(UserDailyScore.user_id.in_(user_ids))
+    return query.count()
@@ -0,0 +1,155 @@
+"""
+Admin dashboard statistics
+
+The patient-wide numbers (totals, 7-day activity, recent patients) are the
+same for every staff member, so they are computed once and shared; only the
+watchlist count depends on who is asking. Both are served from an
+in-process TTLCache, and the shared payload is refreshed in the background
+once it is DASHBOARD_REFRESH_SECONDS old, so logins never wait on it after
+the first request.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app.models import db, User, AssessmentHistory, UserDailyScore
+from app.admin_models import PatientWatchlist
+from app.utils.cache import TTLCache
+from app.utils.patient_list import INACTIVE_DAYS
+
+ACTIVITY_DAYS = 7
+RECENT_ASSESSMENT_LIMIT = 10
+
+_dashboard_cache = TTLCache()
+
+
+def invalidate_watchlist_count(staff_id):
+    """Call after a staff member adds or removes a watchlist entry"""
+    _dashboard_cache.invalidate(('watchlist', staff_id))
+
+
+def _totals(today):
+    """total_patients / active_today / total_assessments / average_score in one statement"""
+    total_patients = db.select(db.func.count(User.id)).scalar_subquery()
+    total_assessments = db.select(
+        db.func.coalesce(db.func.sum(UserDailyScore.score_count), 0)
+    ).scalar_subquery()
+    score_sum = db.select(
+        db.func.coalesce(db.func.sum(UserDailyScore.score_sum), 0)
+    ).scalar_subquery()
+    active_today = db.select(db.func.count(UserDailyScore.user_id)).where(
+        UserDailyScore.day == today,
+        UserDailyScore.score_count > 0
+    ).scalar_subquery()
+
+    patients, assessments, total_score, active = db.session.execute(
+        db.select(total_patients, total_assessments, score_sum, active_today)
+    ).one()
+    return {
+        'total_patients': patients,
+        'active_today': active,
+        'total_assessments': int(assessments),
+        'average_score': round(total_score / assessments, 2) if assessments else 0,
+    }
+
+
+def _recent_activity(today):
+    """Assessments per day for the last ACTIVITY_DAYS days (one GROUP BY on completed_date)"""
+    first_day = today - timedelta(days=ACTIVITY_DAYS - 1)
+    counts = dict(
+        db.session.query(
+            AssessmentHistory.completed_date,
+            db.func.count(AssessmentHistory.id)
+        ).filter(
+            AssessmentHistory.completed_date >= first_day,
+            AssessmentHistory.completed_date <= today,
+            AssessmentHistory.active()
+        ).group_by(AssessmentHistory.completed_date).all()
+    )
+
+    recent_activity = []
+    for i in range(ACTIVITY_DAYS):
+        day = first_day + timedelta(days=i)
+        recent_activity.append({'date': day.isoformat(), 'count': counts.get(day, 0)})
+    return recent_activity
+
+
+def _recent_patients(now, today):
+    """Patients behind the latest assessments of the last 7 days, newest first ('list' projection)"""
+    seven_days_ago = now - timedelta(days=7)
+    rows = db.session.query(User, AssessmentHistory).join(
+        AssessmentHistory, User.id == AssessmentHistory.user_id
+    ).options(
+        *User.projection_options('list', User.last_login_date),
+        *AssessmentHistory.projection_options('summary')
+    ).filter(
+        # completed_date bound lets the date index narrow the range
+        AssessmentHistory.completed_date >= seven_days_ago.date(),
+        AssessmentHistory.completed_at >= seven_days_ago,
+        AssessmentHistory.active()
+    ).order_by(
+        AssessmentHistory.completed_at.desc()
+    ).limit(RECENT_ASSESSMENT_LIMIT).all()
+
+    recent_patients = []
+    seen_patients = set()
+    for user, assessment in rows:
+        if user.id in seen_patients:
+            continue
+        patient_data = user.to_dict('list')
+        patient_data['latest_assessment'] = assessment.to_dict('summary')
+        # Never logged in counts as inactive too
+        patient_data['inactive_warning'] = (
+            user.last_login_date is None
+            or (today - user.last_login_date).days >= INACTIVE_DAYS
+        )
+        recent_patients.append(patient_data)
+        seen_patients.add(user.id)
+    return recent_patients
+
+
+def compute_dashboard_stats():
+    """The patient-wide part of the dashboard payload (no caching)"""
+    now = datetime.now()
+    today = now.date()
+    stats = _totals(today)
+    stats['recent_activity'] = _recent_activity(today)
+    stats['recent_patients'] = _recent_patients(now, today)
+    return stats
+
+
+def _compute_in_app_context(app):
+    def compute():
+        with app.app_context():
+            try:
+                return compute_dashboard_stats()
+            finally:
+                db.session.remove()
+    return compute
+
+
+def get_dashboard_stats(staff_id):
+    """
+    Dashboard payload for one staff member, served from cache
+
+    Returns:
+        dict: shared stats plus this staff member's watchlist_count
+    """
+    config = current_app.config
+    ttl = config.get('DASHBOARD_CACHE_SECONDS', 60)
+
+    shared = _dashboard_cache.get_or_compute(
+        'stats',
+        _compute_in_app_context(current_app._get_current_object()),
+        ttl,
+        refresh_after=config.get('DASHBOARD_REFRESH_SECONDS', 20)
+    )
+    watchlist_count = _dashboard_cache.get_or_compute(
+        ('watchlist', staff_id),
+        lambda: PatientWatchlist.query.filter_by(staff_id=staff_id).count(),
+        ttl
+    )
+
+    stats = dict(shared)
+    stats['watchlist_count'] = watchlist_count
+    return stats
@@ -0,0 +1,65 @@
+"""
+Per-user data versions for conditional GETs
+
+users.data_version is bumped in the same transaction as any write to a
+user's assessments, diaries or alerts. GET endpoints turn it into a weak
+ETag with one primary-key lookup and answer 304 Not Modified when the
+client already holds that version, without querying the data tables.
+
+Read the ETag before the data: a write landing in between then only makes
+the next request return 200 again, never a stale body under a new tag.
+"""
+import hashlib
+
+from flask import request, make_response
+
+from app.models import db, User
+
+WRITE_BATCH_SIZE = 1000
+
+
+def bump_data_version(user_id):
+    """Invalidate a user's ETags (in the caller's transaction)"""
+    bump_data_versions([user_id])
+
+
+def bump_data_versions(user_ids):
+    """bump_data_version() for many users, in id batches"""
+    user_ids = sorted(set(user_ids))
+    for i in range(0, len(user_ids), WRITE_BATCH_SIZE):
+        db.session.execute(
+            db.update(User)
+            .where(User.id.in_(user_ids[i:i + WRITE_BATCH_SIZE]))
+            .values(data_version=User.data_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def data_etag(user_id):
+    """
+    ETag for the current request (path and query string) at the user's
+    current data version
+
+    Returns:
+        str or None: None if the user does not exist
+    """
+    version = db.session.query(User.data_version).filter(User.id == user_id).scalar()
+    if version is None:
+        return None
+    request_hash = hashlib.sha1(request.full_path.encode('utf-8')).hexdigest()[:12]
+    return f'{user_id}-{version}-{request_hash}'
+
+
+def not_modified(etag):
+    """A 304 response if the request's If-None-Match already has etag, else None"""
+    if etag is None or not request.if_none_match.contains_weak(etag):
+        return None
+    return with_etag(make_response('', 304), etag)
+
+
+def with_etag(response, etag):
+    """Attach etag so the browser revalidates instead of re-downloading"""
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
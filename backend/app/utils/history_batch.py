@@ -0,0 +1,144 @@
+"""
+Bulk assessment upload (POST /api/history/batch) for offline clients
+
+A client that completed assessments offline uploads them in one request,
+each with its own completed_at. The batch is saved in one transaction:
+  - one INSERT for all rows (RETURNING ids in request order)
+  - one user_daily_scores update per day, one latest-assessment refresh,
+    one streak update and one data_version bump
+  - one alert job per day of today; the batch's highest score rides on
+    only one job, so the auto-watchlist check runs once for the user
+  - one "history changed" job per earlier day: a backdated assessment also
+    moves the moving averages of the days after it, so those alerts are
+    recomputed the same way as after a delete or restore
+"""
+from datetime import datetime, timedelta
+
+from app.models import db, AssessmentHistory
+from app.utils.daily_scores import add_day_totals
+from app.utils.data_version import bump_data_version
+from app.utils.latest_assessment import refresh_latest_assessment
+from app.utils.streaks import record_assessment_days
+from app.utils.task_queue import JOB_ASSESSMENT_SAVED, JOB_HISTORY_CHANGED, defer_many, notify_workers, run_inline
+
+MAX_BATCH_SIZE = 100
+
+# Client clocks may run a little fast; anything later than this is rejected
+MAX_CLOCK_SKEW = timedelta(minutes=10)
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _parse_completed_at(value, now, position):
+    """Client timestamp (ISO 8601) as a naive local datetime like datetime.now()"""
+    if value is None:
+        return now
+    try:
+        completed_at = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'第 {position} 筆：completed_at 必須為 ISO 8601 時間')
+    if completed_at.tzinfo is not None:
+        completed_at = completed_at.astimezone().replace(tzinfo=None)
+    if completed_at > now + MAX_CLOCK_SKEW:
+        raise ValueError(f'第 {position} 筆：completed_at 不可晚於現在時間')
+    return completed_at
+
+
+def parse_batch(data, now=None):
+    """
+    Validate a batch body: {"assessments": [{total_score, max_score, answers, completed_at?}, ...]}
+
+    Returns:
+        list: [{'total_score', 'max_score', 'answers', 'completed_at'}] in request order
+
+    Raises:
+        ValueError: with a user-facing message naming the offending item
+    """
+    now = now or datetime.now()
+    items = (data or {}).get('assessments')
+    if not isinstance(items, list) or not items:
+        raise ValueError('assessments 必須為非空陣列')
+    if len(items) > MAX_BATCH_SIZE:
+        raise ValueError(f'一次最多上傳 {MAX_BATCH_SIZE} 筆評估')
+
+    parsed = []
+    for position, item in enumerate(items, start=1):
+        if not isinstance(item, dict) or not all(key in item for key in ('total_score', 'max_score', 'answers')):
+            raise ValueError(f'第 {position} 筆：缺少必要欄位')
+        if not _is_int(item['total_score']) or not _is_int(item['max_score']):
+            raise ValueError(f'第 {position} 筆：total_score 與 max_score 必須為整數')
+        if not isinstance(item['answers'], list):
+            raise ValueError(f'第 {position} 筆：answers 必須為陣列')
+
+        parsed.append({
+            'total_score': item['total_score'],
+            'max_score': item['max_score'],
+            'answers': item['answers'],
+            'completed_at': _parse_completed_at(item.get('completed_at'), now, position),
+        })
+    return parsed
+
+
+def save_history_batch(user, items):
+    """
+    Insert parsed assessments for user and run the post-save work once per day
+
+    Returns:
+        list: [{'history_id', 'level', 'completed_at'}] in request order
+    """
+    rows = []
+    totals = {}
+    for item in items:
+        day = item['completed_at'].date()
+        rows.append({
+            'user_id': user.id,
+            'total_score': item['total_score'],
+            'max_score': item['max_score'],
+            'level': AssessmentHistory.level_for(user.group, item['total_score']),
+            'answers': item['answers'],
+            'completed_at': item['completed_at'],
+            'completed_date': day,
+            'is_deleted': False,
+        })
+        score_sum, count = totals.get(day, (0, 0))
+        totals[day] = (score_sum + item['total_score'], count + 1)
+
+    history_ids = db.session.execute(
+        db.insert(AssessmentHistory).returning(AssessmentHistory.id, sort_by_parameter_order=True),
+        rows
+    ).scalars().all()
+
+    add_day_totals(user.id, totals)
+    refresh_latest_assessment(user.id)
+    record_assessment_days(user, totals)
+    bump_data_version(user.id)
+
+    # Earlier days recompute every alert whose MA window now includes them; today (and
+    # the day holding the batch's top score, for the auto-watchlist) gets an assessment job
+    today = datetime.now().date()
+    days = sorted(totals)
+    top = max(rows, key=lambda row: row['total_score'])
+    saved_jobs = [
+        (day, top['total_score'] if day == top['completed_date'] else None)
+        for day in days if day >= today or day == top['completed_date']
+    ]
+    changed_jobs = [(day, None) for day in days if day < today]
+    queued = defer_many(user.id, saved_jobs, kind=JOB_ASSESSMENT_SAVED)
+    if changed_jobs:
+        defer_many(user.id, changed_jobs, kind=JOB_HISTORY_CHANGED)
+    db.session.commit()
+
+    if queued:
+        notify_workers()
+    else:
+        for day, trigger_score in saved_jobs:
+            run_inline(user.id, day, trigger_score=trigger_score)
+        for day, _ in changed_jobs:
+            run_inline(user.id, day, kind=JOB_HISTORY_CHANGED)
+
+    return [
+        {'history_id': history_id, 'level': row['level'], 'completed_at': row['completed_at']}
+        for history_id, row in zip(history_ids, rows)
+    ]
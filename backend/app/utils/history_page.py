@@ -0,0 +1,143 @@
+"""
+Date-ranged, keyset-paginated assessment history for one user
+
+Rows are ordered newest first by (completed_at, id) and every page filter
+is on (user_id, is_deleted, completed_at), so the
+ix_assessment_history_user_deleted_completed index serves the range scan
+and each page costs the same however far back the caller has loaded.
+
+  - before=<cursor>: the next page of older rows (the usual "load more")
+  - after=<cursor>:  rows newer than the cursor, for picking up new
+                     assessments without reloading the list
+"""
+import base64
+import json
+from datetime import datetime, time, timedelta
+
+from app.models import db, AssessmentHistory
+
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(history):
+    raw = json.dumps([history.completed_at.isoformat(), history.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """(completed_at, id) from a cursor made by encode_cursor"""
+    try:
+        completed_at, history_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(completed_at), int(history_id)
+    except (ValueError, TypeError):
+        raise ValueError('cursor 無效，請重新載入列表')
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'{name} 日期格式必須為 YYYY-MM-DD')
+
+
+def parse_date_range(args):
+    """
+    (from, to) dates from the query string, either may be None
+
+    Raises:
+        ValueError: with a user-facing message on invalid input
+    """
+    start = _parse_date(args['from'], 'from') if args.get('from') else None
+    end = _parse_date(args['to'], 'to') if args.get('to') else None
+    if start and end and start > end:
+        raise ValueError('from 不可晚於 to')
+    return start, end
+
+
+def parse_history_args(args):
+    """
+    Read fields / limit / before / after / from / to from the query string
+
+    Raises:
+        ValueError: with a user-facing message on invalid input
+    """
+    fields = AssessmentHistory.check_projection(args.get('fields', 'full'))
+
+    limit = args.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError('limit 必須為整數')
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f'limit 必須介於 1 與 {MAX_PAGE_SIZE} 之間')
+
+    if args.get('before') and args.get('after'):
+        raise ValueError('before 與 after 只能擇一')
+
+    start, end = parse_date_range(args)
+
+    return {
+        'fields': fields,
+        'limit': limit,
+        'before': decode_cursor(args['before']) if args.get('before') else None,
+        'after': decode_cursor(args['after']) if args.get('after') else None,
+        'from': start,
+        'to': end,
+    }
+
+
+def query_history_page(user_id, options):
+    """
+    One page of a user's active assessments, newest first
+
+    Returns:
+        tuple: ([AssessmentHistory], next cursor or None). The next cursor
+        continues in the requested direction: pass it as `after` when the
+        page was requested with `after`, otherwise as `before`.
+    """
+    completed_at = AssessmentHistory.completed_at
+    query = AssessmentHistory.query.options(
+        *AssessmentHistory.projection_options(options['fields'])
+    ).filter(
+        AssessmentHistory.user_id == user_id,
+        AssessmentHistory.active()
+    )
+
+    # Date bounds on completed_at itself (not completed_date) keep the scan on the index
+    if options['from']:
+        query = query.filter(completed_at >= datetime.combine(options['from'], time.min))
+    if options['to']:
+        query = query.filter(completed_at < datetime.combine(options['to'] + timedelta(days=1), time.min))
+
+    newer = options['after'] is not None
+    if options['before']:
+        value, last_id = options['before']
+        query = query.filter(db.or_(
+            completed_at < value,
+            db.and_(completed_at == value, AssessmentHistory.id < last_id)
+        ))
+    elif newer:
+        value, last_id = options['after']
+        query = query.filter(db.or_(
+            completed_at > value,
+            db.and_(completed_at == value, AssessmentHistory.id > last_id)
+        ))
+
+    # Newer rows are read oldest first so a page is the one right after the cursor
+    if newer:
+        query = query.order_by(completed_at, AssessmentHistory.id)
+    else:
+        query = query.order_by(completed_at.desc(), AssessmentHistory.id.desc())
+
+    limit = options['limit']
+    if limit is None:
+        rows = query.all()
+        return (rows[::-1] if newer else rows), None
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1])
+    return (rows[::-1] if newer else rows), next_cursor
@@ -0,0 +1,184 @@
+"""
+Idempotency-Key support for patient writes
+
+A client that may retry a write (mobile over a flaky link) sends the same
+Idempotency-Key header on every attempt. The first request claims the key
+by committing an idempotency_keys row before the view runs, then stores the
+view's status and body. A retry with the same key and body gets that stored
+response back (Idempotent-Replayed: true) without running the view again,
+so no second row, alert job or watchlist check is created.
+
+  - same key, different body:        422
+  - same key while the first request is still running: 409
+  - 5xx responses are not stored; the key is released so a retry runs again
+  - keys expire after IDEMPOTENCY_KEY_TTL_SECONDS; the maintenance job deletes them
+
+A claim left behind by a crashed process is taken over after
+IDEMPOTENCY_PENDING_SECONDS.
+"""
+import hashlib
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+
+from app.models import db, IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def _request_hash():
+    return hashlib.sha256(request.get_data()).hexdigest()
+
+
+def _find(user_id, endpoint, key):
+    return IdempotencyKey.query.filter_by(user_id=user_id, endpoint=endpoint, key=key).first()
+
+
+def _replay(record):
+    response = current_app.response_class(record.response_body, status=record.status_code, mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _claim(user_id, endpoint, key, request_hash, now):
+    """
+    Insert (or take over) the key's row
+
+    Returns:
+        tuple: (claimed IdempotencyKey or None, existing IdempotencyKey or None)
+    """
+    config = current_app.config
+    existing = _find(user_id, endpoint, key)
+
+    if existing is not None and existing.expires_at <= now:
+        db.session.delete(existing)
+        db.session.commit()
+        existing = None
+
+    if existing is not None:
+        stale_before = now - timedelta(seconds=config.get('IDEMPOTENCY_PENDING_SECONDS', 60))
+        if existing.status_code is not None or existing.request_hash != request_hash or existing.created_at > stale_before:
+            return None, existing
+        # Abandoned claim (process died mid-request): take it over unless another retry already did
+        taken = db.session.execute(
+            db.update(IdempotencyKey)
+            .where(IdempotencyKey.id == existing.id, IdempotencyKey.created_at == existing.created_at)
+            .values(created_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if not taken:
+            return None, _find(user_id, endpoint, key)
+        return db.session.get(IdempotencyKey, existing.id, populate_existing=True), None
+
+    record = IdempotencyKey(
+        user_id=user_id,
+        endpoint=endpoint,
+        key=key,
+        request_hash=request_hash,
+        created_at=now,
+        expires_at=now + timedelta(seconds=config.get('IDEMPOTENCY_KEY_TTL_SECONDS', 86400))
+    )
+    db.session.add(record)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent retry claimed it first
+        db.session.rollback()
+        return None, _find(user_id, endpoint, key)
+    return record, None
+
+
+def _release(record_id):
+    db.session.rollback()
+    db.session.execute(
+        db.delete(IdempotencyKey)
+        .where(IdempotencyKey.id == record_id)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def idempotent(endpoint):
+    """
+    Make a JWT-protected patient write replayable with an Idempotency-Key
+    header (apply below @jwt_required()). Requests without the header run
+    unchanged.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({'success': False, 'message': f'{HEADER} 不可超過 {MAX_KEY_LENGTH} 個字元'}), 400
+
+            user_id = int(get_jwt_identity())
+            request_hash = _request_hash()
+            record, existing = _claim(user_id, endpoint, key, request_hash, datetime.now())
+
+            if existing is not None:
+                if existing.request_hash != request_hash:
+                    return jsonify({'success': False, 'message': f'{HEADER} 已用於內容不同的請求'}), 422
+                if existing.status_code is None:
+                    return jsonify({'success': False, 'message': '相同的請求正在處理中，請稍後再試'}), 409
+                return _replay(existing)
+            if record is None:
+                # Claim lost and the winner's row is already gone (released or expired): run as a new request
+                return view(*args, **kwargs)
+
+            record_id = record.id
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                _release(record_id)
+                raise
+
+            if response.status_code >= 500 or response.is_streamed:
+                _release(record_id)
+                return response
+
+            db.session.execute(
+                db.update(IdempotencyKey)
+                .where(IdempotencyKey.id == record_id)
+                .values(status_code=response.status_code, response_body=response.get_data(as_text=True))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            return response
+        return wrapper
+    return decorator
+
+
+def purge_expired_keys(batch_size=1000, now=None):
+    """
+    Delete expired idempotency keys in bounded batches
+
+    Returns:
+        int: rows deleted
+    """
+    now = now or datetime.now()
+    purged = 0
+    while True:
+        ids = [
+            key_id for (key_id,) in db.session.query(IdempotencyKey.id).filter(
+                IdempotencyKey.expires_at <= now
+            ).limit(batch_size).all()
+        ]
+        if not ids:
+            break
+        db.session.execute(
+            db.delete(IdempotencyKey)
+            .where(IdempotencyKey.id.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        purged += len(ids)
+        if len(ids) < batch_size:
+            break
+    return purged
@@ -0,0 +1,77 @@
+"""
+JSON response encoding for the Flask app
+
+create_app() installs OrjsonProvider when orjson is importable (C encoder,
+writes UTF-8 directly) and StdlibJSONProvider otherwise; JSON_PROVIDER
+('auto', 'orjson' or 'stdlib') forces one. Both produce the same document:
+sorted keys, non-ASCII text as-is, and dates / datetimes encoded here in the
+format to_dict() used to build with str() (`2025-06-30`,
+`2025-06-30 08:15:00.123456`), so models can return them unconverted.
+
+Request bodies are still parsed with the stdlib decoder.
+"""
+import dataclasses
+import decimal
+import uuid
+from datetime import date, datetime
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib encoder
+    orjson = None
+
+
+def _default(value):
+    """Encode the types Flask's provider supports, with str()-style dates"""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    """Flask's provider with the shared date format and unescaped Chinese text"""
+    ensure_ascii = False
+    default = staticmethod(_default)
+
+
+class OrjsonProvider(StdlibJSONProvider):
+    """orjson for dumps() / responses; anything needing stdlib-only options falls back"""
+
+    OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS) if orjson else 0
+
+    def _encode(self, obj, indent=False):
+        option = self.OPTIONS | orjson.OPT_INDENT_2 if indent else self.OPTIONS
+        return orjson.dumps(obj, default=_default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._encode(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._encode(obj, indent) + b'\n', mimetype=self.mimetype)
+
+
+def install_json_provider(app):
+    """Set app.json according to JSON_PROVIDER; returns the provider class name"""
+    choice = app.config.get('JSON_PROVIDER', 'auto')
+    if choice not in ('auto', 'orjson', 'stdlib'):
+        raise ValueError(f"JSON_PROVIDER must be auto, orjson or stdlib, not {choice!r}")
+    if choice == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_PROVIDER=orjson but orjson is not installed')
+
+    provider_class = OrjsonProvider if orjson is not None and choice != 'stdlib' else StdlibJSONProvider
+    app.json = provider_class(app)
+    return provider_class.__name__
@@ -0,0 +1,61 @@
+"""
+users.latest_assessment_id maintenance
+
+Points at each user's most recent non-deleted assessment, so patient lists
+join exactly one history row per patient instead of scanning history.
+latest_score / latest_completed_at copy that row's score and time so the
+patient list can sort on them through ix_users_latest_score_id /
+ix_users_latest_completed_at_id.
+"""
+from app.models import db, User, AssessmentHistory, NO_LATEST_SCORE, NO_LATEST_TIME
+
+
+def _latest(column, user_id_column):
+    return db.select(column).where(
+        AssessmentHistory.user_id == user_id_column,
+        AssessmentHistory.active()
+    ).order_by(
+        AssessmentHistory.completed_at.desc(), AssessmentHistory.id.desc()
+    ).limit(1).scalar_subquery()
+
+
+def _latest_values(user_id_column):
+    """UPDATE values for the latest-assessment columns (three indexed lookups of the same row)"""
+    return {
+        'latest_assessment_id': _latest(AssessmentHistory.id, user_id_column),
+        'latest_score': db.func.coalesce(_latest(AssessmentHistory.total_score, user_id_column), NO_LATEST_SCORE),
+        'latest_completed_at': db.func.coalesce(_latest(AssessmentHistory.completed_at, user_id_column), NO_LATEST_TIME),
+    }
+
+
+def refresh_latest_assessment(user_id):
+    """
+    Re-point a user's latest_assessment_id (and latest score / time) after an
+    assessment was saved, deleted or restored (one UPDATE, in the caller's transaction)
+    """
+    db.session.flush()
+    db.session.execute(
+        db.update(User)
+        .where(User.id == user_id)
+        .values(**_latest_values(user_id))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def backfill_latest_assessments(user_ids=None):
+    """
+    Set latest_assessment_id, latest_score and latest_completed_at for every
+    user with one correlated UPDATE
+
+    Args:
+        user_ids: Restrict to these users (default: everyone)
+
+    Returns:
+        int: Number of users updated
+    """
+    stmt = db.update(User).values(**_latest_values(User.id))
+    if user_ids is not None:
+        stmt = stmt.where(User.id.in_(user_ids))
+    result = db.session.execute(stmt.execution_options(synchronize_session=False))
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,150 @@
+"""
+Scheduled maintenance: permanently deleting recycle-bin assessments,
+expired idempotency keys and finished alert jobs
+
+Soft-deleted assessments stay in the recycle bin for TRASH_RETENTION_DAYS
+days. purge_trash() removes older ones in bounded batches: each batch
+reads up to TRASH_PURGE_BATCH_SIZE ids from the partial index on deleted
+rows, deletes them with one DELETE ... WHERE id IN (...), bumps the owners'
+data_version and commits, so no single transaction grows with the backlog.
+
+start_maintenance() runs it every MAINTENANCE_INTERVAL_SECONDS in a daemon
+thread (one per process); `flask --app run.py maintenance purge-trash` runs
+it on demand or from cron. Each pass also deletes expired idempotency keys
+(app.utils.idempotency) and done / failed alert_jobs rows older than
+ALERT_JOB_RETENTION_DAYS (app.utils.task_queue). Counters for the current process are available
+from maintenance_metrics().
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app.models import db, AssessmentHistory
+from app.utils.data_version import bump_data_versions
+from app.utils.idempotency import purge_expired_keys
+from app.utils.task_queue import purge_finished_jobs
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    'runs': 0,
+    'purged_total': 0,
+    'last_run_at': None,
+    'last_purged': 0,
+    'last_batches': 0,
+    'last_seconds': None,
+    'last_error': None,
+    'idempotency_keys_purged_total': 0,
+    'last_idempotency_keys_purged': 0,
+    'alert_jobs_purged_total': 0,
+    'last_alert_jobs_purged': 0,
+}
+
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def _record_run(stats=None, error=None):
+    with _metrics_lock:
+        _metrics['runs'] += 1
+        _metrics['last_run_at'] = datetime.now()
+        _metrics['last_error'] = error
+        if stats:
+            _metrics['purged_total'] += stats['purged']
+            _metrics['last_purged'] = stats['purged']
+            _metrics['last_batches'] = stats['batches']
+            _metrics['last_seconds'] = stats['seconds']
+            _metrics['idempotency_keys_purged_total'] += stats['idempotency_keys']
+            _metrics['last_idempotency_keys_purged'] = stats['idempotency_keys']
+            _metrics['alert_jobs_purged_total'] += stats['alert_jobs']
+            _metrics['last_alert_jobs_purged'] = stats['alert_jobs']
+
+
+def maintenance_metrics():
+    """Copy of this process's purge counters"""
+    with _metrics_lock:
+        return dict(_metrics)
+
+
+def purge_trash(retention_days=10, batch_size=1000, now=None):
+    """
+    Permanently delete assessments that have been in the recycle bin longer
+    than retention_days
+
+    Returns:
+        dict: purged (rows), batches, users (whose data_version changed), seconds
+    """
+    started = time.perf_counter()
+    cutoff = (now or datetime.now()) - timedelta(days=retention_days)
+    purged = batches = 0
+    users = set()
+
+    while True:
+        rows = db.session.query(AssessmentHistory.id, AssessmentHistory.user_id).filter(
+            AssessmentHistory.is_deleted == True,
+            AssessmentHistory.deleted_at < cutoff
+        ).limit(batch_size).all()
+        if not rows:
+            break
+
+        db.session.execute(
+            db.delete(AssessmentHistory)
+            .where(AssessmentHistory.id.in_([history_id for history_id, _ in rows]))
+            .execution_options(synchronize_session=False)
+        )
+        batch_users = {user_id for _, user_id in rows}
+        bump_data_versions(batch_users)
+        db.session.commit()
+
+        purged += len(rows)
+        batches += 1
+        users |= batch_users
+        if len(rows) < batch_size:
+            break
+
+    return {
+        'purged': purged,
+        'batches': batches,
+        'users': len(users),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def run_maintenance(app):
+    """One maintenance pass with the app's settings; records metrics, never raises"""
+    with app.app_context():
+        try:
+            batch_size = app.config.get('TRASH_PURGE_BATCH_SIZE', 1000)
+            stats = purge_trash(app.config.get('TRASH_RETENTION_DAYS', 10), batch_size)
+            stats['idempotency_keys'] = purge_expired_keys(batch_size)
+            stats['alert_jobs'] = purge_finished_jobs(app.config.get('ALERT_JOB_RETENTION_DAYS', 7), batch_size)
+            _record_run(stats)
+            if stats['purged']:
+                print(f"Trash purge: {stats['purged']} rows in {stats['batches']} batches ({stats['seconds']}s)")
+            return stats
+        except Exception as e:
+            db.session.rollback()
+            _record_run(error=str(e))
+            print(f"Maintenance failed: {e}")
+            return None
+        finally:
+            db.session.remove()
+
+
+def _maintenance_loop(app, interval):
+    while True:
+        run_maintenance(app)
+        time.sleep(interval)
+
+
+def start_maintenance(app):
+    """Start the maintenance thread once per process (MAINTENANCE_INTERVAL_SECONDS = 0 disables it)"""
+    global _thread
+    interval = app.config.get('MAINTENANCE_INTERVAL_SECONDS', 3600)
+    if not interval:
+        return
+
+    with _thread_lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=_maintenance_loop, args=(app, interval), name='maintenance', daemon=True)
+        _thread.start()
@@ -0,0 +1,179 @@
+"""
+Filtered, keyset-paginated patient list for the admin patient page
+
+All filtering and ordering happens in SQL. A page is fetched with
+"(sort_key, id) after the cursor" instead of OFFSET, so every page costs
+the same no matter how deep the caller has scrolled.
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+
+from app.models import db, User, AssessmentHistory, ScoreAlert
+from app.admin_models import PatientAssignment, PatientWatchlist
+
+# Patients who have not logged in for this many days get inactive_warning
+INACTIVE_DAYS = 5
+
+# sort key -> default direction
+SORT_KEYS = {'id': 'asc', 'name': 'asc', 'latest_score': 'desc', 'latest_time': 'desc'}
+
+MAX_PAGE_SIZE = 500
+
+
+def _parse_bool(value, name):
+    if value is None:
+        return None
+    lowered = value.lower()
+    if lowered in ('1', 'true', 'yes'):
+        return True
+    if lowered in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f'{name} 必須為 true 或 false')
+
+
+def parse_list_args(args):
+    """
+    Read filters / sort / pagination from the query string
+
+    Raises:
+        ValueError: with a user-facing message on invalid input
+    """
+    sort = args.get('sort', 'id')
+    if sort not in SORT_KEYS:
+        raise ValueError(f"sort 必須為 {', '.join(SORT_KEYS)} 之一")
+    order = args.get('order', SORT_KEYS[sort])
+    if order not in ('asc', 'desc'):
+        raise ValueError('order 必須為 asc 或 desc')
+
+    limit = args.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError('limit 必須為整數')
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f'limit 必須介於 1 與 {MAX_PAGE_SIZE} 之間')
+
+    return {
+        'group': args.get('group') or None,
+        'level': args.get('level') or None,
+        'inactive': _parse_bool(args.get('inactive_warning'), 'inactive_warning'),
+        'watchlisted': _parse_bool(args.get('watchlisted'), 'watchlisted'),
+        'has_alerts': _parse_bool(args.get('has_alerts'), 'has_alerts'),
+        'sort': sort,
+        'order': order,
+        'limit': limit,
+        'cursor': decode_cursor(args.get('cursor'), sort) if args.get('cursor') else None,
+    }
+
+
+def encode_cursor(sort, value, patient_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, patient_id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor, sort):
+    """(sort value, patient id) from a cursor made by encode_cursor for the same sort key"""
+    try:
+        cursor_sort, value, patient_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if cursor_sort != sort:
+            raise ValueError
+        if sort == 'latest_time':
+            value = datetime.fromisoformat(value)
+        return value, int(patient_id)
+    except (ValueError, TypeError):
+        raise ValueError('cursor 無效，請重新載入列表')
+
+
+def inactive_condition(today=None):
+    today = today or datetime.now().date()
+    return db.or_(
+        User.last_login_date.is_(None),
+        User.last_login_date <= today - timedelta(days=INACTIVE_DAYS)
+    )
+
+
+def patient_scope(staff):
+    """Subquery of the patient ids assigned to staff, or None for super_admin (every patient)"""
+    if staff.role == 'super_admin':
+        return None
+    return db.select(PatientAssignment.patient_id).where(PatientAssignment.staff_id == staff.id)
+
+
+def query_patient_page(staff, options):
+    """
+    One page of the staff member's patients
+
+    Returns:
+        tuple: ([(User, latest AssessmentHistory or None)], next cursor or None)
+    """
+    scope = patient_scope(staff)
+
+    # users.latest_assessment_id: exactly one history row per patient. Every sort key
+    # is a users column with an (key, id) index; patients without an assessment carry
+    # NO_LATEST_SCORE / NO_LATEST_TIME, so they sort last (desc) / first (asc)
+    sort_columns = {
+        'id': User.id,
+        'name': User.name,
+        'latest_score': User.latest_score,
+        'latest_time': User.latest_completed_at,
+    }
+    sort_key = sort_columns[options['sort']]
+
+    # Only the columns the list renders: User / AssessmentHistory 'summary' projections
+    query = db.session.query(User, AssessmentHistory, sort_key).outerjoin(
+        AssessmentHistory, AssessmentHistory.id == User.latest_assessment_id
+    ).options(
+        *User.projection_options('summary', User.last_login_date),
+        *AssessmentHistory.projection_options('summary')
+    )
+    if scope is not None:
+        query = query.filter(User.id.in_(scope))
+
+    if options['group']:
+        query = query.filter(User.group == options['group'])
+    if options['level']:
+        query = query.filter(AssessmentHistory.level == options['level'])
+    if options['inactive'] is not None:
+        condition = inactive_condition()
+        query = query.filter(condition if options['inactive'] else db.not_(condition))
+    if options['watchlisted'] is not None:
+        watched = db.select(PatientWatchlist.patient_id).where(PatientWatchlist.staff_id == staff.id)
+        query = query.filter(User.id.in_(watched) if options['watchlisted'] else User.id.not_in(watched))
+    if options['has_alerts'] is not None:
+        unread = db.exists().where(ScoreAlert.user_id == User.id, ScoreAlert.is_read == False)
+        query = query.filter(unread if options['has_alerts'] else ~unread)
+
+    descending = options['order'] == 'desc'
+    if options['cursor']:
+        value, last_id = options['cursor']
+        if options['sort'] == 'id':
+            query = query.filter(User.id < last_id if descending else User.id > last_id)
+        elif descending:
+            query = query.filter(db.or_(sort_key < value, db.and_(sort_key == value, User.id < last_id)))
+        else:
+            query = query.filter(db.or_(sort_key > value, db.and_(sort_key == value, User.id > last_id)))
+
+    if options['sort'] == 'id':
+        query = query.order_by(User.id.desc() if descending else User.id)
+    else:
+        query = query.order_by(
+            sort_key.desc() if descending else sort_key,
+            User.id.desc() if descending else User.id
+        )
+
+    limit = options['limit']
+    if limit is None:
+        return [(user, latest) for user, latest, _ in query.all()], None
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_user, _, last_value = rows[-1]
+        next_cursor = encode_cursor(options['sort'], last_value, last_user.id)
+
+    return [(user, latest) for user, latest, _ in rows], next_cursor
@@ -0,0 +1,183 @@
+"""
+Admin patient search by name / nickname / email
+
+Matching is a case-insensitive substring match on the three columns. Each
+database gets an index that can answer it:
+  - PostgreSQL: pg_trgm GIN indexes, which serve ILIKE '%q%' directly
+  - SQLite: an FTS5 trigram table (users_search) kept in sync with users
+    by triggers; queries of at least 3 characters go through it, shorter
+    ones (2-character Chinese names) scan the caller's patients with LIKE
+
+Results are ranked exact match > prefix match > substring match, then by
+shorter name, and are limited to the patients the caller may see.
+"""
+from sqlalchemy import event
+
+from app.models import db, User, AssessmentHistory
+from app.utils.patient_list import patient_scope
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MAX_QUERY_LENGTH = 100
+
+# FTS5 trigram tokens are 3 characters; shorter queries cannot use the table
+TRIGRAM_MIN_LENGTH = 3
+
+SEARCH_COLUMNS = ('name', 'nickname', 'email')
+
+POSTGRESQL_SEARCH_DDL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    *(
+        f'CREATE INDEX IF NOT EXISTS ix_users_{column}_trgm ON users USING gin ({column} gin_trgm_ops)'
+        for column in SEARCH_COLUMNS
+    ),
+]
+
+# External-content FTS table: stores only the index, rows are read from users.
+# The update trigger is limited to the searched columns so streak / version
+# updates do not touch the index.
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS users_search USING fts5("
+    "name, nickname, email, content='users', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS users_search_ai AFTER INSERT ON users BEGIN "
+    "INSERT INTO users_search(rowid, name, nickname, email) VALUES (new.id, new.name, new.nickname, new.email); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS users_search_ad AFTER DELETE ON users BEGIN "
+    "INSERT INTO users_search(users_search, rowid, name, nickname, email) "
+    "VALUES ('delete', old.id, old.name, old.nickname, old.email); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS users_search_au AFTER UPDATE OF name, nickname, email ON users BEGIN "
+    "INSERT INTO users_search(users_search, rowid, name, nickname, email) "
+    "VALUES ('delete', old.id, old.name, old.nickname, old.email); "
+    "INSERT INTO users_search(rowid, name, nickname, email) VALUES (new.id, new.name, new.nickname, new.email); "
+    "END",
+]
+
+# SQLite builds with the FTS5 trigram tokenizer
+SQLITE_TRIGRAM_VERSION = (3, 34, 0)
+
+_fts_ready = {}
+
+
+def search_index_ddl(connection):
+    """The statements that create the search index for this connection's database ([] if unsupported)"""
+    dialect = connection.dialect
+    if dialect.name == 'postgresql':
+        return POSTGRESQL_SEARCH_DDL
+    if dialect.name == 'sqlite' and dialect.dbapi.sqlite_version_info >= SQLITE_TRIGRAM_VERSION:
+        return SQLITE_SEARCH_DDL
+    return []
+
+
+def create_search_index(connection, rebuild=False):
+    """
+    Create the search index (idempotent)
+
+    Args:
+        rebuild: Re-read every existing user into the SQLite FTS table
+            (needed once when adding the index to an existing database)
+
+    Returns:
+        bool: False when this database has no supported search index
+    """
+    statements = search_index_ddl(connection)
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+    if rebuild and statements is SQLITE_SEARCH_DDL:
+        connection.exec_driver_sql("INSERT INTO users_search(users_search) VALUES ('rebuild')")
+    _fts_ready.pop(str(connection.engine.url), None)
+    return bool(statements)
+
+
+@event.listens_for(User.__table__, 'after_create')
+def _create_search_index_with_users(target, connection, **kw):
+    # New databases (db.create_all) get the index together with the users table
+    create_search_index(connection)
+
+
+def _sqlite_fts_ready():
+    url = str(db.engine.url)
+    if url not in _fts_ready:
+        _fts_ready[url] = db.inspect(db.engine).has_table('users_search')
+    return _fts_ready[url]
+
+
+def parse_search_args(args):
+    """
+    Read q / limit from the query string
+
+    Raises:
+        ValueError: with a user-facing message on invalid input
+    """
+    term = (args.get('q') or '').strip()
+    if not term:
+        raise ValueError('請輸入搜尋關鍵字 q')
+    if len(term) > MAX_QUERY_LENGTH:
+        raise ValueError(f'q 不可超過 {MAX_QUERY_LENGTH} 個字')
+
+    limit = args.get('limit', DEFAULT_LIMIT)
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValueError('limit 必須為整數')
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f'limit 必須介於 1 與 {MAX_LIMIT} 之間')
+    return term, limit
+
+
+def _like_escape(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _fts_phrase(term):
+    # One quoted FTS5 phrase: matches the term as a substring of any column
+    return '"' + term.replace('"', '""') + '"'
+
+
+def search_patients(staff, term, limit=DEFAULT_LIMIT):
+    """
+    Ranked patients matching term, limited to the ones staff may see
+
+    Returns:
+        list: [(User, latest AssessmentHistory or None)], best match first
+    """
+    lowered = term.lower()
+    columns = [User.name, User.nickname, User.email]
+    escaped = _like_escape(lowered)
+    contains = f'%{escaped}%'
+    prefix = f'{escaped}%'
+
+    rank = db.case(
+        (db.or_(*(db.func.lower(column) == lowered for column in columns)), 0),
+        (db.or_(*(column.ilike(prefix, escape='\\') for column in columns)), 1),
+        else_=2
+    )
+
+    query = db.session.query(User, AssessmentHistory).outerjoin(
+        AssessmentHistory, AssessmentHistory.id == User.latest_assessment_id
+    ).options(
+        *User.projection_options('summary'),
+        *AssessmentHistory.projection_options('summary')
+    )
+
+    scope = patient_scope(staff)
+    if scope is not None:
+        query = query.filter(User.id.in_(scope))
+
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite' and len(term) >= TRIGRAM_MIN_LENGTH and _sqlite_fts_ready():
+        matches = db.text(
+            'SELECT rowid FROM users_search WHERE users_search MATCH :phrase'
+        ).bindparams(phrase=_fts_phrase(term)).columns(db.column('rowid', db.Integer))
+        query = query.filter(User.id.in_(matches))
+    else:
+        query = query.filter(db.or_(*(column.ilike(contains, escape='\\') for column in columns)))
+
+    order = [rank]
+    if dialect == 'postgresql':
+        order.append(db.func.greatest(*(
+            db.func.similarity(db.func.coalesce(column, ''), term) for column in columns
+        )).desc())
+    order.extend([db.func.length(User.name), User.id])
+
+    return query.order_by(*order).limit(limit).all()
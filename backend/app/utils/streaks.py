@@ -0,0 +1,114 @@
+"""
+Assessment streak (users.current_streak / last_streak_date) maintenance
+
+current_streak is the number of consecutive days with an active assessment
+ending on last_streak_date. Saving an assessment extends it in O(1); a
+delete / restore that empties or fills a day re-reads that user's days
+from user_daily_scores. User.calculate_streak() only reads the stored
+state.
+"""
+from datetime import timedelta
+from itertools import groupby
+
+from app.models import db, User, UserDailyScore
+
+WRITE_BATCH_SIZE = 1000
+
+
+def _run_length(days):
+    """Length of the consecutive run at the start of days (newest first)"""
+    streak = 0
+    previous = None
+    for day in days:
+        if previous is not None and (previous - day).days != 1:
+            break
+        streak += 1
+        previous = day
+    return streak
+
+
+def record_assessment_day(user, day):
+    """Extend the streak for a newly saved assessment on day (caller commits)"""
+    last = user.last_streak_date
+    if last is None or day > last + timedelta(days=1):
+        user.current_streak = 1
+        user.last_streak_date = day
+    elif day == last + timedelta(days=1):
+        user.current_streak = (user.current_streak or 0) + 1
+        user.last_streak_date = day
+    elif day < last:
+        # Back-dated assessment may bridge a gap inside the run
+        recompute_streak(user.id)
+
+
+def record_assessment_days(user, days):
+    """Extend the streak for assessments saved together on several days (caller commits)"""
+    days = sorted(set(days))
+    if not days:
+        return
+    if user.last_streak_date is not None and days[0] < user.last_streak_date:
+        # Something back-dated: one recompute covers every day in the batch
+        recompute_streak(user.id)
+        return
+    for day in days:
+        record_assessment_day(user, day)
+
+
+def recompute_streak(user_id):
+    """Recompute one user's streak from user_daily_scores (caller commits)"""
+    db.session.flush()
+    days = [
+        day for (day,) in db.session.query(UserDailyScore.day).filter(
+            UserDailyScore.user_id == user_id,
+            UserDailyScore.score_count > 0
+        ).order_by(UserDailyScore.day.desc()).all()
+    ]
+    db.session.execute(
+        db.update(User)
+        .where(User.id == user_id)
+        .values(current_streak=_run_length(days), last_streak_date=days[0] if days else None)
+        .execution_options(synchronize_session='fetch')
+    )
+
+
+def refresh_streak_for_day(user_id, day):
+    """
+    After an assessment on day was deleted or restored: the streak only
+    changes when the day went from empty to active or back
+    """
+    db.session.flush()
+    count = db.session.query(UserDailyScore.score_count).filter_by(user_id=user_id, day=day).scalar() or 0
+    if count <= 1:
+        recompute_streak(user_id)
+
+
+def recompute_all_streaks(user_ids=None):
+    """
+    Rebuild current_streak / last_streak_date from user_daily_scores in bulk
+
+    Args:
+        user_ids: Restrict to these users (default: everyone)
+
+    Returns:
+        int: Number of users with an active streak day
+    """
+    reset = db.update(User).values(current_streak=0, last_streak_date=None)
+    if user_ids:
+        reset = reset.where(User.id.in_(user_ids))
+    db.session.execute(reset.execution_options(synchronize_session=False))
+
+    stmt = db.select(UserDailyScore.user_id, UserDailyScore.day).where(UserDailyScore.score_count > 0)
+    if user_ids:
+        stmt = stmt.where(UserDailyScore.user_id.in_(user_ids))
+    stmt = stmt.order_by(UserDailyScore.user_id, UserDailyScore.day.desc())
+
+    updates = []
+    rows = db.session.execute(stmt.execution_options(yield_per=5000))
+    for user_id, user_rows in groupby(rows, key=lambda row: row[0]):
+        days = [day for _, day in user_rows]
+        updates.append({'id': user_id, 'current_streak': _run_length(days), 'last_streak_date': days[0]})
+
+    for i in range(0, len(updates), WRITE_BATCH_SIZE):
+        db.session.execute(db.update(User), updates[i:i + WRITE_BATCH_SIZE])
+    db.session.commit()
+    return len(updates)
@@ -0,0 +1,289 @@
+"""
+Background processing of post-save work
+
+Saving an assessment records an "assessment saved" job (deleting or
+restoring one, a "history changed" job) in the alert_jobs table inside the
+same transaction, so nothing is lost on restart. A small in-process worker
+pool claims pending jobs and runs the auto-watchlist and alert handlers
+outside the request. Several saves for the same user/day
+collapse into one pending job. Handlers are idempotent, so re-running a job
+(after a crash or a retry) is harmless. Finished jobs are deleted by the
+maintenance job after ALERT_JOB_RETENTION_DAYS (purge_finished_jobs).
+
+ALERT_TASK_MODE defaults to 'sync' (app.config.DEFAULT_ALERT_TASK_MODE):
+the handlers run inline after the request commits, as before. 'async'
+opts in to the queue and worker pool.
+"""
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app.config import DEFAULT_ALERT_TASK_MODE
+from app.models import db, AlertJob, User
+
+
+JOB_ASSESSMENT_SAVED = 'assessment_saved'
+JOB_HISTORY_CHANGED = 'history_changed'
+FINISHED_STATUSES = ('done', 'failed')
+
+_handlers = {}
+_workers = []
+_workers_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+def job_handler(kind):
+    """Register the handler for a job kind: handler(user_id, job_date, trigger_score)"""
+    def decorator(func):
+        _handlers[kind] = func
+        return func
+    return decorator
+
+
+def _task_mode(config):
+    return config.get('ALERT_TASK_MODE', DEFAULT_ALERT_TASK_MODE)
+
+
+def is_async():
+    return _task_mode(current_app.config) == 'async'
+
+
+@job_handler(JOB_ASSESSMENT_SAVED)
+def handle_assessment_saved(user_id, job_date, trigger_score):
+    """Auto-watchlist and alert evaluation after assessments were saved"""
+    from app.utils.alert_utils import check_and_create_alert
+    from app.utils.watchlist_utils import auto_watchlist_patient
+
+    user = db.session.get(User, user_id)
+    if not user:
+        return
+
+    # --- 自動關注邏輯 ---
+    try:
+        if auto_watchlist_patient(user, trigger_score):
+            db.session.commit()
+    except Exception as w_err:
+        db.session.rollback()  # 自動關注失敗不應影響警報
+        print(f"Auto-watchlist failed: {w_err}")
+
+    # --- 提醒通知邏輯 ---
+    alerts = check_and_create_alert(user_id, job_date)
+    for alert in alerts or []:
+        print(f"Alert created for user {user_id}")
+
+
+@job_handler(JOB_HISTORY_CHANGED)
+def handle_history_changed(user_id, job_date, trigger_score):
+    """Recompute the alerts whose MA windows include a deleted/restored assessment's day"""
+    from app.utils.alert_rebuild import recompute_affected_alerts
+
+    recompute_affected_alerts(user_id, job_date)
+
+
+def _merge_trigger_score(job, trigger_score):
+    if trigger_score is not None and (job.trigger_score is None or trigger_score > job.trigger_score):
+        job.trigger_score = trigger_score
+
+
+def enqueue_job(user_id, job_date, kind=JOB_ASSESSMENT_SAVED, trigger_score=None):
+    """
+    Record a job in the caller's transaction (caller commits), merging it into
+    an existing pending job for the same user/day/kind.
+    """
+    pending = AlertJob.query.filter_by(
+        user_id=user_id, job_date=job_date, kind=kind, status='pending'
+    ).first()
+
+    if pending:
+        _merge_trigger_score(pending, trigger_score)
+        return pending
+
+    job = AlertJob(user_id=user_id, job_date=job_date, kind=kind, trigger_score=trigger_score)
+    db.session.add(job)
+    return job
+
+
+def defer(user_id, job_date, kind=JOB_ASSESSMENT_SAVED, trigger_score=None):
+    """
+    In async mode add the job to the caller's transaction and return True;
+    the caller commits and then calls notify_workers(). In sync mode do
+    nothing and return False, so the caller runs run_inline() after commit.
+    """
+    if not is_async():
+        return False
+    enqueue_job(user_id, job_date, kind, trigger_score)
+    return True
+
+
+def defer_many(user_id, jobs, kind=JOB_ASSESSMENT_SAVED):
+    """
+    defer() for several days of one user: jobs is [(job_date, trigger_score)].
+    Pending jobs for those days are looked up in one query.
+    """
+    if not is_async():
+        return False
+
+    pending = {
+        job.job_date: job for job in AlertJob.query.filter(
+            AlertJob.user_id == user_id,
+            AlertJob.kind == kind,
+            AlertJob.status == 'pending',
+            AlertJob.job_date.in_([job_date for job_date, _ in jobs])
+        ).all()
+    }
+    for job_date, trigger_score in jobs:
+        if job_date in pending:
+            _merge_trigger_score(pending[job_date], trigger_score)
+        else:
+            db.session.add(AlertJob(user_id=user_id, job_date=job_date, kind=kind, trigger_score=trigger_score))
+    return True
+
+
+def run_inline(user_id, job_date, kind=JOB_ASSESSMENT_SAVED, trigger_score=None):
+    """Run a job's handler in the current request (sync mode). Never raises."""
+    try:
+        _handlers[kind](user_id, job_date, trigger_score)
+    except Exception as e:
+        db.session.rollback()  # 失敗也要重設連線
+        print(f"{kind} handler failed: {e}")
+
+
+def _claim_next_job():
+    """Atomically move the oldest pending job to running; returns it or None"""
+    candidate_ids = [
+        job_id for (job_id,) in db.session.query(AlertJob.id).filter(
+            AlertJob.status == 'pending'
+        ).order_by(AlertJob.id).limit(5).all()
+    ]
+
+    for job_id in candidate_ids:
+        claimed = db.session.execute(
+            db.update(AlertJob)
+            .where(AlertJob.id == job_id, AlertJob.status == 'pending')
+            .values(status='running', attempts=AlertJob.attempts + 1, updated_at=datetime.now())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(AlertJob, job_id, populate_existing=True)
+
+    return None
+
+
+def _finish_job(job_id, error=None):
+    max_attempts = current_app.config.get('ALERT_TASK_MAX_ATTEMPTS', 3)
+    job = db.session.get(AlertJob, job_id, populate_existing=True)
+    if not job:
+        return
+
+    if error is None:
+        job.status = 'done'
+        job.last_error = None
+    else:
+        job.status = 'pending' if job.attempts < max_attempts else 'failed'
+        job.last_error = error
+    db.session.commit()
+
+
+def run_job(job):
+    """Run one claimed job and record the outcome"""
+    job_id, kind = job.id, job.kind
+    args = (job.user_id, job.job_date, job.trigger_score)
+    try:
+        _handlers[kind](*args)
+        db.session.commit()
+        _finish_job(job_id)
+    except Exception:
+        db.session.rollback()
+        _finish_job(job_id, traceback.format_exc(limit=5))
+
+
+def run_pending_jobs(limit=None):
+    """Drain pending jobs in the current thread; returns how many ran"""
+    processed = 0
+    while limit is None or processed < limit:
+        job = _claim_next_job()
+        if not job:
+            break
+        run_job(job)
+        processed += 1
+    return processed
+
+
+def requeue_stale_jobs():
+    """Return jobs stuck in 'running' (worker died mid-job) to the queue"""
+    stale_after = current_app.config.get('ALERT_TASK_STALE_SECONDS', 600)
+    cutoff = datetime.now() - timedelta(seconds=stale_after)
+    count = db.session.execute(
+        db.update(AlertJob)
+        .where(AlertJob.status == 'running', AlertJob.updated_at < cutoff)
+        .values(status='pending', updated_at=datetime.now())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+def purge_finished_jobs(retention_days=7, batch_size=1000, now=None):
+    """
+    Delete done / failed jobs last updated more than retention_days ago, in
+    bounded batches (pending and running jobs are never touched)
+
+    Returns:
+        int: rows deleted
+    """
+    cutoff = (now or datetime.now()) - timedelta(days=retention_days)
+    purged = 0
+    while True:
+        ids = [
+            job_id for (job_id,) in db.session.query(AlertJob.id).filter(
+                AlertJob.status.in_(FINISHED_STATUSES),
+                AlertJob.updated_at < cutoff
+            ).limit(batch_size).all()
+        ]
+        if not ids:
+            break
+        db.session.execute(
+            db.delete(AlertJob)
+            .where(AlertJob.id.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        purged += len(ids)
+        if len(ids) < batch_size:
+            break
+    return purged
+
+
+def _worker_loop(app):
+    poll_interval = app.config.get('ALERT_TASK_POLL_SECONDS', 5)
+    while True:
+        try:
+            with app.app_context():
+                requeue_stale_jobs()
+                run_pending_jobs()
+                db.session.remove()
+        except Exception as e:
+            print(f"Alert worker error: {e}")
+        _wakeup.wait(poll_interval)
+        _wakeup.clear()
+
+
+def notify_workers():
+    _wakeup.set()
+
+
+def start_workers(app):
+    """Start the in-process worker pool once per process (async mode only)"""
+    if _task_mode(app.config) != 'async':
+        return
+
+    with _workers_lock:
+        if _workers:
+            return
+        for i in range(app.config.get('ALERT_TASK_WORKERS', 2)):
+            worker = threading.Thread(target=_worker_loop, args=(app,), name=f'alert-worker-{i}', daemon=True)
+            worker.start()
+            _workers.append(worker)
@@ -0,0 +1,128 @@
+"""
+Daily average / moving average series for patient trend charts
+
+Uses the same moving-average rule as the alert engine, computed from
+user_daily_scores: an N-day average covers the N calendar days ending on that
+day, needs data on at least half of them, and averages the daily averages of
+the days that have data. Values are rounded to 2 decimals. The admin patient
+charts draw this series rather than computing their own averages.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+
+from app.utils.alert_utils import MA_WINDOWS, MA_PRECISION
+from app.utils.alert_rebuild import moving_average_matrix
+from app.utils.daily_scores import get_daily_scores
+
+SERIES_PRECISION = 2
+MIN_DOWNSAMPLE_POINTS = 3
+
+
+def _rounded(value):
+    if value is None or np.isnan(value):
+        return None
+    return round(round(float(value), MA_PRECISION), SERIES_PRECISION)
+
+
+def build_ma_series(user_id, start_date, end_date):
+    """
+    Daily averages and 7/14/30-day moving averages for each day with data
+
+    Args:
+        start_date, end_date: Days to return (inclusive); the 29 days before
+            start_date are read too so the first moving averages are complete
+
+    Returns:
+        list: [{'date', 'average', 'count', 'ma7', 'ma14', 'ma30'}] ordered by date
+    """
+    if start_date > end_date:
+        return []
+
+    origin_date = start_date - timedelta(days=max(MA_WINDOWS) - 1)
+    daily = get_daily_scores(user_id, origin_date, end_date)
+    if not daily:
+        return []
+
+    length = (end_date - origin_date).days + 1
+    score_sums = np.zeros(length, dtype=float)
+    score_counts = np.zeros(length, dtype=np.int64)
+    for day, (score_sum, score_count) in daily.items():
+        offset = (day - origin_date).days
+        score_sums[offset] = score_sum
+        score_counts[offset] = score_count
+
+    daily_avg, moving_averages = moving_average_matrix(score_sums, score_counts)
+
+    first = (start_date - origin_date).days
+    series = []
+    for offset in np.nonzero(score_counts[first:])[0] + first:
+        offset = int(offset)
+        point = {
+            'date': (origin_date + timedelta(days=offset)).isoformat(),
+            'average': _rounded(daily_avg[offset]),
+            'count': int(score_counts[offset]),
+        }
+        for days, ma in moving_averages.items():
+            point[f'ma{days}'] = _rounded(ma[offset])
+        series.append(point)
+
+    return series
+
+
+def lttb_indices(xs, ys, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling
+
+    Args:
+        xs, ys: Point coordinates (xs ascending)
+        threshold: Number of points to keep
+
+    Returns:
+        list: Indices of the kept points, always including the first and last
+    """
+    n = len(xs)
+    if threshold >= n or threshold < MIN_DOWNSAMPLE_POINTS:
+        return list(range(n))
+
+    kept = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        bucket_start = int(i * bucket_size) + 1
+        bucket_end = int((i + 1) * bucket_size) + 1
+
+        # Average of the next bucket is the third triangle vertex
+        next_start = bucket_end
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        avg_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+
+        best_index, best_area = bucket_start, -1.0
+        for j in range(bucket_start, bucket_end):
+            area = abs(
+                (xs[a] - avg_x) * (ys[j] - ys[a])
+                - (xs[a] - xs[j]) * (avg_y - ys[a])
+            )
+            if area > best_area:
+                best_index, best_area = j, area
+
+        kept.append(best_index)
+        a = best_index
+
+    kept.append(n - 1)
+    return kept
+
+
+def downsample_series(series, max_points):
+    """Keep at most max_points points of a build_ma_series() result (LTTB on the daily average)"""
+    if not max_points or len(series) <= max_points:
+        return series
+
+    # x is the calendar day so gaps between assessments keep their width
+    origin = date.fromisoformat(series[0]['date']).toordinal()
+    xs = [float(date.fromisoformat(point['date']).toordinal() - origin) for point in series]
+    ys = [point['average'] for point in series]
+
+    return [series[i] for i in lttb_indices(xs, ys, max_points)]
@@ -0,0 +1,73 @@
+"""
+Auto-watchlist helpers
+"""
+from app.models import db
+from app.admin_models import PatientAssignment, PatientWatchlist, HealthcareStaff
+from app.utils.dashboard_stats import invalidate_watchlist_count
+
+
+# Scores at or above these put a patient on the watchlist, per group
+WATCHLIST_THRESHOLDS = {'student': 23, 'clinical': 30}
+
+
+def meets_watchlist_threshold(user, total_score):
+    """Whether a score is high enough to auto-watch this patient"""
+    threshold = WATCHLIST_THRESHOLDS.get(user.group)
+    return threshold is not None and total_score is not None and total_score >= threshold
+
+
+def auto_watchlist_patient(user, total_score):
+    """
+    Add a patient to the watchlist of every assigned staff member (or the
+    super admin when unassigned) if the score meets the group threshold.
+    Idempotent: staff already watching the patient are skipped.
+
+    Returns:
+        int: Number of watchlist rows added (caller commits)
+    """
+    if not meets_watchlist_threshold(user, total_score):
+        return 0
+
+    target_staff_ids = [
+        staff_id for (staff_id,) in
+        db.session.query(PatientAssignment.staff_id).filter_by(patient_id=user.id).all()
+    ]
+
+    if not target_staff_ids:
+        super_admin = HealthcareStaff.query.filter_by(role='super_admin').first()
+        if super_admin:
+            target_staff_ids.append(super_admin.id)
+
+    if not target_staff_ids:
+        return 0
+
+    # Staff already watching, and each staff's current max display_order, in two queries
+    watching = {
+        staff_id for (staff_id,) in db.session.query(PatientWatchlist.staff_id).filter(
+            PatientWatchlist.patient_id == user.id,
+            PatientWatchlist.staff_id.in_(target_staff_ids)
+        ).all()
+    }
+    pending = [staff_id for staff_id in target_staff_ids if staff_id not in watching]
+    if not pending:
+        return 0
+
+    max_orders = dict(
+        db.session.query(
+            PatientWatchlist.staff_id,
+            db.func.max(PatientWatchlist.display_order)
+        ).filter(
+            PatientWatchlist.staff_id.in_(pending)
+        ).group_by(PatientWatchlist.staff_id).all()
+    )
+
+    for staff_id in pending:
+        db.session.add(PatientWatchlist(
+            staff_id=staff_id,
+            patient_id=user.id,
+            notes=f"自動關注：分數達標 ({total_score}分 - {user.group})",
+            display_order=(max_orders.get(staff_id) or 0) + 1
+        ))
+        invalidate_watchlist_count(staff_id)
+
+    return len(pending)
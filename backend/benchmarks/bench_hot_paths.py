@@ -0,0 +1,315 @@
+"""
+Benchmark the assessment submit / alert path and the admin list endpoints
+
+Seeds a synthetic cohort into a temporary SQLite database, then reports
+p50/p95/p99 latency and SQL query counts for:
+  - POST /api/history (save_history)
+  - POST /api/history/batch (20 offline assessments over 10 days)
+  - GET /api/history/daily (per-day chart summary of one patient)
+  - alert_utils.check_and_create_alert
+  - GET /api/admin/patients (super admin and an assigned nurse)
+  - GET /api/admin/watchlist
+  - GET /api/admin/patients/search (trigram / FTS match, and a 2-character query)
+  - GET /api/admin/dashboard/stats (cache cleared each call, and cached)
+
+Usage (from backend/):
+    python benchmarks/bench_hot_paths.py                      # 1k users
+    python benchmarks/bench_hot_paths.py --cohorts 1000,10000,100000 --days 90
+    python benchmarks/bench_hot_paths.py --json results.json  # keep numbers for comparison
+
+Paths listed in QUERY_BUDGETS must stay within a fixed number of SQL
+queries whatever the list size (try --watchlist 5 and --watchlist 500);
+the run exits with status 1 if one goes over. The regression test for the
+list endpoints is tests/test_query_counts.py (python -m pytest); this
+script is the optional large-cohort check.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Maximum SQL queries per request, independent of cohort / list size
+QUERY_BUDGETS = {
+    'get_patients (super_admin)': 4,
+    'get_patients (nurse)': 4,
+    'get_watchlist': 5,
+    'get_dashboard_stats (uncached)': 4,
+    'search_patients (super_admin)': 3,
+    'search_patients (nurse)': 3,
+    'get_history_daily': 2,
+}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+class QueryCounter:
+    """Counts SQL statements executed on an engine by the benchmarking thread
+    (background alert workers are not counted)"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        self.thread_id = threading.get_ident()
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        if threading.get_ident() == self.thread_id:
+            self.count += 1
+
+
+def seed_cohort(db, users, days, per_day, nurse_patients, watchlist_size, rng):
+    """Bulk insert users, assessments, a nurse with assignments and watchlist rows"""
+    from app.models import User, AssessmentHistory
+    from app.admin_models import HealthcareStaff, PatientAssignment, PatientWatchlist
+    from app.utils.daily_scores import backfill_daily_scores
+    from app.utils.latest_assessment import backfill_latest_assessments
+    from app.utils.streaks import recompute_all_streaks
+
+    today = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    db.session.execute(db.insert(User), [
+        {
+            'id': uid, 'email': f'bench{uid}@example.com', 'name': f'個案{uid}',
+            'password_hash': 'x', 'group': rng.choice(['student', 'clinical']),
+            'last_login_date': (today - timedelta(days=rng.randint(0, 10))).date()
+        }
+        for uid in range(1, users + 1)
+    ])
+
+    answers = [{'questionId': q, 'score': 2} for q in range(1, 15)]
+    batch = []
+    for uid in range(1, users + 1):
+        for d in range(days, 0, -1):
+            for k in range(rng.randint(0, per_day * 2)):
+                completed_at = today - timedelta(days=d) + timedelta(hours=k)
+                score = rng.randint(14, 50)
+                batch.append({
+                    'user_id': uid, 'total_score': score, 'max_score': 56,
+                    'level': '需要關注' if score >= 30 else '良好', 'answers': answers,
+                    'completed_at': completed_at, 'completed_date': completed_at.date(),
+                    'is_deleted': False
+                })
+        if len(batch) >= 50000:
+            db.session.execute(db.insert(AssessmentHistory), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(AssessmentHistory), batch)
+
+    db.session.add(HealthcareStaff(id=1, email='bench-admin@example.com', name='管理員', password_hash='x', role='super_admin'))
+    db.session.add(HealthcareStaff(id=2, email='bench-nurse@example.com', name='護理師', password_hash='x', role='nurse'))
+    patient_ids = rng.sample(range(1, users + 1), min(nurse_patients, users))
+    db.session.execute(db.insert(PatientAssignment), [
+        {'staff_id': 2, 'patient_id': pid, 'assigned_by': 1} for pid in patient_ids
+    ])
+    db.session.execute(db.insert(PatientWatchlist), [
+        {'staff_id': staff_id, 'patient_id': pid, 'display_order': order}
+        for staff_id in (1, 2)
+        for order, pid in enumerate(patient_ids[:watchlist_size])
+    ])
+    db.session.commit()
+    backfill_daily_scores()
+    backfill_latest_assessments()
+    recompute_all_streaks()
+
+
+def measure(name, func, iterations, counter):
+    """Run func repeatedly, collecting latency (ms) and query counts"""
+    latencies, queries = [], []
+    for i in range(iterations):
+        before = counter.count
+        started = time.perf_counter()
+        func(i)
+        latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(counter.count - before)
+    return {
+        'name': name,
+        'iterations': iterations,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'queries_min': min(queries),
+        'queries_max': max(queries)
+    }
+
+
+def run_cohort(users, args):
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['ALERT_TASK_MODE'] = args.task_mode
+
+    from app import create_app
+    from app.models import db
+    from app.utils import dashboard_stats
+    from app.utils.alert_utils import check_and_create_alert
+    from flask_jwt_extended import create_access_token
+
+    app = create_app()
+    rng = random.Random(args.seed)
+    try:
+        with app.app_context():
+            started = time.perf_counter()
+            seed_cohort(db, users, args.days, args.per_day, args.nurse_patients, args.watchlist, rng)
+            seed_seconds = time.perf_counter() - started
+
+            counter = QueryCounter(db.engine)
+            patient_tokens = [create_access_token(identity=str(uid)) for uid in rng.sample(range(1, users + 1), min(users, 200))]
+            admin_auth = {'Authorization': 'Bearer ' + create_access_token(identity='admin_1')}
+            nurse_auth = {'Authorization': 'Bearer ' + create_access_token(identity='admin_2')}
+
+        client = app.test_client()
+        n = args.iterations
+
+        def save_history(i):
+            client.post('/api/history', headers={'Authorization': 'Bearer ' + patient_tokens[i % len(patient_tokens)]},
+                        json={'total_score': rng.randint(14, 50), 'max_score': 56, 'answers': [{'questionId': 1, 'score': 2}]})
+
+        def save_history_batch(i):
+            now = datetime.now()
+            assessments = [
+                {'total_score': rng.randint(14, 50), 'max_score': 56, 'answers': [{'questionId': 1, 'score': 2}],
+                 'completed_at': (now - timedelta(days=k // 2, hours=k % 2)).isoformat()}
+                for k in range(20)
+            ]
+            response = client.post('/api/history/batch', json={'assessments': assessments},
+                                   headers={'Authorization': 'Bearer ' + patient_tokens[i % len(patient_tokens)]})
+            assert response.status_code == 201, ('batch', response.status_code)
+
+        def history_daily(i):
+            response = client.get('/api/history/daily',
+                                  headers={'Authorization': 'Bearer ' + patient_tokens[i % len(patient_tokens)]})
+            assert response.status_code == 200, ('daily', response.status_code)
+
+        def alert_engine(i):
+            with app.app_context():
+                check_and_create_alert(rng.randint(1, users), datetime.now().date() - timedelta(days=rng.randint(1, args.days)))
+
+        def get(url, headers):
+            def call(i):
+                response = client.get(url, headers=headers)
+                assert response.status_code == 200, (url, response.status_code)
+            return call
+
+        def search(headers, short=False):
+            def call(i):
+                # 個案123 style names: a 4+ character query uses the index, '個案' scans
+                q = '個案' if short else f'個案{rng.randint(1, users)}'
+                response = client.get('/api/admin/patients/search', query_string={'q': q}, headers=headers)
+                assert response.status_code == 200, ('search', response.status_code)
+            return call
+
+        def uncached(call):
+            def run(i):
+                dashboard_stats._dashboard_cache.invalidate()
+                call(i)
+            return run
+
+        results = [
+            measure('save_history', save_history, n, counter),
+            measure('save_history_batch (20)', save_history_batch, n, counter),
+            measure('get_history_daily', history_daily, n, counter),
+            measure('check_and_create_alert', alert_engine, n, counter),
+            measure('get_patients (super_admin)', get('/api/admin/patients', admin_auth), max(1, n // 5), counter),
+            measure('get_patients (nurse)', get('/api/admin/patients', nurse_auth), n, counter),
+            measure('get_watchlist', get('/api/admin/watchlist', nurse_auth), n, counter),
+            measure('search_patients (super_admin)', search(admin_auth), n, counter),
+            measure('search_patients (nurse)', search(nurse_auth), n, counter),
+            measure('search_patients (short q)', search(admin_auth, short=True), n, counter),
+            measure('get_dashboard_stats (uncached)', uncached(get('/api/admin/dashboard/stats', admin_auth)), n, counter),
+            measure('get_dashboard_stats', get('/api/admin/dashboard/stats', admin_auth), n, counter),
+        ]
+        return {'users': users, 'seed_seconds': round(seed_seconds, 1), 'results': results}
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_report(report):
+    print(f"\n=== {report['users']} users (seeded in {report['seed_seconds']}s) ===")
+    print(f"{'path':32} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>9}")
+    for r in report['results']:
+        queries = str(r['queries_min']) if r['queries_min'] == r['queries_max'] else f"{r['queries_min']}-{r['queries_max']}"
+        print(f"{r['name']:32} {r['iterations']:>5} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} {queries:>9}")
+
+
+def over_budget(report):
+    """[(path, queries, budget)] for paths that ran more queries than QUERY_BUDGETS allows"""
+    return [
+        (r['name'], r['queries_max'], QUERY_BUDGETS[r['name']])
+        for r in report['results']
+        if r['name'] in QUERY_BUDGETS and r['queries_max'] > QUERY_BUDGETS[r['name']]
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cohorts', default='1000', help='以逗號分隔的用戶數，例如 1000,10000,100000')
+    parser.add_argument('--days', type=int, default=90, help='每位用戶的歷史天數')
+    parser.add_argument('--per-day', type=int, default=1, help='平均每天評估次數')
+    parser.add_argument('--iterations', type=int, default=50, help='每個路徑的量測次數')
+    parser.add_argument('--nurse-patients', type=int, default=50, help='護理師負責的個案數')
+    parser.add_argument('--watchlist', type=int, default=20, help='特別關注列表大小')
+    parser.add_argument('--task-mode', default='async', choices=['async', 'sync'], help='ALERT_TASK_MODE')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', default=None, help='將結果寫入 JSON 檔')
+    parser.add_argument('--single-cohort-output', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Child process: one cohort per process, since the app config and the
+    # background workers are bound to a single database at import time
+    if args.single_cohort_output:
+        report = run_cohort(int(args.cohorts), args)
+        with open(args.single_cohort_output, 'w', encoding='utf-8') as f:
+            json.dump(report, f)
+        return
+
+    reports = []
+    violations = []
+    for users in [int(v) for v in args.cohorts.split(',') if v.strip()]:
+        fd, output = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            child_args = [a for a in sys.argv[1:]]
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), *child_args,
+                 '--cohorts', str(users), '--single-cohort-output', output],
+                check=True, stdout=subprocess.DEVNULL
+            )
+            with open(output, encoding='utf-8') as f:
+                report = json.load(f)
+        finally:
+            os.remove(output)
+        print_report(report)
+        reports.append(report)
+        violations += [(report['users'], *v) for v in over_budget(report)]
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print(f"\n結果已寫入 {args.json}")
+
+    if violations:
+        for users, name, queries, budget in violations:
+            print(f"查詢數超出預算: {name} ({users} users) {queries} > {budget}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
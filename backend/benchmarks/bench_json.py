@@ -0,0 +1,150 @@
+"""
+Compare the JSON response providers on real payload shapes
+
+Builds payloads with the models' own to_dict() (no database needed) and
+times provider.response() for StdlibJSONProvider and OrjsonProvider:
+  - GET /api/history        full histories with answers
+  - GET /api/diary          a year of diaries with Chinese text
+  - GET /api/admin/patients patient list with latest assessments
+  - GET /api/admin/watchlist watchlist items with patient 'list' projections
+
+Also prints the body size after gzip (and brotli when installed) at the
+levels create_app() uses by default.
+
+Usage (from backend/):
+    python benchmarks/bench_json.py
+    python benchmarks/bench_json.py --histories 2000 --patients 5000 --iterations 50
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from app.models import User, AssessmentHistory, Diary
+from app.admin_models import PatientWatchlist
+from app.utils.json_provider import StdlibJSONProvider, OrjsonProvider, orjson
+from app.utils.compression import available_encodings, compress_bytes
+
+MOODS = ['happy', 'calm', 'sad', 'anxious', 'angry']
+DIARY_TEXT = '今天心情還不錯，和朋友一起吃了午餐，晚上早點休息。'
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def _assessment(rng, assessment_id, completed_at):
+    return AssessmentHistory(
+        id=assessment_id, user_id=1, total_score=rng.randint(14, 50), max_score=56, level='良好',
+        answers=[{'questionId': q, 'emoji': '😄', 'score': rng.randint(0, 2)} for q in range(1, 29)],
+        completed_at=completed_at, is_deleted=False
+    )
+
+
+def _patient(rng, patient_id, now):
+    return User(
+        id=patient_id, email=f'bench{patient_id}@example.com', name=f'個案{patient_id}',
+        nickname=f'小{patient_id}', group=rng.choice(['student', 'clinical']),
+        created_at=now - timedelta(days=rng.randint(30, 400)), is_profile_completed=True,
+        current_streak=rng.randint(0, 20), last_streak_date=now.date()
+    )
+
+
+def build_payloads(args, rng):
+    now = datetime.now().replace(microsecond=123456)
+
+    histories = [_assessment(rng, i, now - timedelta(hours=8 * i)) for i in range(1, args.histories + 1)]
+    history = {'success': True, 'history': [h.to_dict() for h in histories]}
+
+    diaries = [
+        Diary(id=i, user_id=1, date=date.today() - timedelta(days=i), mood=rng.choice(MOODS),
+              content=DIARY_TEXT * rng.randint(1, 4), images=[f'/uploads/diary_images/1_{i}.jpg'],
+              period_marker=rng.random() < 0.1, created_at=now, updated_at=now)
+        for i in range(args.diaries)
+    ]
+    diary = {'success': True, 'diaries': [d.to_dict() for d in diaries]}
+
+    patients = []
+    for i in range(1, args.patients + 1):
+        data = _patient(rng, i, now).to_dict('summary')
+        data.update({
+            'inactive_warning': rng.random() < 0.2,
+            'latest_assessment': _assessment(rng, i, now).to_dict('summary'),
+            'is_in_watchlist': rng.random() < 0.1
+        })
+        patients.append(data)
+    patient_list = {'success': True, 'patients': patients, 'next_cursor': None, 'has_more': False}
+
+    watchlist = []
+    for i in range(1, args.watchlist + 1):
+        item = PatientWatchlist(id=i, staff_id=1, patient_id=i, notes='自動關注：分數達標', display_order=i,
+                                created_at=now, updated_at=now).to_dict()
+        item['patient'] = _patient(rng, i, now).to_dict('list')
+        item['latest_assessment'] = _assessment(rng, i, now).to_dict('summary')
+        item['average_score'] = round(rng.uniform(15, 40), 2)
+        watchlist.append(item)
+
+    return [
+        (f'history ({args.histories}, full)', history),
+        (f'diary ({args.diaries})', diary),
+        (f'patients ({args.patients})', patient_list),
+        (f'watchlist ({args.watchlist})', {'success': True, 'watchlist': watchlist}),
+    ]
+
+
+def measure(provider, payload, iterations):
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = provider.response(payload)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return percentile(latencies, 50), percentile(latencies, 95), response.get_data()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--histories', type=int, default=500, help='歷史記錄筆數（含 answers）')
+    parser.add_argument('--diaries', type=int, default=365, help='日記筆數')
+    parser.add_argument('--patients', type=int, default=1000, help='病人列表筆數')
+    parser.add_argument('--watchlist', type=int, default=50, help='特別關注列表筆數')
+    parser.add_argument('--iterations', type=int, default=30, help='每種 payload 的量測次數')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    encodings = available_encodings(app.config)
+    providers = [('stdlib', StdlibJSONProvider(app))]
+    if orjson is not None:
+        providers.append(('orjson', OrjsonProvider(app)))
+    else:
+        print('orjson 未安裝，只量測 stdlib')
+
+    payloads = build_payloads(args, random.Random(args.seed))
+
+    with app.app_context():
+        header = ''.join(f' {encoding + " KiB":>9}' for encoding in encodings)
+        print(f"{'payload':24} {'provider':9} {'p50 ms':>9} {'p95 ms':>9} {'KiB':>8} {'speedup':>8}{header}")
+        for name, payload in payloads:
+            baseline = None
+            for provider_name, provider in providers:
+                p50, p95, body = measure(provider, payload, args.iterations)
+                baseline = baseline or p50
+                compressed = ''.join(
+                    f' {len(compress_bytes(body, encoding, app.config)) / 1024:9.1f}' for encoding in encodings
+                )
+                print(f"{name:24} {provider_name:9} {p50:9.2f} {p95:9.2f} {len(body) / 1024:8.1f} "
+                      f"{baseline / p50:7.1f}x{compressed}")
+
+
+if __name__ == '__main__':
+    main()
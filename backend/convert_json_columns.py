@@ -0,0 +1,128 @@
+"""
+Convert answers / images / exceeded_lines to JSON column storage
+
+1. Normalize every row in id batches: JSON text is re-encoded as plain
+   JSON (double-encoded strings unwrapped, unreadable values replaced by
+   an empty list / object) so it decodes cleanly as a JSON column.
+2. PostgreSQL: copy each text column into a new JSONB column in id
+   batches, then swap the columns. SQLite stores JSON as text, so step 1
+   is all it needs.
+
+Works on both SQLite and PostgreSQL, safe to run more than once.
+"""
+import json
+
+from app.models import db
+from sqlalchemy import text, inspect
+
+BATCH_SIZE = 2000
+
+# (table, column, value for unreadable data, NOT NULL)
+JSON_COLUMNS = [
+    ('assessment_history', 'answers', [], True),
+    ('diaries', 'images', [], False),
+    ('score_alerts', 'exceeded_lines', {}, True),
+]
+
+
+def _normalize(raw, default):
+    """Decoded JSON text for one stored value, or None if it is already fine"""
+    if raw is None:
+        return None
+    try:
+        value = json.loads(raw)
+        # Values written as json.dumps(json.dumps(...)) decode to a string
+        while isinstance(value, str):
+            value = json.loads(value)
+    except ValueError:
+        value = default
+    normalized = json.dumps(value, ensure_ascii=False)
+    return None if normalized == raw else normalized
+
+
+def _column_type(table, column):
+    for col in inspect(db.engine).get_columns(table):
+        if col['name'] == column:
+            return str(col['type']).upper()
+    return None
+
+
+def _id_batches(conn, table):
+    """Yield (low, high] id ranges covering the table"""
+    max_id = conn.execute(text(f'SELECT MAX(id) FROM {table}')).scalar() or 0
+    for low in range(0, max_id, BATCH_SIZE):
+        yield low, low + BATCH_SIZE
+
+
+def normalize_text_column(conn, table, column, default):
+    """Rewrite unreadable / double-encoded JSON text, one id batch per transaction"""
+    fixed = 0
+    for low, high in _id_batches(conn, table):
+        rows = conn.execute(text(
+            f'SELECT id, {column} FROM {table} WHERE id > :low AND id <= :high'
+        ), {'low': low, 'high': high}).fetchall()
+        updates = []
+        for row_id, raw in rows:
+            normalized = _normalize(raw, default)
+            if normalized is not None:
+                updates.append({'id': row_id, 'value': normalized})
+        if updates:
+            conn.execute(text(f'UPDATE {table} SET {column} = :value WHERE id = :id'), updates)
+            fixed += len(updates)
+        conn.commit()
+    return fixed
+
+
+def convert_postgres_column(conn, table, column, not_null):
+    """Copy a text column into a JSONB column in id batches, then swap them"""
+    new_column = f'{column}_jsonb'
+    conn.execute(text(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {new_column} JSONB'))
+    conn.commit()
+
+    for low, high in _id_batches(conn, table):
+        conn.execute(text(f'''
+            UPDATE {table} SET {new_column} = CAST({column} AS JSONB)
+            WHERE id > :low AND id <= :high AND {new_column} IS NULL AND {column} IS NOT NULL
+        '''), {'low': low, 'high': high})
+        conn.commit()
+
+    # Rows written by the old code while the copy ran
+    conn.execute(text(f'''
+        UPDATE {table} SET {new_column} = CAST({column} AS JSONB)
+        WHERE {new_column} IS NULL AND {column} IS NOT NULL
+    '''))
+    conn.execute(text(f'ALTER TABLE {table} DROP COLUMN {column}'))
+    conn.execute(text(f'ALTER TABLE {table} RENAME COLUMN {new_column} TO {column}'))
+    if not_null:
+        conn.execute(text(f'ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL'))
+    conn.commit()
+
+
+def convert_json_columns():
+    """Normalize JSON text and, on PostgreSQL, switch the columns to JSONB"""
+    dialect = db.engine.dialect.name
+
+    with db.engine.connect() as conn:
+        for table, column, default, not_null in JSON_COLUMNS:
+            column_type = _column_type(table, column)
+            if column_type is None:
+                print(f"- {table}.{column} not found, skipped")
+                continue
+
+            if dialect == 'postgresql' and column_type == 'JSONB':
+                print(f"✓ {table}.{column} already JSONB")
+                continue
+
+            fixed = normalize_text_column(conn, table, column, default)
+            print(f"✓ {table}.{column}: normalized {fixed} rows")
+
+            if dialect == 'postgresql':
+                convert_postgres_column(conn, table, column, not_null)
+                print(f"✓ {table}.{column} converted to JSONB")
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        convert_json_columns()
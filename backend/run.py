@@ -1,8 +1,11 @@
-from app import create_app
+from app import create_app, start_background_threads
 import os
 
 app = create_app(os.getenv('FLASK_ENV', 'development'))
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
+    # debug 模式下實際處理請求的是 reloader 的子程序（WERKZEUG_RUN_MAIN=true），監看程序不啟動執行緒
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_threads(app)
     app.run(host='0.0.0.0', port=port, debug=True)
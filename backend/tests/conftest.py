@@ -0,0 +1,35 @@
+"""
+Shared fixtures: apps on in-memory SQLite with no background threads
+
+Config reads the environment when app.config is imported, so these are set
+before anything from the app is loaded.
+"""
+import os
+
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+os.environ['ALERT_TASK_MODE'] = 'sync'
+os.environ['MAINTENANCE_INTERVAL_SECONDS'] = '0'
+
+import pytest
+
+from app import create_app
+from app.models import db
+
+
+@pytest.fixture
+def app_factory():
+    """Call to get a new app with its own empty in-memory database"""
+    apps = []
+
+    def make_app():
+        app = create_app()
+        app.config['TESTING'] = True
+        apps.append(app)
+        return app
+
+    yield make_app
+
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
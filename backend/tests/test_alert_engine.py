@@ -0,0 +1,127 @@
+"""
+The alert engine (daily aggregates, MA_PRECISION / ALERT_EPSILON comparisons)
+must raise exactly the alerts the original per-assessment implementation did,
+and rebuild_alerts must agree with alerts raised one assessment at a time
+"""
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from app.models import db, User, AssessmentHistory, ScoreAlert
+from app.utils.alert_rebuild import rebuild_alerts
+from app.utils.alert_utils import check_and_create_alert
+from app.utils.daily_scores import add_history_score
+
+PATIENT_ID = 1
+START = date(2024, 3, 1)
+
+# Scores per day from START; () is a day without assessments, days with fewer
+# than 3 are never evaluated, and days 10-16 are flat so the daily average
+# equals the 7-day line exactly
+DAILY_SCORES = [
+    (19, 18, 21, 19), (24, 22, 23, 25), (21, 18, 21), (), (23, 18, 24), (22, 23, 24), (24, 27),
+    (26, 28, 29), (24, 21, 21, 18), (21, 25, 22), (20, 20, 20), (20, 20, 20), (20, 20, 20), (20, 20, 20),
+    (20, 20, 20), (20, 20, 20), (20, 20, 20), (28, 25, 23), (16, 20, 13), (23, 19, 25), (13, 21, 19),
+    (17, 17, 19, 16), (17, 24, 18), (25, 25, 24, 25), (21, 22, 29, 23), (18, 21, 17), (20, 20), (19, 17, 16),
+    (17, 20, 21, 20), (14, 16, 18), (17, 19), (13, 16, 21), (25, 26, 25), (25, 20, 28), (24, 25, 23),
+    (19, 19, 17), (20, 15, 18), (19, 16, 14), (19, 15, 21), (22, 16, 20), (17, 18, 16), (26, 28, 30, 24),
+    (22, 24, 27), (22, 23, 28), (27, 28, 30),
+]
+
+# (day offset, alert_type, daily_average, exceeded_lines, is_read) produced by
+# the original alert_utils.check_and_create_alert for DAILY_SCORES
+EXPECTED_ALERTS = [
+    (4, 'high', 21.7, {'7日': 21.1}, True),
+    (5, 'high', 23.0, {'7日': 21.5}, True),
+    (7, 'high', 27.7, {'7日': 23.6, '14日': 22.9}, True),
+    (8, 'low', 21.0, {'7日': 23.1, '14日': 22.7}, True),
+    (9, 'low', 22.7, {'7日': 23.6, '14日': 22.7}, True),
+    (10, 'low', 20.0, {'14日': 22.4}, True),
+    (11, 'low', 20.0, {'7日': 22.8, '14日': 22.2}, True),
+    (12, 'low', 20.0, {'7日': 22.4, '14日': 22.0}, True),
+    (13, 'low', 20.0, {'7日': 21.6, '14日': 21.9}, True),
+    (14, 'low', 20.0, {'7日': 20.5, '14日': 21.9}, True),
+    (15, 'low', 20.0, {'7日': 20.4, '14日': 21.7, '30日': 21.6}, True),
+    (16, 'low', 20.0, {'14日': 21.7, '30日': 21.5}, True),
+    (17, 'high', 25.3, {'7日': 20.8, '14日': 21.9, '30日': 21.7}, True),
+    (19, 'high', 22.3, {'7日': 20.6, '14日': 21.5, '30日': 21.5}, True),
+    (20, 'low', 17.7, {'7日': 20.2}, True),
+    (21, 'low', 17.2, {'7日': 19.8, '14日': 20.2}, True),
+    (22, 'low', 19.7, {'7日': 19.8, '14日': 20.1, '30日': 21.0}, True),
+    (23, 'high', 24.8, {'7日': 20.5, '14日': 20.2, '30日': 21.2}, True),
+    (24, 'high', 23.8, {'7日': 20.2, '14日': 20.5, '30日': 21.3}, True),
+    (25, 'low', 18.7, {'7日': 20.6, '14日': 20.4, '30日': 21.2}, True),
+    (27, 'low', 17.3, {'7日': 20.2, '14日': 20.2}, True),
+    (28, 'low', 19.5, {'7日': 20.5, '14日': 20.2, '30日': 21.0}, True),
+    (31, 'low', 16.7, {'7日': 18.0, '14日': 19.1}, True),
+    (32, 'high', 25.3, {'7日': 19.0, '14日': 19.8, '30日': 20.7}, True),
+    (33, 'high', 24.3, {'7日': 19.6, '14日': 19.9, '30日': 20.8}, True),
+    (34, 'high', 24.0, {'7日': 20.5, '14日': 20.4, '30日': 20.9}, True),
+    (35, 'low', 18.3, {'7日': 20.4, '14日': 20.5, '30日': 20.7}, True),
+    (36, 'low', 17.7, {'7日': 20.6, '14日': 20.3, '30日': 20.5}, True),
+    (38, 'low', 18.3, {'7日': 20.6, '14日': 19.3, '30日': 20.0}, True),
+    (39, 'low', 19.3, {'7日': 19.8, '14日': 19.4, '30日': 19.9}, True),
+    (40, 'low', 17.0, {'7日': 18.7, '14日': 19.2, '30日': 19.8}, True),
+    (41, 'high', 27.0, {'7日': 19.1, '14日': 19.8, '30日': 20.0}, True),
+    (42, 'high', 24.3, {'7日': 20.0, '14日': 20.2, '30日': 20.2}, True),
+    (43, 'high', 24.3, {'7日': 21.0, '14日': 20.8, '30日': 20.3}, True),
+    (44, 'high', 28.3, {'7日': 22.7, '14日': 21.5, '30日': 20.6}, False),
+]
+
+LAST_DAY = START + timedelta(days=len(DAILY_SCORES) - 1)
+
+
+def save_scores_one_by_one():
+    """Store DAILY_SCORES in order, checking alerts after every assessment like save_history does"""
+    db.session.add(User(id=PATIENT_ID, email='patient@example.com', name='個案', password_hash='x', group='clinical'))
+    db.session.commit()
+
+    for offset, scores in enumerate(DAILY_SCORES):
+        day = START + timedelta(days=offset)
+        for i, score in enumerate(scores):
+            history = AssessmentHistory(
+                user_id=PATIENT_ID, total_score=score, max_score=56, level='良好', answers=[],
+                completed_at=datetime.combine(day, time(8 + i)), is_deleted=False
+            )
+            db.session.add(history)
+            add_history_score(history)
+            db.session.commit()
+            check_and_create_alert(PATIENT_ID, day)
+
+
+def stored_alerts(with_read_state=True):
+    alerts = ScoreAlert.query.filter_by(user_id=PATIENT_ID).order_by(ScoreAlert.alert_date, ScoreAlert.alert_type).all()
+    return [
+        ((a.alert_date - START).days, a.alert_type, a.daily_average, a.exceeded_lines)
+        + ((a.is_read,) if with_read_state else ())
+        for a in alerts
+    ]
+
+
+@pytest.fixture
+def app(app_factory):
+    app = app_factory()
+    with app.app_context():
+        save_scores_one_by_one()
+        yield app
+
+
+def test_alerts_match_original_engine(app):
+    assert stored_alerts() == EXPECTED_ALERTS
+
+
+def test_rebuild_keeps_incremental_alerts(app):
+    stats = rebuild_alerts(START, LAST_DAY, [PATIENT_ID])
+
+    assert (stats['inserted'], stats['updated'], stats['deleted']) == (0, 0, 0)
+    assert stored_alerts() == EXPECTED_ALERTS
+
+
+def test_rebuild_from_scratch_recreates_alerts(app):
+    ScoreAlert.query.delete()
+    db.session.commit()
+
+    stats = rebuild_alerts(START, LAST_DAY, [PATIENT_ID])
+
+    assert stats['inserted'] == len(EXPECTED_ALERTS)
+    assert stored_alerts(with_read_state=False) == [alert[:4] for alert in EXPECTED_ALERTS]
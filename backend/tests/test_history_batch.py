@@ -0,0 +1,105 @@
+"""
+POST /api/history/batch: backdated assessments are stored in one request and
+leave the derived tables (daily scores, latest assessment, alerts) exactly as
+recomputing them from scratch would
+"""
+from datetime import date, datetime, timedelta
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app.models import db, User, AssessmentHistory, UserDailyScore
+from app.utils.alert_rebuild import rebuild_alerts
+from app.utils.daily_scores import backfill_daily_scores
+from app.utils.latest_assessment import backfill_latest_assessments
+
+PATIENT_ID = 1
+DAYS_AGO = [20, 19, 18, 18, 17, 15, 14, 14, 14, 13, 12, 11, 10, 9, 8, 7, 6, 6, 6, 5, 4, 3, 2, 2, 2, 1, 1, 1]
+
+
+@pytest.fixture
+def client(app_factory):
+    app = app_factory()
+    with app.app_context():
+        db.session.add(User(id=PATIENT_ID, email='patient@example.com', name='個案', password_hash='x', group='clinical'))
+        db.session.commit()
+        token = create_access_token(identity=str(PATIENT_ID))
+
+    client = app.test_client()
+    client.auth = {'Authorization': 'Bearer ' + token}
+    with app.app_context():
+        yield client
+
+
+def assessments():
+    now = datetime.now().replace(microsecond=0)
+    return [
+        {
+            'total_score': 10 + (i * 7) % 30,
+            'max_score': 56,
+            'answers': [],
+            'completed_at': (now - timedelta(days=days, hours=i % 3)).isoformat(),
+        }
+        for i, days in enumerate(DAYS_AGO)
+    ]
+
+
+def daily_rows():
+    return sorted((row.day, row.score_sum, row.score_count) for row in UserDailyScore.query.filter_by(user_id=PATIENT_ID))
+
+
+def test_batch_stores_every_assessment(client):
+    items = assessments()
+
+    response = client.post('/api/history/batch', headers=client.auth, json={'assessments': items})
+
+    body = response.get_json()
+    assert response.status_code == 201, body
+    assert body['count'] == len(items)
+    rows = {row.id: row for row in AssessmentHistory.query.filter_by(user_id=PATIENT_ID)}
+    for result, item in zip(body['results'], items):
+        row = rows[result['history_id']]
+        assert row.total_score == item['total_score']
+        assert row.completed_at == datetime.fromisoformat(item['completed_at'])
+        assert row.completed_date == row.completed_at.date()
+
+
+def test_batch_keeps_derived_tables_consistent(client):
+    client.post('/api/history/batch', headers=client.auth, json={'assessments': assessments()})
+    user = db.session.get(User, PATIENT_ID)
+    incremental = (daily_rows(), user.latest_assessment_id, user.latest_score, user.latest_completed_at)
+
+    backfill_daily_scores()
+    backfill_latest_assessments()
+    db.session.expire_all()
+    user = db.session.get(User, PATIENT_ID)
+
+    assert (daily_rows(), user.latest_assessment_id, user.latest_score, user.latest_completed_at) == incremental
+    stats = rebuild_alerts(date.today() - timedelta(days=max(DAYS_AGO)), date.today(), [PATIENT_ID])
+    assert (stats['inserted'], stats['updated'], stats['deleted']) == (0, 0, 0)
+
+
+@pytest.mark.parametrize('body, message', [
+    ({}, 'assessments'),
+    ({'assessments': [{'total_score': 1}]}, '缺少'),
+    ({'assessments': [{'total_score': 1, 'max_score': 5, 'answers': [], 'completed_at': 'yesterday'}]}, 'ISO'),
+    ({'assessments': [{'total_score': '1', 'max_score': 5, 'answers': []}]}, '整數'),
+    ({'assessments': [{'total_score': 1, 'max_score': 5, 'answers': []}] * 101}, '最多'),
+])
+def test_invalid_batch_is_rejected_whole(client, body, message):
+    response = client.post('/api/history/batch', headers=client.auth, json=body)
+
+    assert response.status_code == 400
+    assert message in response.get_json()['message']
+    assert AssessmentHistory.query.count() == 0
+
+
+def test_future_assessment_is_rejected(client):
+    items = assessments()
+    items.append({'total_score': 1, 'max_score': 5, 'answers': [],
+                  'completed_at': (datetime.now() + timedelta(days=1)).isoformat()})
+
+    response = client.post('/api/history/batch', headers=client.auth, json={'assessments': items})
+
+    assert response.status_code == 400
+    assert AssessmentHistory.query.count() == 0
@@ -0,0 +1,91 @@
+"""
+Conditional GETs (data_version ETags answered with 304) and response
+compression on the patient history endpoint
+"""
+import gzip
+import json
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app.models import db, User
+
+PATIENT_ID = 1
+ASSESSMENT = {'total_score': 20, 'max_score': 56, 'answers': [{'questionId': i, 'score': 2} for i in range(1, 29)]}
+
+
+@pytest.fixture
+def client(app_factory):
+    app = app_factory()
+    with app.app_context():
+        db.session.add(User(id=PATIENT_ID, email='patient@example.com', name='個案', password_hash='x', group='clinical'))
+        db.session.commit()
+        token = create_access_token(identity=str(PATIENT_ID))
+
+    client = app.test_client()
+    client.auth = {'Authorization': 'Bearer ' + token}
+    for _ in range(5):
+        assert client.post('/api/history', headers=client.auth, json=ASSESSMENT).status_code == 201
+    return client
+
+
+def get_history(client, **headers):
+    return client.get('/api/history', headers={**client.auth, **headers})
+
+
+def test_unchanged_data_is_not_modified(client):
+    first = get_history(client)
+    etag = first.headers['ETag']
+
+    repeat = get_history(client, **{'If-None-Match': etag})
+
+    assert first.status_code == 200
+    assert repeat.status_code == 304
+    assert repeat.data == b''
+    assert repeat.headers['ETag'] == etag
+
+
+def test_write_changes_etag(client):
+    etag = get_history(client).headers['ETag']
+    client.post('/api/history', headers=client.auth, json=ASSESSMENT)
+
+    response = get_history(client, **{'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert len(response.get_json()['history']) == 6
+
+
+def test_etag_depends_on_query(client):
+    etag = get_history(client).headers['ETag']
+
+    response = client.get('/api/history', headers={**client.auth, 'If-None-Match': etag}, query_string={'limit': 2})
+
+    assert response.status_code == 200
+
+
+def test_gzip_response_matches_plain_body(client):
+    plain = get_history(client)
+    compressed = get_history(client, **{'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert json.loads(gzip.decompress(compressed.data)) == plain.get_json()
+
+
+def test_compressed_etag_still_validates(client):
+    etag = get_history(client, **{'Accept-Encoding': 'gzip'}).headers['ETag']
+
+    response = get_history(client, **{'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get('/api/history', headers={**client.auth, 'Accept-Encoding': 'gzip'},
+                          query_string={'limit': 1, 'fields': 'summary'})
+
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
@@ -0,0 +1,144 @@
+"""
+Idempotency-Key handling on patient writes: replay, body mismatch, in-flight
+claims, stale claim takeover and release after a server error
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+import app.routes.history as history_routes
+from app.models import db, User, AssessmentHistory, IdempotencyKey
+
+PATIENT_ID = 1
+BODY = json.dumps({'total_score': 33, 'max_score': 56, 'answers': []})
+
+
+@pytest.fixture
+def client(app_factory):
+    app = app_factory()
+    with app.app_context():
+        db.session.add(User(id=PATIENT_ID, email='patient@example.com', name='個案', password_hash='x', group='clinical'))
+        db.session.commit()
+        token = create_access_token(identity=str(PATIENT_ID))
+
+    client = app.test_client()
+    client.auth = {'Authorization': 'Bearer ' + token}
+    with app.app_context():
+        yield client
+
+
+def post(client, key, body=BODY, url='/api/history'):
+    headers = {**client.auth, 'Content-Type': 'application/json'}
+    if key is not None:
+        headers['Idempotency-Key'] = key
+    return client.post(url, headers=headers, data=body)
+
+
+def history_count():
+    return AssessmentHistory.query.filter_by(user_id=PATIENT_ID).count()
+
+
+def add_claim(key, created_at):
+    """An unfinished claim on key for BODY, as left by a request still running (or one that died)"""
+    db.session.add(IdempotencyKey(
+        user_id=PATIENT_ID, endpoint='history.save', key=key,
+        request_hash=hashlib.sha256(BODY.encode()).hexdigest(),
+        created_at=created_at, expires_at=created_at + timedelta(days=1)
+    ))
+    db.session.commit()
+
+
+def test_retry_replays_stored_response(client):
+    first = post(client, 'k1')
+    retry = post(client, 'k1')
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.data == first.data
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+    assert history_count() == 1
+
+
+def test_requests_without_key_are_not_deduplicated(client):
+    post(client, None)
+    post(client, None)
+
+    assert history_count() == 2
+
+
+def test_key_is_scoped_to_endpoint(client):
+    batch = json.dumps({'assessments': [json.loads(BODY)]})
+
+    assert post(client, 'k1').status_code == 201
+    response = post(client, 'k1', body=batch, url='/api/history/batch')
+
+    assert response.status_code == 201
+    assert 'Idempotent-Replayed' not in response.headers
+    assert history_count() == 2
+
+
+def test_same_key_with_different_body_is_rejected(client):
+    post(client, 'k1')
+    response = post(client, 'k1', body=json.dumps({'total_score': 1, 'max_score': 56, 'answers': []}))
+
+    assert response.status_code == 422
+    assert history_count() == 1
+
+
+def test_client_errors_are_replayed(client):
+    first = post(client, 'bad', body=json.dumps({'total_score': 1}))
+    retry = post(client, 'bad', body=json.dumps({'total_score': 1}))
+
+    assert first.status_code == retry.status_code == 400
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+
+
+def test_in_flight_claim_returns_conflict(client):
+    add_claim('pending', datetime.now())
+
+    response = post(client, 'pending')
+
+    assert response.status_code == 409
+    assert history_count() == 0
+
+
+def test_stale_claim_is_taken_over(client):
+    add_claim('pending', datetime.now() - timedelta(seconds=client.application.config['IDEMPOTENCY_PENDING_SECONDS'] + 1))
+
+    response = post(client, 'pending')
+
+    assert response.status_code == 201
+    assert post(client, 'pending').headers['Idempotent-Replayed'] == 'true'
+    assert history_count() == 1
+
+
+def test_server_error_releases_key(client, monkeypatch):
+    def fail(user_id):
+        raise RuntimeError('database unavailable')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(history_routes, 'refresh_latest_assessment', fail)
+        failed = post(client, 'k1')
+
+    assert failed.status_code == 500
+    assert IdempotencyKey.query.filter_by(key='k1').count() == 0
+
+    retry = post(client, 'k1')
+    assert retry.status_code == 201
+    assert 'Idempotent-Replayed' not in retry.headers
+    assert history_count() == 1
+
+
+def test_expired_key_runs_again(client):
+    post(client, 'k1')
+    IdempotencyKey.query.update({'expires_at': datetime.now() - timedelta(seconds=1)})
+    db.session.commit()
+
+    response = post(client, 'k1')
+
+    assert response.status_code == 201
+    assert 'Idempotent-Replayed' not in response.headers
+    assert history_count() == 2
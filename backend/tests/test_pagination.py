@@ -0,0 +1,192 @@
+"""
+Keyset pagination: patient history (before / after cursors) and the admin
+patient list (every sort key, ties broken by id) must return each row exactly
+once and in order, and reject cursors they did not issue
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app.admin_models import HealthcareStaff
+from app.models import db, User, AssessmentHistory
+from app.utils.latest_assessment import backfill_latest_assessments
+
+PATIENT_ID = 1
+NOW = datetime(2024, 6, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def app(app_factory):
+    app = app_factory()
+    with app.app_context():
+        yield app
+
+
+def bearer(identity):
+    return {'Authorization': 'Bearer ' + create_access_token(identity=identity)}
+
+
+def collect(client, url, headers, limit, direction='before', cursor=None, **params):
+    """Follow next_cursor from cursor until the last page; returns (ids, pages)"""
+    ids, pages = [], 0
+    while True:
+        query = dict(params, limit=limit)
+        if cursor:
+            query[direction] = cursor
+        body = client.get(url, headers=headers, query_string=query).get_json()
+        assert body['success'], body
+        rows = body['history'] if 'history' in body else body['patients']
+        ids += [row['id'] for row in rows]
+        pages += 1
+        cursor = body['next_cursor']
+        assert body['has_more'] == (cursor is not None)
+        if not cursor:
+            return ids, pages
+
+
+class TestHistoryPages:
+    @pytest.fixture
+    def client(self, app):
+        db.session.add(User(id=PATIENT_ID, email='patient@example.com', name='個案', password_hash='x', group='clinical'))
+        # Timestamps repeat in pairs so pages have to break ties by id
+        for i in range(25):
+            db.session.add(AssessmentHistory(
+                user_id=PATIENT_ID, total_score=i, max_score=56, level='良好', answers=[],
+                completed_at=NOW - timedelta(hours=12 * (i // 2)), is_deleted=False
+            ))
+        db.session.add(AssessmentHistory(
+            user_id=PATIENT_ID, total_score=50, max_score=56, level='良好', answers=[],
+            completed_at=NOW, is_deleted=True, deleted_at=NOW
+        ))
+        db.session.commit()
+        self.headers = bearer(str(PATIENT_ID))
+        return app.test_client()
+
+    def newest_first(self):
+        rows = AssessmentHistory.query.filter_by(user_id=PATIENT_ID, is_deleted=False).order_by(
+            AssessmentHistory.completed_at.desc(), AssessmentHistory.id.desc()
+        )
+        return [row.id for row in rows]
+
+    def test_unpaged_returns_everything(self, client):
+        body = client.get('/api/history', headers=self.headers).get_json()
+
+        assert [row['id'] for row in body['history']] == self.newest_first()
+        assert body['next_cursor'] is None and body['has_more'] is False
+
+    @pytest.mark.parametrize('limit', [1, 2, 7, 25, 100])
+    def test_before_pages_cover_every_row_once(self, client, limit):
+        ids, pages = collect(client, '/api/history', self.headers, limit)
+
+        assert ids == self.newest_first()
+        assert pages == max(1, -(-25 // limit))
+
+    def test_after_pages_walk_back_to_newest(self, client):
+        expected = self.newest_first()
+        first_page = client.get('/api/history', headers=self.headers, query_string={'limit': 10}).get_json()
+        second_page = client.get('/api/history', headers=self.headers,
+                                 query_string={'limit': 10, 'before': first_page['next_cursor']}).get_json()
+
+        # Everything newer than the first row of the second page, newest page last
+        cursor = second_page['newest_cursor']
+        newer = []
+        while cursor:
+            body = client.get('/api/history', headers=self.headers, query_string={'limit': 3, 'after': cursor}).get_json()
+            newer = [row['id'] for row in body['history']] + newer
+            cursor = body['next_cursor']
+
+        assert newer == expected[:10]
+
+    def test_admin_history_uses_same_pages(self, client):
+        db.session.add(HealthcareStaff(id=1, email='admin@example.com', name='管理員', password_hash='x', role='super_admin'))
+        db.session.commit()
+
+        ids, _ = collect(client, f'/api/admin/patients/{PATIENT_ID}/history', bearer('admin_1'), 4)
+
+        assert ids == self.newest_first()
+
+    @pytest.mark.parametrize('query', [
+        {'limit': 0},
+        {'limit': 'ten'},
+        {'before': 'not-a-cursor'},
+        {'after': 'bm90LWpzb24='},
+        {'before': 'WyIyMDI0LTA2LTAxVDEyOjAwOjAwIiwgMV0=', 'after': 'WyIyMDI0LTA2LTAxVDEyOjAwOjAwIiwgMV0='},
+        {'from': '2024-13-01'},
+        {'from': '2024-06-02', 'to': '2024-06-01'},
+    ])
+    def test_invalid_arguments_are_rejected(self, client, query):
+        response = client.get('/api/history', headers=self.headers, query_string=query)
+
+        assert response.status_code == 400
+        assert response.get_json()['success'] is False
+
+
+class TestPatientListPages:
+    PATIENT_COUNT = 23
+
+    @pytest.fixture
+    def client(self, app):
+        db.session.add(HealthcareStaff(id=1, email='admin@example.com', name='管理員', password_hash='x', role='super_admin'))
+        for uid in range(1, self.PATIENT_COUNT + 1):
+            # Few distinct names / scores / times so most sort values are shared
+            db.session.add(User(id=uid, email=f'patient{uid}@example.com', name=f'個案{uid % 4}', password_hash='x', group='clinical'))
+            if uid % 5 == 0:
+                continue  # no assessments: sorts as the lowest score / oldest time
+            db.session.add(AssessmentHistory(
+                user_id=uid, total_score=20 + uid % 3, max_score=56, level='良好', answers=[],
+                completed_at=NOW - timedelta(days=uid % 4), is_deleted=False
+            ))
+        db.session.commit()
+        backfill_latest_assessments()
+        self.headers = bearer('admin_1')
+        return app.test_client()
+
+    def expected(self, sort, order):
+        """Patient ids in the order the seed data should sort to"""
+        def key(uid):
+            assessed = uid % 5 != 0
+            return {
+                'id': (uid,),
+                'name': (f'個案{uid % 4}', uid),
+                'latest_score': (20 + uid % 3 if assessed else -1, uid),
+                'latest_time': (NOW - timedelta(days=uid % 4) if assessed else datetime.min, uid),
+            }[sort]
+
+        return sorted(range(1, self.PATIENT_COUNT + 1), key=key, reverse=order == 'desc')
+
+    @pytest.mark.parametrize('sort', ['id', 'name', 'latest_score', 'latest_time'])
+    @pytest.mark.parametrize('order', ['asc', 'desc'])
+    def test_pages_follow_sort_without_gaps_or_repeats(self, client, sort, order):
+        ids, pages = collect(client, '/api/admin/patients', self.headers, 4, direction='cursor', sort=sort, order=order)
+
+        assert ids == self.expected(sort, order)
+        assert pages == 6
+
+    def test_new_patient_does_not_shift_later_pages(self, client):
+        first = client.get('/api/admin/patients', headers=self.headers, query_string={'limit': 10}).get_json()
+        db.session.add(User(id=100, email='late@example.com', name='個案', password_hash='x', group='clinical'))
+        db.session.commit()
+
+        rest, _ = collect(client, '/api/admin/patients', self.headers, 10, direction='cursor', cursor=first['next_cursor'])
+
+        assert [p['id'] for p in first['patients']] + rest == list(range(1, self.PATIENT_COUNT + 1)) + [100]
+
+    @pytest.mark.parametrize('query', [
+        {'sort': 'age'},
+        {'order': 'up'},
+        {'limit': 501},
+        {'cursor': 'zzz'},
+    ])
+    def test_invalid_arguments_are_rejected(self, client, query):
+        response = client.get('/api/admin/patients', headers=self.headers, query_string=query)
+
+        assert response.status_code == 400
+
+    def test_cursor_from_another_sort_is_rejected(self, client):
+        page = client.get('/api/admin/patients', headers=self.headers, query_string={'limit': 5, 'sort': 'name'}).get_json()
+
+        response = client.get('/api/admin/patients', headers=self.headers,
+                              query_string={'limit': 5, 'sort': 'latest_score', 'cursor': page['next_cursor']})
+
+        assert response.status_code == 400
@@ -0,0 +1,86 @@
+"""
+The admin list endpoints must run a fixed number of SQL statements however
+many patients they return (no per-patient queries)
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from app.admin_models import HealthcareStaff, PatientAssignment, PatientWatchlist
+from app.models import db, User, AssessmentHistory, ScoreAlert
+from app.utils.alert_counts import invalidate_alert_counts
+from app.utils.daily_scores import backfill_daily_scores
+from app.utils.latest_assessment import backfill_latest_assessments
+from app.utils.streaks import recompute_all_streaks
+
+SUPER_ADMIN_ID = 1
+NURSE_ID = 2
+
+
+def seed_patients(count):
+    """count patients, each with assessments, an alert, a nurse assignment and a watchlist row per staff"""
+    today = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    db.session.add(HealthcareStaff(id=SUPER_ADMIN_ID, email='admin@example.com', name='管理員', password_hash='x', role='super_admin'))
+    db.session.add(HealthcareStaff(id=NURSE_ID, email='nurse@example.com', name='護理師', password_hash='x', role='nurse'))
+    for uid in range(1, count + 1):
+        db.session.add(User(id=uid, email=f'patient{uid}@example.com', name=f'個案{uid}', password_hash='x', group='clinical'))
+    db.session.flush()
+
+    for uid in range(1, count + 1):
+        for d in range(3):
+            completed_at = today - timedelta(days=d)
+            db.session.add(AssessmentHistory(
+                user_id=uid, total_score=20 + (uid + d) % 20, max_score=56, level='良好', answers=[],
+                completed_at=completed_at, completed_date=completed_at.date(), is_deleted=False
+            ))
+        db.session.add(ScoreAlert(user_id=uid, alert_date=today.date(), daily_average=40.0, exceeded_lines={'7日': 35}, alert_type='high'))
+        db.session.add(PatientAssignment(staff_id=NURSE_ID, patient_id=uid, assigned_by=SUPER_ADMIN_ID))
+        for staff_id in (SUPER_ADMIN_ID, NURSE_ID):
+            db.session.add(PatientWatchlist(staff_id=staff_id, patient_id=uid, display_order=uid))
+    db.session.commit()
+
+    backfill_daily_scores()
+    backfill_latest_assessments()
+    recompute_all_streaks()
+
+
+def count_queries(app, url, staff_id):
+    """(SQL statements run by one GET of url as staff_id, JSON body)"""
+    with app.app_context():
+        headers = {'Authorization': 'Bearer ' + create_access_token(identity=f'admin_{staff_id}')}
+        engine = db.engine
+
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    invalidate_alert_counts()
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    try:
+        response = app.test_client().get(url, headers=headers)
+    finally:
+        event.remove(engine, 'before_cursor_execute', on_execute)
+
+    assert response.status_code == 200, response.get_json()
+    return len(statements), response.get_json()
+
+
+@pytest.mark.parametrize('url, staff_id, key', [
+    ('/api/admin/patients', SUPER_ADMIN_ID, 'patients'),
+    ('/api/admin/patients', NURSE_ID, 'patients'),
+    ('/api/admin/watchlist', NURSE_ID, 'watchlist'),
+])
+def test_query_count_does_not_grow_with_patients(app_factory, url, staff_id, key):
+    counts = {}
+    for size in (5, 50):
+        app = app_factory()
+        with app.app_context():
+            seed_patients(size)
+
+        counts[size], body = count_queries(app, url, staff_id)
+        assert len(body[key]) == size
+
+    assert counts[5] == counts[50], counts
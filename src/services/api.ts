@@ -3,7 +3,12 @@ import type {
     LoginRequest,
     AuthResponse,
     SaveHistoryRequest,
+    SaveHistoryBatchItem,
+    SaveHistoryBatchResponse,
     HistoryResponse,
+    HistoryQuery,
+    DailySummaryQuery,
+    DailySummaryResponse,
     ApiResponse,
 } from '../types/api';
 
@@ -32,6 +37,10 @@ const createHeaders = (includeAuth: boolean = false): HeadersInit => {
     return headers;
 };
 
+// Idempotency-Key: reuse the same key when retrying a write so the server saves it only once
+const withIdempotencyKey = (headers: HeadersInit, idempotencyKey?: string): HeadersInit =>
+    idempotencyKey ? { ...headers, 'Idempotency-Key': idempotencyKey } : headers;
+
 // Generic API request handler
 async function apiRequest<T>(
     endpoint: string,
@@ -90,21 +99,46 @@ export const authApi = {
 
 // History API
 export const historyApi = {
-    getHistory: async (): Promise<HistoryResponse> => {
-        return apiRequest<HistoryResponse>('/history', {
+    getHistory: async (params?: HistoryQuery): Promise<HistoryResponse> => {
+        const query = new URLSearchParams();
+        Object.entries(params ?? {}).forEach(([key, value]) => {
+            if (value !== undefined) query.set(key, String(value));
+        });
+        const suffix = query.toString() ? `?${query}` : '';
+        return apiRequest<HistoryResponse>(`/history${suffix}`, {
+            method: 'GET',
+            headers: createHeaders(true),
+        });
+    },
+
+    getDailySummary: async (params?: DailySummaryQuery): Promise<DailySummaryResponse> => {
+        const query = new URLSearchParams();
+        Object.entries(params ?? {}).forEach(([key, value]) => {
+            if (value !== undefined) query.set(key, String(value));
+        });
+        const suffix = query.toString() ? `?${query}` : '';
+        return apiRequest<DailySummaryResponse>(`/history/daily${suffix}`, {
             method: 'GET',
             headers: createHeaders(true),
         });
     },
 
-    saveHistory: async (data: SaveHistoryRequest): Promise<HistoryResponse> => {
+    saveHistory: async (data: SaveHistoryRequest, idempotencyKey?: string): Promise<HistoryResponse> => {
         return apiRequest<HistoryResponse>('/history', {
             method: 'POST',
-            headers: createHeaders(true),
+            headers: withIdempotencyKey(createHeaders(true), idempotencyKey),
             body: JSON.stringify(data),
         });
     },
 
+    saveHistoryBatch: async (assessments: SaveHistoryBatchItem[], idempotencyKey?: string): Promise<SaveHistoryBatchResponse> => {
+        return apiRequest<SaveHistoryBatchResponse>('/history/batch', {
+            method: 'POST',
+            headers: withIdempotencyKey(createHeaders(true), idempotencyKey),
+            body: JSON.stringify({ assessments }),
+        });
+    },
+
     deleteHistory: async (id: number, reason?: string, permanent: boolean = false): Promise<ApiResponse> => {
         return apiRequest<ApiResponse>(`/history/${id}`, {
             method: 'DELETE',
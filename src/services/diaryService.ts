@@ -73,11 +73,14 @@ export const diaryService = {
         return data.diary;
     },
 
-    // 創建日記
-    async createDiary(diaryData: DiaryFormData): Promise<Diary> {
+    // 創建日記（重試時帶相同的 idempotencyKey，伺服器只會建立一次）
+    async createDiary(diaryData: DiaryFormData, idempotencyKey?: string): Promise<Diary> {
         const response = await fetch(`${API_BASE_URL}/diary`, {
             method: 'POST',
-            headers: getAuthHeaders(),
+            headers: {
+                ...getAuthHeaders(),
+                ...(idempotencyKey && { 'Idempotency-Key': idempotencyKey }),
+            },
             body: JSON.stringify(diaryData),
         });
 
@@ -84,9 +84,50 @@ export interface SaveHistoryRequest {
     answers: AssessmentAnswer[];
 }
 
+export interface SaveHistoryBatchItem {
+    total_score: number;
+    max_score: number;
+    answers: AssessmentAnswer[];
+    completed_at?: string; // ISO 8601, when the assessment was completed offline
+}
+
+export interface SaveHistoryBatchResponse extends ApiResponse {
+    results?: { history_id: number; level: string; completed_at: string }[];
+    count?: number;
+}
+
+export interface HistoryQuery {
+    limit?: number;
+    before?: string;
+    after?: string;
+    from?: string;
+    to?: string;
+    fields?: 'summary' | 'list' | 'full';
+}
+
 export interface HistoryResponse extends ApiResponse {
     history?: AssessmentHistory[];
     history_id?: number;
+    next_cursor?: string | null;
+    has_more?: boolean;
+    newest_cursor?: string | null;
+}
+
+export interface DailySummaryQuery {
+    from?: string; // YYYY-MM-DD
+    to?: string;
+}
+
+export interface DailySummary {
+    date: string;
+    avg: number;
+    count: number;
+    min: number;
+    max: number;
+}
+
+export interface DailySummaryResponse extends ApiResponse {
+    daily?: DailySummary[];
 }
 
 // Score Alert Types